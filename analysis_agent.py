@@ -1,21 +1,17 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 import json
-from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from llm_client import get_llm
+from prompting import AgentPrompt
+from retries import run_with_retries, arun_with_retries
 from schemas import AnalysisSchema
+from stream_parse import StreamRules, ainvoke_text, invoke_text
 
 # NO TOOLS IMPORTED
 
-def analyze_input(parsed_input: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Analyzes input using a direct LLM call.
-    STRICTLY LLM-ONLY: Crashes if analysis fails.
-    """
-    # Initialize LLM
-    llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-    
-    # Define System Message
-    system_message = """You are an expert product analyst.
+# Define System Message
+SYSTEM_MESSAGE = """You are an expert product analyst.
 Your goal is to analyze the provided product data, identify gaps, and synthesize insights.
 
 CRITICAL INSTRUCTIONS:
@@ -23,28 +19,58 @@ CRITICAL INSTRUCTIONS:
 2. Generate 3-5 key questions a user might have.
 3. Generate 3-5 analytical observations.
 4. If competitors are missing, explicitly note this in observations.
-5. Output valid JSON matching AnalysisSchema: { "key_questions": [...], "observations": [...] }
+5. Output valid JSON matching AnalysisSchema: {{ "key_questions": [...], "observations": [...] }}
 """
 
-    # Execute
-    input_str = json.dumps(parsed_input, indent=2)
-    messages = [
-        SystemMessage(content=system_message),
-        HumanMessage(content=input_str)
-    ]
-    
-    # Direct LLM invocation (Chain pattern)
-    result = llm.invoke(messages)
-    
-    output_str = result.content
-    
-    # Clean up code blocks
-    if "```json" in output_str:
-        output_str = output_str.split("```json")[1].split("```")[0].strip()
-    elif "```" in output_str:
-        output_str = output_str.split("```")[1].split("```")[0].strip()
-        
+# Gap analysis needs every field (missing ones are the point), so nothing is projected away
+PROMPT = AgentPrompt(
+    "analysis",
+    template="{product_data}",
+    fields={"product_data": None},
+    system=SYSTEM_MESSAGE,
+)
+
+# Checked while the output streams in (see stream_parse)
+STREAM_RULES = StreamRules(AnalysisSchema)
+
+def _build_chain(llm: Optional[BaseChatModel] = None) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    return PROMPT.chain(llm or get_llm("analysis"))
+
+def _parse_output(output_str: str) -> Dict[str, Any]:
+    # Code fences and other near-valid JSON are repaired by the retry engine
     parsed_output = json.loads(output_str)
-    
+
     # Validate against schema
-    return AnalysisSchema(**parsed_output).dict()
\ No newline at end of file
+    return AnalysisSchema(**parsed_output).model_dump()
+
+def _low_confidence(analysis: Dict[str, Any]) -> Optional[str]:
+    # What the prompt asks for; a small-model answer outside it escalates (see model_cascade)
+    for field in ("key_questions", "observations"):
+        count = len([item for item in analysis[field] if item.strip()])
+        if not 3 <= count <= 5:
+            return f"expected 3-5 {field.replace('_', ' ')}, got {count}"
+    return None
+
+def analyze_input(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Analyzes input using a direct LLM call.
+    STRICTLY LLM-ONLY: Crashes if analysis fails after its retry budget.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    # Direct LLM invocation (Chain pattern), through the shared retry engine
+    return run_with_retries("analysis", lambda: invoke_text(chain, inputs, STREAM_RULES), _parse_output, check=_low_confidence)
+
+async def aanalyze_input(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Async version of analyze_input. Awaits the LLM call instead of blocking.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    async def call() -> str:
+        return await ainvoke_text(chain, inputs, STREAM_RULES)
+
+    return await arun_with_retries("analysis", call, _parse_output, check=_low_confidence)
@@ -0,0 +1,122 @@
+from typing import Dict, Any, Optional, Callable, Sequence
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# State keys that are saved as artifacts, and the file each one is written to
+ARTIFACT_FILES: Dict[str, str] = {
+    "analysis": "analysis.json",
+    "content": "content.json",
+    "questions": "questions.json",
+    "comparison": "comparison.json",
+    "evaluation": "evaluation.json",
+    "pages": "pages.json",
+}
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """
+    Writes JSON to a temporary file in the same directory and renames it into place,
+    so readers never see a half-written file and a crash leaves the old one intact.
+    """
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JsonlSink:
+    """
+    Append-only JSONL file shared by many runs: one compact line per artifact,
+    flushed as it is written. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "JsonlSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ArtifactWriter:
+    """
+    Saves the artifacts of one product run as graph nodes finish: each artifact is
+    written atomically to `output_dir`, optionally appended to a JSONL sink, and
+    reported to `on_progress`. With `render_formats`, pages are also rendered
+    (page_renderer.write_pages) as soon as the page builder finishes.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        product_id: str = "product",
+        sink: Optional[JsonlSink] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        render_formats: Sequence[str] = ()
+    ):
+        self.output_dir = output_dir
+        self.product_id = product_id
+        self.sink = sink
+        self.on_progress = on_progress
+        self.render_formats = tuple(render_formats)
+        self.started_at = time.time()
+
+    def _emit(self, event: str, **fields: Any) -> None:
+        if self.on_progress is not None:
+            self.on_progress({
+                "event": event,
+                "product_id": self.product_id,
+                "elapsed": round(time.time() - self.started_at, 6),
+                **fields,
+            })
+
+    def node_finished(self, node: str, update: Optional[Dict[str, Any]], cached: bool = False) -> None:
+        artifacts = []
+        for key, value in (update or {}).items():
+            filename = ARTIFACT_FILES.get(key)
+            if filename is None:
+                continue
+            atomic_write_json(f"{self.output_dir}/{filename}", value)
+            if self.sink is not None:
+                self.sink.write({"product_id": self.product_id, "artifact": key, "node": node, "data": value})
+            artifacts.append(key)
+            if key == "pages" and self.render_formats:
+                from page_renderer import write_pages
+                write_pages(value, self.output_dir, self.render_formats)
+        self._emit("node_finished", node=node, artifacts=artifacts, cached=cached)
+
+    def run_finished(self) -> None:
+        self._emit("run_finished")
+
+    def run_failed(self, error: BaseException) -> None:
+        self._emit("run_failed", error=f"{type(error).__name__}: {error}")
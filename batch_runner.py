@@ -0,0 +1,128 @@
+from typing import Dict, Any, List, Iterator, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import json
+from pathlib import Path
+
+from artifacts import JsonlSink, ProgressCallback, atomic_write_json
+from input_stream import CatalogValidator, iter_records, slugify
+from orchestrator import stream_pipeline
+
+
+def load_catalog(source: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields (product_id, raw_input) pairs from a directory of *.json files, a JSON array
+    or a JSONL file, without schema validation (see input_stream.CatalogValidator).
+    Unreadable entries are yielded as the exception instead of a payload, so the
+    caller can record them as failures without stopping.
+    """
+    for record_id, position, text in iter_records(source):
+        try:
+            raw_input = json.loads(text)
+        except Exception as e:
+            yield record_id, e
+            continue
+        if position is None:
+            yield record_id, raw_input
+            continue
+        name = raw_input.get("product", {}).get("name", "") if isinstance(raw_input, dict) else ""
+        yield f"{slugify(name)}-{position}", raw_input
+
+
+def run_batch(
+    source: str,
+    output_dir: str = "outputs/batch",
+    max_concurrency: int = 4,
+    parallel: bool = False,
+    incremental: bool = False,
+    fused: bool = False,
+    jsonl_path: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    reject_path: Optional[str] = None,
+    render_formats: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    Runs the pipeline for every product in a catalog with at most `max_concurrency`
+    products in flight. Each product's artifacts are saved to `<output_dir>/<product_id>/`
+    as its nodes finish (and appended to `jsonl_path` if given), and
+    `<output_dir>/batch_summary.json` lists successes and failures at the end.
+    With incremental=True, stages whose inputs are unchanged since the last run are skipped.
+    With fused=True, analysis, content and questions share one LLM call per product.
+    The catalog is read and validated as a stream, so memory does not grow with its size:
+    rows that fail the input schema go to `reject_path` (default `<output_dir>/rejects.jsonl`)
+    with their errors instead of reaching the pipeline.
+    `render_formats` also renders each product's pages (see page_renderer).
+    A failing product still fails loudly inside its own run, but is recorded here
+    instead of aborting the rest of the batch; whatever it finished before failing is kept.
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    reject_path = reject_path or f"{output_dir}/rejects.jsonl"
+
+    successes: List[str] = []
+    failures: List[Dict[str, str]] = []
+    seen: Dict[str, int] = {}
+
+    def collect(future: Future, product_id: str) -> None:
+        error = future.exception()
+        if error is not None:
+            print(f"[FAILED] {product_id}: {error}")
+            failures.append({"product_id": product_id, "error": f"{type(error).__name__}: {error}"})
+            return
+        print(f"[DONE] {product_id}")
+        successes.append(product_id)
+
+    print(f"Running batch from {source} (max concurrency {max_concurrency})...")
+
+    workers = max(1, max_concurrency)
+    sink = JsonlSink(jsonl_path) if jsonl_path else None
+    try:
+        with CatalogValidator(reject_path) as validator, ThreadPoolExecutor(max_workers=workers) as executor:
+            # Only a bounded number of products is queued ahead of the workers
+            pending: Dict[Future, str] = {}
+            for product_id, parsed in validator.stream(source):
+                # Keep output locations unique when names collide
+                if product_id in seen:
+                    seen[product_id] += 1
+                    product_id = f"{product_id}-{seen[product_id]}"
+                else:
+                    seen[product_id] = 0
+
+                if len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, pending.pop(future))
+
+                future = executor.submit(
+                    stream_pipeline,
+                    parsed.model_dump(),
+                    output_dir=f"{output_dir}/{product_id}",
+                    parallel=parallel,
+                    incremental=incremental,
+                    fused=fused,
+                    sink=sink,
+                    on_progress=on_progress,
+                    run_id=product_id,
+                    render_formats=render_formats,
+                )
+                pending[future] = product_id
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, pending.pop(future))
+            rejected = validator.rejected
+    finally:
+        if sink is not None:
+            sink.close()
+
+    summary = {
+        "total": len(successes) + len(failures) + rejected,
+        "succeeded": len(successes),
+        "failed": len(failures),
+        "rejected": rejected,
+        "reject_file": reject_path if rejected else None,
+        "successes": sorted(successes),
+        "failures": failures,
+    }
+    atomic_write_json(f"{output_dir}/batch_summary.json", summary)
+
+    return summary
@@ -0,0 +1,97 @@
+"""
+Startup benchmarks: how long a fresh interpreter takes to import the pipeline's entry points.
+
+    python benchmarks/bench_import.py --repeat 5 --output imports.json
+
+Each scenario runs in its own subprocess (so nothing is already imported) and reports the
+median wall time and whether LangChain/LangGraph got loaded. Scenarios marked light must
+never load them; --check exits non-zero if one does, so the fast paths cannot regress.
+Results carry the git commit so they can be compared across commits.
+"""
+from typing import Dict, Any, List
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name -> (statement timed in a fresh interpreter, must stay free of LangChain)
+SCENARIOS: Dict[str, Any] = {
+    "import_parser_agent": ("import parser_agent", True),
+    "import_page_builder_agent": ("import page_builder_agent", True),
+    "import_orchestrator": ("import orchestrator", True),
+    "import_page_renderer": ("import page_renderer", True),
+    "cli_validate_only": (
+        "import contextlib, io, sys; sys.argv = ['run_pipeline.py', '--validate-only']; import run_pipeline\n"
+        "with contextlib.redirect_stdout(io.StringIO()): run_pipeline.main()",
+        True,
+    ),
+    "first_graph_build": ("import orchestrator; orchestrator.get_graph()", False),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({statement!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - start
+heavy = sorted({{name.split(".")[0] for name in sys.modules if name.startswith(("langchain", "langgraph"))}})
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def run_once(statement: str) -> Dict[str, Any]:
+    output = subprocess.check_output(
+        [sys.executable, "-c", PROBE.format(statement=statement)], cwd=ROOT, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(name: str, statement: str, light: bool, repeat: int) -> Dict[str, Any]:
+    runs = [run_once(statement) for _ in range(repeat)]
+    times = [run["elapsed"] for run in runs]
+    heavy = runs[-1]["heavy"]
+    return {
+        "scenario": name,
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "min_ms": round(min(times) * 1000, 1),
+        "heavy_modules": heavy,
+        "light": light,
+        "ok": not (light and heavy),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import/startup time of the pipeline entry points.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="Fail if a light scenario loads LangChain.")
+    parser.add_argument("--output", help="Write results as JSON (for comparing commits).")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = [
+        measure(name, statement, light, args.repeat) for name, (statement, light) in SCENARIOS.items()
+    ]
+
+    report = {"commit": git_commit(), "config": vars(args), "results": results}
+    for row in results:
+        loaded = ", ".join(row["heavy_modules"]) or "-"
+        status = "" if row["ok"] else "  REGRESSION"
+        print(f"{row['scenario']:<26} {row['median_ms']:>8.1f} ms  (min {row['min_ms']:.1f})  loads {loaded}{status}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.check and not all(row["ok"] for row in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Offline pipeline benchmarks against the fake LLM backend.
+
+    python benchmarks/bench_pipeline.py --products 50 --output bench.json
+
+Reports products/sec, p50/p95/p99 latency and peak traced memory for single runs,
+concurrent batch runs (each also in fused mode), a retry-heavy scenario, spiky-latency
+single runs with and without request hedging (hedging.py), and runs whose outputs break the
+schema partway through, buffered versus validated as they stream (stream_parse.py), and
+single runs with and without a small-model cascade on every agent (model_cascade.py).
+Results carry the git commit so they can be compared across commits.
+"""
+from typing import Dict, Any, List, Callable, Optional
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Measure the pipeline itself, not the on-disk caches
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+
+from fake_llm import fake_llm_factory, lognormal_latency, spiky_latency
+from hedging import HedgePolicy, hedge_stats, set_hedge_policy
+from llm_client import set_llm_factory
+from model_cascade import SMALL_MODEL, CascadePolicy, cascade_stats, set_cascade_policy
+from retries import RETRY_POLICIES, retry_stats
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def catalog(size: int) -> List[Dict[str, Any]]:
+    with open(ROOT / "inputs" / "glowboost_input.json", "r") as f:
+        base = json.load(f)
+    products = []
+    for i in range(size):
+        raw_input = copy.deepcopy(base)
+        raw_input["product"]["name"] = f"{base['product']['name']} #{i}"
+        products.append(raw_input)
+    return products
+
+
+def summarize(name: str, latencies: List[float], elapsed: float, peak_bytes: int, errors: int) -> Dict[str, Any]:
+    return {
+        "scenario": name,
+        "products": len(latencies) + errors,
+        "errors": errors,
+        "products_per_sec": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "peak_memory_mb": round(peak_bytes / 1024 / 1024, 2),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def measure(name: str, body: Callable[[], List[float]], errors: List[int]) -> Dict[str, Any]:
+    # Every scenario starts cold: comparisons computed by an earlier scenario are not reused
+    from comparison_agent import pair_cache
+
+    # Agents print progress; keep benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        pair_cache.clear()
+        start = time.perf_counter()
+        latencies = body()
+        elapsed = time.perf_counter() - start
+        run_errors = errors[0]
+
+        # tracemalloc slows allocation-heavy code several times over, so peak memory
+        # comes from a second, untimed pass
+        pair_cache.clear()
+        tracemalloc.start()
+        body()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return summarize(name, latencies, elapsed, peak, run_errors)
+
+
+def run_single(
+    products: List[Dict[str, Any]], parallel: bool, fused: bool = False, errors: Optional[List[int]] = None
+) -> Callable[[], List[float]]:
+    from orchestrator import run_pipeline
+
+    def body() -> List[float]:
+        latencies = []
+        for raw_input in products:
+            start = time.perf_counter()
+            try:
+                run_pipeline(raw_input, parallel=parallel, fused=fused)
+            except Exception:
+                # Counted when the scenario expects some products to fail, raised otherwise
+                if errors is None:
+                    raise
+                errors[0] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    return body
+
+
+def run_batch(products: List[Dict[str, Any]], concurrency: int, errors: List[int], fused: bool = False) -> Callable[[], List[float]]:
+    from orchestrator import arun_pipeline
+
+    async def one(raw_input: Dict[str, Any], semaphore: asyncio.Semaphore, latencies: List[float]) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await arun_pipeline(raw_input, parallel=True, fused=fused)
+            except Exception:
+                errors[0] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    async def main() -> List[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        await asyncio.gather(*(one(raw_input, semaphore, latencies) for raw_input in products))
+        return latencies
+
+    return lambda: asyncio.run(main())
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against the fake LLM.")
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Median fake LLM latency in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON (for comparing commits).")
+    args = parser.parse_args()
+
+    products = catalog(args.products)
+    latency = lognormal_latency(args.latency, 0.4)
+    results = []
+
+    set_llm_factory(fake_llm_factory(latency=latency, seed=args.seed))
+    errors = [0]
+    results.append(measure("single_sequential", run_single(products, parallel=False), errors))
+    errors = [0]
+    results.append(measure("single_parallel", run_single(products, parallel=True), errors))
+    errors = [0]
+    results.append(measure("batch_async", run_batch(products, args.concurrency, errors), errors))
+
+    # Fused mode: one call for analysis, content and questions instead of three
+    errors = [0]
+    results.append(measure("single_fused", run_single(products, parallel=True, fused=True), errors))
+    errors = [0]
+    results.append(measure("batch_async_fused", run_batch(products, args.concurrency, errors, fused=True), errors))
+
+    # Retry-heavy: transient failures and malformed outputs on a fifth of calls each
+    set_llm_factory(fake_llm_factory(latency=latency, seed=args.seed, failure_rate=0.2, malformed_rate=0.2))
+    errors = [0]
+    results.append(measure("retry_heavy_batch", run_batch(products, args.concurrency, errors), errors))
+    # Tail latency: 2% of calls stall for 20x the median. Each pair starts from a warm-up
+    # pass, so hedging already knows every agent's latency percentiles
+    set_llm_factory(fake_llm_factory(latency=spiky_latency(args.latency, args.latency * 20, 0.02), seed=args.seed))
+    for name, hedged in (("spiky_single", False), ("spiky_single_hedged", True)):
+        for agent in RETRY_POLICIES:
+            set_hedge_policy(agent, HedgePolicy(enabled=True) if hedged else None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_single(products, parallel=True)()
+        errors = [0]
+        row = measure(name, run_single(products, parallel=True), errors)
+        calls = sum(stats["calls"] for stats in hedge_stats().values())
+        row["hedged_pct"] = round(100 * sum(stats["hedged"] for stats in hedge_stats().values()) / calls, 1) if calls else 0.0
+        results.append(row)
+    for agent in RETRY_POLICIES:
+        set_hedge_policy(agent, None)
+
+    # Off the rails: 20% of outputs break the schema partway through. Buffered calls only
+    # find out after the whole completion; streamed ones stop there and keep the valid pairs
+    set_llm_factory(fake_llm_factory(latency=latency, seed=args.seed, off_rails_rate=0.2))
+    for name, disabled in (("off_rails_buffered", "1"), ("off_rails_streamed", "")):
+        os.environ["LLM_STREAM_PARSE_DISABLED"] = disabled
+        retry_stats.reset()
+        errors = [0]
+        row = measure(name, run_single(products, parallel=True, errors=errors), errors)
+        row["retries"] = sum(sum(counts.values()) for counts in retry_stats.snapshot().values())
+        results.append(row)
+    os.environ.pop("LLM_STREAM_PARSE_DISABLED", None)
+
+    # Model cascade: the small model answers in a quarter of the time, but 15% of its
+    # answers fall short of the agents' checks and escalate to the large model
+    small = {"latency": lognormal_latency(args.latency / 4, 0.4), "weak_rate": 0.15}
+    set_llm_factory(fake_llm_factory(latency=latency, seed=args.seed, models={SMALL_MODEL: small}))
+    for name, enabled in (("cascade_off", False), ("cascade_on", True)):
+        for agent in RETRY_POLICIES:
+            set_cascade_policy(agent, CascadePolicy(enabled=enabled))
+        cascade_stats.reset()
+        errors = [0]
+        row = measure(name, run_single(products, parallel=True, errors=errors), errors)
+        counts = cascade_stats.snapshot().values()
+        calls = sum(agent["accepted"] + agent["escalated"] for agent in counts)
+        row["escalated_pct"] = round(100 * sum(agent["escalated"] for agent in counts) / calls, 1) if calls else 0.0
+        results.append(row)
+    for agent in RETRY_POLICIES:
+        set_cascade_policy(agent, None)
+    set_llm_factory(None)
+
+    report = {"commit": git_commit(), "config": vars(args), "results": results}
+    for row in results:
+        print(
+            f"{row['scenario']:<20} {row['products_per_sec']:>8.2f} products/s  "
+            f"p50 {row['p50_s']:.3f}s  p95 {row['p95_s']:.3f}s  p99 {row['p99_s']:.3f}s  "
+            f"peak {row['peak_memory_mb']:.1f} MB  errors {row['errors']}"
+            + (f"  hedged {row['hedged_pct']}%" if "hedged_pct" in row else "")
+            + (f"  retries {row['retries']}" if "retries" in row else "")
+            + (f"  escalated {row['escalated_pct']}%" if "escalated_pct" in row else "")
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
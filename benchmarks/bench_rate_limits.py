@@ -0,0 +1,131 @@
+"""
+Rate-limit benchmarks: the real Groq client against a local endpoint that enforces
+requests/tokens per minute (fake_endpoint.FakeRateLimitedEndpoint).
+
+    python benchmarks/bench_rate_limits.py --products 8 --rpm 120 --tpm 15000 --output limits.json
+
+Runs the same async batch three ways: with the scheduler disabled, with the scheduler
+learning the limits from response headers, and with LLM_RPM/LLM_TPM configured up front.
+Reports completed/failed products, wall time, 429s seen by the endpoint and the
+scheduler's queue statistics. Results carry the git commit so they can be compared across commits.
+"""
+from typing import Dict, Any, List, Optional
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Every call must reach the endpoint; any key is accepted by it
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ.setdefault("GROQ_API_KEY", "gsk_local_fake_endpoint")
+
+from fake_endpoint import FakeRateLimitedEndpoint
+from llm_client import reset_llm_clients
+from rate_limits import reset_schedulers, scheduler_stats
+
+
+def catalog(size: int) -> List[Dict[str, Any]]:
+    with open(ROOT / "inputs" / "glowboost_input.json", "r") as f:
+        base = json.load(f)
+    products = []
+    for i in range(size):
+        raw_input = copy.deepcopy(base)
+        raw_input["product"]["name"] = f"{base['product']['name']} #{i}"
+        products.append(raw_input)
+    return products
+
+
+def configure(env: Dict[str, Optional[str]]) -> None:
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    # New clients and schedulers pick up the environment
+    reset_llm_clients()
+    reset_schedulers()
+
+
+def run_scenario(name: str, products: List[Dict[str, Any]], args, env: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    from orchestrator import arun_pipeline
+
+    endpoint = FakeRateLimitedEndpoint(args.rpm, args.tpm, latency=args.latency).start()
+    configure({**env, "LLM_BASE_URL": endpoint.base_url})
+
+    async def one(raw_input: Dict[str, Any]) -> bool:
+        try:
+            await arun_pipeline(raw_input, parallel=True)
+            return True
+        except Exception:
+            return False
+
+    async def main() -> List[bool]:
+        return await asyncio.gather(*(one(raw_input) for raw_input in products))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outcomes = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    endpoint.stop()
+
+    queue = next(iter(scheduler_stats().values()), {})
+    return {
+        "scenario": name,
+        "products": len(products),
+        "completed": sum(outcomes),
+        "failed": len(outcomes) - sum(outcomes),
+        "elapsed_s": round(elapsed, 2),
+        "endpoint_served": endpoint.stats()["served"],
+        "endpoint_429s": endpoint.stats()["rate_limited"],
+        "max_queue_depth": queue.get("max_queued", 0),
+        "queue_wait_s": round(queue.get("wait_seconds", 0.0), 2),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rate-limit scheduler against a limiting endpoint.")
+    parser.add_argument("--products", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=120, help="Endpoint requests per minute.")
+    parser.add_argument("--tpm", type=int, default=15000, help="Endpoint tokens per minute.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Endpoint latency in seconds.")
+    parser.add_argument("--output", help="Write results as JSON (for comparing commits).")
+    args = parser.parse_args()
+
+    products = catalog(args.products)
+    unset = {"LLM_SCHEDULER_DISABLED": None, "LLM_RPM": None, "LLM_TPM": None}
+    results = [
+        run_scenario("unscheduled", products, args, {**unset, "LLM_SCHEDULER_DISABLED": "1"}),
+        run_scenario("scheduled_from_headers", products, args, unset),
+        run_scenario("scheduled_configured", products, args, {**unset, "LLM_RPM": str(args.rpm), "LLM_TPM": str(args.tpm)}),
+    ]
+
+    report = {"commit": git_commit(), "config": vars(args), "results": results}
+    for row in results:
+        print(
+            f"{row['scenario']:<24} {row['completed']:>3}/{row['products']} ok  {row['elapsed_s']:>7.2f}s  "
+            f"429s {row['endpoint_429s']:<4} max queue {row['max_queue_depth']:<3} queue wait {row['queue_wait_s']:.1f}s"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
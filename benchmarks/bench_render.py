@@ -0,0 +1,117 @@
+"""
+Page republishing benchmarks: page_renderer.render_catalog over a synthetic batch output
+directory (one <product_id>/pages.json per product, as run_batch writes them).
+
+    python benchmarks/bench_render.py --products 100000 --workers 8 --output render.json
+
+Times three passes over the same catalog: a cold render of every page in every format,
+an unchanged republish (hash check only, nothing written), and a republish after editing
+--changed products. Results carry the git commit so they can be compared across commits.
+"""
+from typing import Dict, Any, List
+import argparse
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from page_builder_agent import build_pages
+from page_renderer import FORMATS, render_catalog
+
+
+def sample_pages() -> Dict[str, Any]:
+    with open(ROOT / "inputs" / "glowboost_input.json", "r") as f:
+        parsed_input = json.load(f)
+    parsed_input.setdefault("competitors", [])
+    product = parsed_input["product"]
+    qa_pairs = [
+        {"question": f"Question {i} about {product['name']}?", "answer": f"Answer {i}: {product['description']}", "category": "Usage"}
+        for i in range(15)
+    ]
+    comparison = {"comparisons": [
+        {
+            "product_b_name": competitor["name"],
+            "ingredient_comparison": f"{product['name']} and {competitor['name']} share Vitamin C.",
+            "benefit_comparison": f"{product['name']} focuses on brightening.",
+            "verdicts": [{"skin_type": skin, "winner": product["name"], "reasoning": "Lighter texture."} for skin in product["skin_type"]],
+        }
+        for competitor in parsed_input["competitors"]
+    ]}
+    content = {"headline": f"{product['name']}: brighter skin", "value_proposition": [], "feature_highlights": []}
+    return build_pages(parsed_input, content, {"qa_pairs": qa_pairs}, comparison)
+
+
+def write_catalog(root: str, size: int) -> None:
+    base = sample_pages()
+    for i in range(size):
+        pages = copy.deepcopy(base)
+        pages["product_page"]["headline"] = f"{base['product_page']['headline']} #{i}"
+        product_dir = os.path.join(root, f"product-{i}")
+        os.makedirs(product_dir)
+        with open(os.path.join(product_dir, "pages.json"), "w") as f:
+            json.dump(pages, f)
+
+
+def edit_products(root: str, count: int) -> None:
+    for i in range(count):
+        path = os.path.join(root, f"product-{i}", "pages.json")
+        with open(path, "r") as f:
+            pages = json.load(f)
+        pages["faq_page"]["faqs"][0]["answer"] += " (updated)"
+        with open(path, "w") as f:
+            json.dump(pages, f)
+
+
+def timed(name: str, root: str, args) -> Dict[str, Any]:
+    start = time.perf_counter()
+    totals = render_catalog(root, formats=args.formats, workers=args.workers)
+    return {"pass": name, "elapsed_s": round(time.perf_counter() - start, 2), **totals}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark republishing a catalog's pages.")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--changed", type=int, default=100, help="Products edited before the last pass.")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count).")
+    parser.add_argument("--formats", type=lambda value: tuple(value.split(",")), default=FORMATS)
+    parser.add_argument("--output", help="Write results as JSON (for comparing commits).")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        write_catalog(root, args.products)
+        results: List[Dict[str, Any]] = [timed("cold", root, args), timed("unchanged", root, args)]
+        edit_products(root, args.changed)
+        results.append(timed("changed", root, args))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    config = {**vars(args), "formats": list(args.formats)}
+    report = {"commit": git_commit(), "config": config, "results": results}
+    for row in results:
+        print(
+            f"{row['pass']:<10} {row['products']:>7} products  {row['elapsed_s']:>7.2f}s  "
+            f"written {row['written']:<7} unchanged {row['skipped']}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Near-duplicate reuse benchmark against the fake LLM backend.
+
+    python benchmarks/bench_similarity.py --families 8 --variants 6 --output similarity.json
+
+Builds a synthetic variant-heavy catalog: a few product families, each with shade and
+size variants that differ in name and price, some also in one ingredient. The catalog is
+run in shuffled order twice, without and with reuse from the similarity index
+(similarity_index.py), and reports the neighbour hit rate per section, how many Q&A pairs
+and content blocks were reused or regenerated, neighbours found in another family (false
+matches), LLM calls made and the latency saved per product.
+"""
+from typing import Dict, Any, List
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Measure the pipeline itself, not the on-disk caches; the index lives in a scratch directory
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ["SIMILARITY_INDEX_PATH"] = str(Path(tempfile.mkdtemp(prefix="bench-similarity-")) / "index.sqlite")
+
+from fake_llm import FakeChatModel, lognormal_latency
+from llm_client import set_llm_factory
+from similarity_index import SECTIONS, ReusePolicy, get_similarity_index, reuse_stats, set_reuse_policy
+
+INGREDIENTS = [
+    "Vitamin C (Ascorbic Acid)", "Hyaluronic Acid", "Niacinamide", "Aloe Vera Extract", "Ferulic Acid",
+    "Retinol", "Peptide Complex", "Squalane", "Ceramide NP", "Salicylic Acid", "Zinc PCA", "Green Tea Extract",
+    "Bakuchiol", "Panthenol", "Centella Asiatica", "Glycolic Acid", "Lactic Acid", "Shea Butter", "Jojoba Oil",
+    "Azelaic Acid", "Allantoin", "Licorice Root Extract", "Caffeine", "Tranexamic Acid",
+]
+BENEFITS = [
+    "Brightens dull skin", "Reduces dark spots", "Improves hydration", "Smooths fine lines", "Calms redness",
+    "Unclogs pores", "Controls shine", "Strengthens the skin barrier", "Evens skin tone", "Firms and lifts",
+    "Soothes irritation", "Refines texture",
+]
+SKIN_TYPES = ["Normal", "Oily", "Combination", "Dry", "Sensitive"]
+FORMATS = ["serum", "cream", "gel", "lotion", "essence", "balm", "toner", "oil"]
+GOALS = [
+    "restore radiance", "fade stubborn marks", "lock in moisture", "soften wrinkles", "quiet reactive skin",
+    "clear congestion", "mattify the t-zone", "rebuild resilience", "blur uneven patches", "tighten slack skin",
+]
+SHADES = ["Light", "Medium", "Tan", "Deep", "Rich", "Fair", "Golden", "Rose"]
+SIZES = ["15ml", "30ml", "50ml", "100ml"]
+
+
+def family(rng: random.Random, index: int) -> Dict[str, Any]:
+    goals = rng.sample(GOALS, 3)
+    name = f"Line{index} {rng.choice(FORMATS).title()}"
+    return {
+        "product": {
+            "name": name,
+            "description": f"{name} is a {rng.choice(FORMATS)} made to {goals[0]}, {goals[1]} and {goals[2]} "
+                           f"with {rng.randint(2, 9)} weeks of daily use.",
+            "ingredients": rng.sample(INGREDIENTS, 6),
+            "benefits": rng.sample(BENEFITS, 4),
+            "usage": f"Apply {rng.randint(1, 4)} pumps to clean skin {rng.choice(['morning', 'evening', 'morning and evening'])}.",
+            "skin_type": rng.sample(SKIN_TYPES, 3),
+            "price": f"${rng.randint(15, 60)}.99",
+            "side_effects": ["Mild tingling on first use"],
+        },
+        "competitors": [
+            {
+                "name": f"Rival{index} Formula",
+                "description": "A competing formula.",
+                "ingredients": rng.sample(INGREDIENTS, 3),
+                "price": f"${rng.randint(15, 60)}.99",
+            }
+        ],
+    }
+
+
+def variant(rng: random.Random, base: Dict[str, Any], number: int, swap_rate: float) -> Dict[str, Any]:
+    raw_input = json.loads(json.dumps(base))
+    product = raw_input["product"]
+    product["name"] = f"{product['name']} {SHADES[number % len(SHADES)]} {SIZES[number % len(SIZES)]}"
+    # Descriptions repeat the variant's name, as in real catalogs
+    product["description"] = product["description"].replace(base["product"]["name"], product["name"])
+    product["price"] = f"${rng.randint(15, 60)}.99"
+    if rng.random() < swap_rate:
+        slot = rng.randrange(len(product["ingredients"]))
+        product["ingredients"][slot] = rng.choice([item for item in INGREDIENTS if item not in product["ingredients"]])
+    return raw_input
+
+
+def catalog(families: int, variants: int, swap_rate: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    products = []
+    for index in range(families):
+        base = family(rng, index)
+        products.extend({"family": index, "input": variant(rng, base, number, swap_rate)} for number in range(variants))
+    rng.shuffle(products)
+    return products
+
+
+# Completions served by the fake backend in the current scenario
+LLM_CALLS = [0]
+
+
+class CountingFakeChatModel(FakeChatModel):
+    def _completion(self, messages, draw):
+        LLM_CALLS[0] += 1
+        return super()._completion(messages, draw)
+
+
+def counting_factory(**options: Any):
+    return lambda settings: CountingFakeChatModel(model_name=settings.model, **options)
+
+
+def run(products: List[Dict[str, Any]], reuse: bool) -> Dict[str, Any]:
+    from orchestrator import run_pipeline
+    from similarity_index import get_reuse_policy, jaccard, product_features
+
+    for section in SECTIONS:
+        set_reuse_policy(section, ReusePolicy(enabled=reuse))
+    get_similarity_index().clear()
+    reuse_stats.reset()
+    LLM_CALLS[0] = 0
+    threshold = get_reuse_policy("questions").threshold
+
+    latencies = []
+    false_matches = 0
+    seen: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in products:
+            # The nearest product seen so far being in another family would be a false match
+            if reuse and seen:
+                features = product_features(item["input"])
+                nearest = max(seen, key=lambda other: jaccard(features, product_features(other["input"])))
+                if jaccard(features, product_features(nearest["input"])) >= threshold and nearest["family"] != item["family"]:
+                    false_matches += 1
+            began = time.perf_counter()
+            run_pipeline(item["input"], parallel=True)
+            latencies.append(time.perf_counter() - began)
+            seen.append(item)
+    elapsed = time.perf_counter() - start
+
+    stats = reuse_stats.snapshot()
+    row: Dict[str, Any] = {
+        "scenario": "reuse_on" if reuse else "reuse_off",
+        "products": len(products),
+        "llm_calls": LLM_CALLS[0],
+        "mean_s": round(sum(latencies) / len(latencies), 4),
+        "p50_s": round(sorted(latencies)[len(latencies) // 2], 4),
+        "elapsed_s": round(elapsed, 3),
+    }
+    for section in SECTIONS:
+        counts = stats.get(section, {})
+        row[f"{section}_hit_rate"] = counts.get("hit_rate", 0.0)
+        row[f"{section}_reused"] = counts.get("reused", 0)
+        row[f"{section}_regenerated"] = counts.get("regenerated", 0)
+    row["false_matches"] = false_matches
+    return row
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate reuse against the fake LLM.")
+    parser.add_argument("--families", type=int, default=8)
+    parser.add_argument("--variants", type=int, default=6, help="Variants per family.")
+    parser.add_argument("--swap-rate", type=float, default=0.3, help="Share of variants with one ingredient swapped.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Median fake LLM latency in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON (for comparing commits).")
+    args = parser.parse_args()
+
+    products = catalog(args.families, args.variants, args.swap_rate, args.seed)
+    set_llm_factory(counting_factory(latency=lognormal_latency(args.latency, 0.4), seed=args.seed))
+    results = [run(products, reuse=False), run(products, reuse=True)]
+    off, on = results
+    on["latency_saved_s"] = round(off["mean_s"] - on["mean_s"], 4)
+    on["latency_saved_pct"] = round(100 * (off["mean_s"] - on["mean_s"]) / off["mean_s"], 1) if off["mean_s"] else 0.0
+    on["llm_calls_saved"] = off["llm_calls"] - on["llm_calls"]
+
+    columns = list(on)
+    print(" | ".join(columns))
+    for row in results:
+        print(" | ".join(str(row.get(column, "")) for column in columns))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
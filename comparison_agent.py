@@ -1,26 +1,33 @@
-from typing import Dict, Any
-import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from collections import OrderedDict
+from concurrent.futures import Future
+import asyncio
+import copy
+import hashlib
+import threading
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import PydanticOutputParser
-from schemas import ComparisonSchema
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from llm_client import get_llm
+from prompting import AgentPrompt
+from retries import run_with_retries, arun_with_retries
+from schemas import ComparisonSchema, ComparisonListSchema
+from stream_parse import StreamRules, ainvoke_text, invoke_text
 
 # DELETED: _generate_deterministic_comparison (This removes the bug and the audit violation)
 
-def generate_comparison(parsed_input: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generates a side-by-side comparison using an LLM.
-    STRICTLY LLM-ONLY: Crashes if generation fails.
-    """
-    # Initialize LLM
-    llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-    
-    # Setup Parser
-    parser = PydanticOutputParser(pydantic_object=ComparisonSchema)
-    
-    # Setup Prompt
-    prompt = PromptTemplate(
-        template="""You are a competitive analysis expert.
+# Setup Parser
+PARSER = PydanticOutputParser(pydantic_object=ComparisonSchema)
+
+# Upper bound on pairs compared at once for one product (sync path)
+MAX_CONCURRENT_PAIRS = 8
+
+# Setup Prompt (compiled once). The competitor is sent in full; Product A only
+# needs the fields the comparison is judged on.
+PROMPT = AgentPrompt(
+    "comparison",
+    template="""You are a competitive analysis expert.
 Compare 'Product A' (our product) with 'Product B' (competitor).
 
 Product A:
@@ -38,27 +45,175 @@ Task:
 
 {format_instructions}
 """,
-        input_variables=["product_data", "competitor_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+    fields={
+        "product_data": ["name", "ingredients", "benefits", "skin_type", "price"],
+        "competitor_data": None,
+    },
+    parser=PARSER,
+)
 
-    # Prepare Data
-    product_data = json.dumps(parsed_input.get("product", {}), indent=2)
-    competitors = parsed_input.get("competitors", [])
-    # Provide an empty dict if no competitor, prompting the LLM to invent one
-    competitor_data = json.dumps(competitors[0] if competitors else {}, indent=2)
+# Checked while the output streams in (see stream_parse)
+STREAM_RULES = StreamRules(ComparisonSchema)
+
+def _build_chain(llm: Optional[BaseChatModel] = None) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    # Parsing happens in the retry engine so near-valid JSON can be repaired
+    return PROMPT.chain(llm or get_llm("comparison"))
+
+class PairwiseCache:
+    """
+    In-process store of comparison results keyed by the (product, competitor) content pair.
+    Concurrent requests for the same pair, from threads or coroutines, share one computation;
+    failures are not stored. Every caller gets its own copy, so editing a result in place
+    does not change it for later products.
+    """
 
-    # Create Chain
-    chain = prompt | llm | parser
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
 
-    # Execute with retries but NO fallback return
-    max_retries = 3
-    for attempt in range(max_retries):
+    def _claim(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[Future], bool]:
+        # Returns (stored result, future to wait on, whether the caller must compute)
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key], None, False
+            if key in self._inflight:
+                self.hits += 1
+                return None, self._inflight[key], False
+            self.misses += 1
+            future: Future = Future()
+            self._inflight[key] = future
+            return None, future, True
+
+    def _settle(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                result = self._results[key] = copy.deepcopy(result)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        result, future, owner = self._claim(key)
+        if future is None:
+            return copy.deepcopy(result)
+        if not owner:
+            return copy.deepcopy(future.result())
         try:
-            result = chain.invoke({"product_data": product_data, "competitor_data": competitor_data})
-            return result.dict()
-        except Exception as e:
-            if attempt == max_retries - 1:
-                # Fail loudly!
-                raise RuntimeError(f"Comparison generation failed after {max_retries} attempts: {e}")
-            continue
\ No newline at end of file
+            result = compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        result, future, owner = self._claim(key)
+        if future is None:
+            return copy.deepcopy(result)
+        if not owner:
+            return copy.deepcopy(await asyncio.wrap_future(future))
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._results)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+
+# Shared by every product in the process, so a catalog computes each pair once
+pair_cache = PairwiseCache()
+
+# The prompt asks for one verdict per skin type
+VERDICT_SKIN_TYPES = ("oily", "dry", "sensitive")
+
+def _parse_output(text: str) -> Dict[str, Any]:
+    return PARSER.parse(text).model_dump()
+
+def _low_confidence(comparison: Dict[str, Any]) -> Optional[str]:
+    # A small-model comparison that skips a requested verdict escalates (see model_cascade)
+    covered = {verdict["skin_type"].strip().lower() for verdict in comparison["verdicts"]}
+    missing = [skin_type for skin_type in VERDICT_SKIN_TYPES if skin_type not in covered]
+    return f"no verdict for {', '.join(missing)} skin" if missing else None
+
+def _pair_inputs(parsed_input: Dict[str, Any]) -> List[Dict[str, Any]]:
+    product = parsed_input.get("product", {})
+    # Provide an empty dict if no competitor, prompting the LLM to invent one
+    competitors = parsed_input.get("competitors") or [{}]
+    return [PROMPT.inputs(product_data=product, competitor_data=competitor) for competitor in competitors]
+
+def _pair_key(llm: BaseChatModel, inputs: Dict[str, Any]) -> str:
+    # The rendered inputs are exactly what the prompt sees, so they identify the pair
+    model = getattr(llm, "model_name", None) or type(llm).__name__
+    payload = "\n".join([model, inputs["product_data"], inputs["competitor_data"]])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def generate_comparison(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Compares the product with every competitor, concurrently, one LLM call per pair.
+    Returns {"comparisons": [...]} in competitor order.
+    STRICTLY LLM-ONLY: Crashes if any comparison fails.
+    """
+    # Shared, pooled client (see llm_client)
+    llm = llm or get_llm("comparison")
+    chain = _build_chain(llm)
+
+    # Prepare Data
+    pairs = _pair_inputs(parsed_input)
+
+    def compare(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Execute with retries but NO fallback return
+        return pair_cache.get_or_compute(
+            _pair_key(llm, inputs),
+            lambda: run_with_retries(
+                "comparison", lambda: invoke_text(chain, inputs, STREAM_RULES), _parse_output, check=_low_confidence
+            ),
+        )
+
+    if len(pairs) == 1:
+        comparisons = [compare(pairs[0])]
+    else:
+        # Worker threads inherit the context, so retries and cache bypass stay attached to this run
+        with ContextThreadPoolExecutor(max_workers=min(len(pairs), MAX_CONCURRENT_PAIRS)) as executor:
+            comparisons = list(executor.map(compare, pairs))
+
+    return ComparisonListSchema(comparisons=comparisons).model_dump()
+
+async def agenerate_comparison(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Async version of generate_comparison. Crashes if any comparison fails.
+    """
+    llm = llm or get_llm("comparison")
+    chain = _build_chain(llm)
+
+    pairs = _pair_inputs(parsed_input)
+
+    async def compare(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        async def call() -> str:
+            return await ainvoke_text(chain, inputs, STREAM_RULES)
+
+        return await pair_cache.aget_or_compute(
+            _pair_key(llm, inputs),
+            lambda: arun_with_retries("comparison", call, _parse_output, check=_low_confidence),
+        )
+
+    comparisons = await asyncio.gather(*(compare(inputs) for inputs in pairs))
+    return ComparisonListSchema(comparisons=list(comparisons)).model_dump()
@@ -1,25 +1,20 @@
-from typing import Dict, Any, List
-import os
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+from typing import Dict, Any, List, Optional
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import Runnable
+from llm_client import get_llm
+from prompting import AgentPrompt
+from retries import run_with_retries, arun_with_retries
 from schemas import ContentSchema
-import json
+from stream_parse import StreamRules, ainvoke_text, invoke_text
 
-def generate_content(parsed_input: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generates structured content blocks using an LLM with strict validation and aggressive retries.
-    Fails loudly if generation fails after 5 attempts.
-    """
-    # Initialize LLM
-    llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-    
-    # Setup Parser
-    parser = PydanticOutputParser(pydantic_object=ContentSchema)
-    
-    # Setup Prompt
-    prompt = PromptTemplate(
-        template="""You are a content generation assistant.
+# Setup Parser
+PARSER = PydanticOutputParser(pydantic_object=ContentSchema)
+
+# Setup Prompt (compiled once; only the product fields the copy is written from are sent)
+PROMPT = AgentPrompt(
+    "content",
+    template="""You are a content generation assistant.
 Your task is to generate marketing content based STRICTLY on the provided product information.
 
 Constraints:
@@ -32,27 +27,52 @@ Product Data:
 
 {format_instructions}
 """,
-        input_variables=["product_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-
-    # Create Chain
-    chain = prompt | llm | parser
-
-    # Execute with 5 retries
-    max_retries = 5
-    last_exception = None
-
-    for attempt in range(max_retries):
-        try:
-            print(f"Generating content (Attempt {attempt + 1}/{max_retries})...")
-            result = chain.invoke({"product_data": json.dumps(parsed_input, indent=2)})
-            return result.dict()
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            last_exception = e
-            continue
-
-    # Fail loudly if all retries fail
-    raise RuntimeError(f"Failed to generate content after {max_retries} attempts. Last error: {last_exception}")
+    fields={
+        "product_data": [
+            "product.name", "product.description", "product.ingredients", "product.benefits",
+            "product.usage", "product.skin_type", "product.price",
+        ],
+    },
+    parser=PARSER,
+)
+
+# Checked while the output streams in (see stream_parse)
+STREAM_RULES = StreamRules(ContentSchema)
+
+def _build_chain(llm: Optional[BaseChatModel] = None) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    # Parsing happens in the retry engine so near-valid JSON can be repaired
+    return PROMPT.chain(llm or get_llm("content"))
+
+def _parse_output(text: str) -> Dict[str, Any]:
+    return PARSER.parse(text).model_dump()
+
+def _low_confidence(content: Dict[str, Any]) -> Optional[str]:
+    # Empty blocks are allowed for missing data, but not from a small model (see model_cascade)
+    for field in ("headline", "value_proposition", "feature_highlights"):
+        if not content[field]:
+            return f"empty {field.replace('_', ' ')}"
+    return None
+
+def generate_content(parsed_input: Dict[str, Any], analysis: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Generates structured content blocks using an LLM with strict validation and aggressive retries.
+    Fails loudly if generation fails after 5 attempts.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    # Execute with the content retry budget (5 attempts)
+    return run_with_retries("content", lambda: invoke_text(chain, inputs, STREAM_RULES), _parse_output, check=_low_confidence)
+
+async def agenerate_content(parsed_input: Dict[str, Any], analysis: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Async version of generate_content with the same retry and fail-loud behaviour.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    async def call() -> str:
+        return await ainvoke_text(chain, inputs, STREAM_RULES)
 
+    return await arun_with_retries("content", call, _parse_output, check=_low_confidence)
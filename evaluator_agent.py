@@ -1,24 +1,21 @@
-from typing import Dict, Any
-import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+from typing import Dict, Any, List, Optional, Callable
+import re
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import Runnable
+from llm_client import get_llm
+from prompting import AgentPrompt, project_fields
+from retries import run_with_retries, arun_with_retries
+from schemas import EvaluationSchema
+from stream_parse import StreamRules, ainvoke_text, invoke_text
 
-def evaluate_content(parsed_input: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Evaluates generated content against source data for hallucinations and missing critical info.
-    Returns: {'status': 'PASS' | 'FAIL', 'reason': '...'}
-    """
-    try:
-        # Initialize LLM
-        llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-        
-        # Setup Parser
-        parser = JsonOutputParser()
-        
-        # Setup Prompt
-        prompt = PromptTemplate(
-            template="""You are a Quality Assurance AI.
+# Setup Parser
+PARSER = JsonOutputParser()
+
+# Setup Prompt (compiled once). Source fields the content could contradict, and the content itself
+PROMPT = AgentPrompt(
+    "evaluator",
+    template="""You are a Quality Assurance AI.
 Compare the 'Source Data' with the 'Generated Content'.
 
 Source Data:
@@ -39,24 +36,234 @@ Output JSON:
     "reason": "Explanation..."
 }}
 """,
-            input_variables=["source_data", "generated_content"],
-        )
+    fields={
+        "source_data": [
+            "product.name", "product.description", "product.ingredients", "product.benefits",
+            "product.usage", "product.skin_type", "product.price",
+        ],
+        "generated_content": None,
+    },
+)
+
+# Checked while the output streams in (see stream_parse)
+STREAM_RULES = StreamRules(EvaluationSchema)
+
+def _build_chain(llm: Optional[BaseChatModel] = None) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    # Parsing happens in the retry engine so near-valid JSON can be repaired
+    return PROMPT.chain(llm or get_llm("evaluator"))
+
+# Deterministic Pre-check
+# Ingredient and claim words that content must not introduce unless the source has them
+INGREDIENT_TERMS = {
+    "retinol", "retinoid", "peptide", "collagen", "salicylic", "glycolic", "lactic", "mandelic",
+    "azelaic", "kojic", "arbutin", "tranexamic", "hyaluronic", "niacinamide", "ceramide", "squalane",
+    "bakuchiol", "panthenol", "allantoin", "centella", "glycerin", "aloe", "ferulic", "ascorbic",
+    "vitamin", "caffeine", "zinc", "titanium", "spf", "aha", "bha", "paraben", "fragrance", "alcohol",
+    "sulfate", "charcoal", "clay", "snail", "tea",
+}
+CLAIM_TERMS = {
+    "clinically", "clinical", "proven", "dermatologist", "dermatologically", "guaranteed", "guarantee",
+    "cure", "heal", "permanent", "permanently", "instant", "instantly", "fda", "approved", "organic",
+    "vegan", "cruelty", "hypoallergenic", "comedogenic", "miracle", "patented", "scientifically",
+    "medical", "prescription", "award", "natural",
+}
+# Words that carry no factual claim
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it", "its",
+    "of", "on", "or", "that", "the", "this", "to", "with", "your", "you", "our", "more", "every",
+    "each", "all", "day", "daily", "simply", "formula", "product", "new", "look", "feel", "get",
+}
+SUFFIXES = ("ations", "ation", "ening", "ions", "ion", "ing", "ens", "ers", "er", "ed", "es", "s", "ly", "en")
+UNKNOWN_RATIO_LIMIT = 0.35
+
+def _stem(token: str) -> str:
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[: -len(suffix)]
+    return token
+
+def _in_lexicon(token: str, lexicon: set) -> bool:
+    # Plurals and inflections of a lexicon word count as the word
+    return token in lexicon or token.rstrip("s") in lexicon or _stem(token) in lexicon
 
-        # Create Chain
-        chain = prompt | llm | parser
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"\$?\d+(?:[.,]\d+)*%?|[a-z]+", text.lower())
+
+def _text_values(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [text for item in value for text in _text_values(item)]
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _text_values(item)]
+    return []
+
+def precheck_content(parsed_input: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cheap deterministic hallucination check. Builds a term index from the source product
+    and scans the generated content for ingredient or claim words and numbers that are
+    not in the source.
+    Returns {'verdict': 'pass' | 'suspicious' | 'undecided', 'flags': [...], 'reason': '...'}.
+    """
+    source = project_fields(parsed_input, PROMPT.fields["source_data"])
+    source_tokens = set(_tokens(" ".join(_text_values(source))))
+    source_stems = {_stem(token) for token in source_tokens}
+
+    flags: List[str] = []
+    unknown = 0
+    checked = 0
+    for text in _text_values(content):
+        for token in _tokens(text):
+            if token in STOPWORDS:
+                continue
+            checked += 1
+            if token in source_tokens or _stem(token) in source_stems:
+                continue
+            unknown += 1
+            if token[0].isdigit() or token[0] == "$":
+                flags.append(f"number '{token}'")
+            elif _in_lexicon(token, INGREDIENT_TERMS):
+                flags.append(f"ingredient '{token}'")
+            elif _in_lexicon(token, CLAIM_TERMS):
+                flags.append(f"claim '{token}'")
+
+    # Highlights name features or ingredients; one sharing no word with the source is unsupported
+    for highlight in _text_values(content.get("feature_highlights", [])):
+        words = [t for t in _tokens(highlight) if t not in STOPWORDS]
+        if words and not any(t in source_tokens or _stem(t) in source_stems for t in words):
+            flags.append(f"unsupported highlight '{highlight}'")
+
+    if any(not flag.startswith("unsupported") for flag in flags):
+        verdict = "suspicious"
+        reason = "Content mentions terms not found in the source: " + ", ".join(dict.fromkeys(flags))
+    elif flags or (checked and unknown / checked > UNKNOWN_RATIO_LIMIT):
+        verdict = "undecided"
+        reason = f"{unknown} of {checked} content terms are not in the source" + (f"; {', '.join(flags)}" if flags else "")
+    else:
+        verdict = "pass"
+        reason = "All ingredient, claim and number terms are backed by the source."
+    return {"verdict": verdict, "flags": list(dict.fromkeys(flags)), "reason": reason}
+
+def _check_result(result: Any, fail_open: bool = True) -> Dict[str, Any]:
+    # Basic validation
+    if isinstance(result, dict) and "status" in result:
+        return result
+    elif not fail_open:
+        raise ValueError("Evaluator output has no status.")
+    else:
+        return {"status": "PASS", "reason": "Output format error, failing open."}
+
+def _verdict_check(parsed_input: Dict[str, Any], content: Dict[str, Any]) -> Callable[[Any], Optional[str]]:
+    # A small-model verdict is kept only if it is well-formed and does not clear content
+    # that the deterministic pre-check found suspicious (see model_cascade)
+    def check(result: Any) -> Optional[str]:
+        status = result.get("status") if isinstance(result, dict) else None
+        if status not in ("PASS", "FAIL"):
+            return f"status {status!r} is not PASS or FAIL"
+        if status == "PASS" and precheck_content(parsed_input, content)["verdict"] == "suspicious":
+            return "passed content the pre-check flagged as suspicious"
+        return None
+
+    return check
+
+def evaluate_content(
+    parsed_input: Dict[str, Any],
+    content: Dict[str, Any],
+    llm: Optional[BaseChatModel] = None,
+    fail_open: bool = True
+) -> Dict[str, Any]:
+    """
+    Evaluates generated content against source data for hallucinations and missing critical info.
+    Returns: {'status': 'PASS' | 'FAIL', 'reason': '...'}
+    With fail_open=False, errors are raised instead of being reported as a PASS.
+    """
+    try:
+        chain = _build_chain(llm)
 
         # Execute
-        source_str = json.dumps(parsed_input, indent=2)
-        content_str = json.dumps(content, indent=2)
+        inputs = PROMPT.inputs(source_data=parsed_input, generated_content=content)
+        result = run_with_retries(
+            "evaluator", lambda: invoke_text(chain, inputs, STREAM_RULES), PARSER.parse,
+            check=_verdict_check(parsed_input, content),
+        )
         
-        result = chain.invoke({"source_data": source_str, "generated_content": content_str})
+        return _check_result(result, fail_open)
+
+    except Exception as e:
+        if not fail_open:
+            raise
+        # Fail open on error to avoid blocking pipeline
+        return {"status": "PASS", "reason": f"Evaluator error: {str(e)}"}
+
+async def aevaluate_content(
+    parsed_input: Dict[str, Any],
+    content: Dict[str, Any],
+    llm: Optional[BaseChatModel] = None,
+    fail_open: bool = True
+) -> Dict[str, Any]:
+    """
+    Async version of evaluate_content. Fails open on error unless fail_open=False.
+    """
+    try:
+        chain = _build_chain(llm)
+
+        inputs = PROMPT.inputs(source_data=parsed_input, generated_content=content)
+
+        async def call() -> str:
+            return await ainvoke_text(chain, inputs, STREAM_RULES)
+
+        result = await arun_with_retries("evaluator", call, PARSER.parse, check=_verdict_check(parsed_input, content))
         
-        # Basic validation
-        if isinstance(result, dict) and "status" in result:
-            return result
-        else:
-            return {"status": "PASS", "reason": "Output format error, failing open."}
+        return _check_result(result, fail_open)
 
     except Exception as e:
+        if not fail_open:
+            raise
         # Fail open on error to avoid blocking pipeline
         return {"status": "PASS", "reason": f"Evaluator error: {str(e)}"}
+
+def _review_result(precheck: Dict[str, Any], evaluation: Optional[Dict[str, Any]], error: Optional[Exception] = None) -> Dict[str, Any]:
+    if evaluation is None and error is None:
+        return {"status": "PASS", "reason": precheck["reason"], "method": "precheck", "precheck": precheck}
+    if error is not None:
+        # The content was flagged and could not be cleared, so it is not reported as a PASS
+        return {
+            "status": "FLAGGED",
+            "reason": f"{precheck['reason']} (evaluator unavailable: {error})",
+            "method": "precheck",
+            "precheck": precheck,
+        }
+    return {**evaluation, "method": "llm", "precheck": precheck}
+
+def review_content(parsed_input: Dict[str, Any], content: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Pre-checks content deterministically and calls the LLM evaluator only when the
+    pre-check finds it suspicious or cannot decide.
+    Returns: {'status': 'PASS' | 'FAIL' | 'FLAGGED', 'reason': '...', 'method': 'precheck' | 'llm', 'precheck': {...}}
+    """
+    precheck = precheck_content(parsed_input, content)
+    if precheck["verdict"] == "pass":
+        return _review_result(precheck, None)
+
+    print(f">>> Pre-check {precheck['verdict']}: {precheck['reason']}. Running LLM evaluator...")
+    try:
+        evaluation = evaluate_content(parsed_input, content, llm=llm, fail_open=False)
+    except Exception as e:
+        return _review_result(precheck, None, e)
+    return _review_result(precheck, evaluation)
+
+async def areview_content(parsed_input: Dict[str, Any], content: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Any]:
+    """
+    Async version of review_content.
+    """
+    precheck = precheck_content(parsed_input, content)
+    if precheck["verdict"] == "pass":
+        return _review_result(precheck, None)
+
+    print(f">>> Pre-check {precheck['verdict']}: {precheck['reason']}. Running LLM evaluator...")
+    try:
+        evaluation = await aevaluate_content(parsed_input, content, llm=llm, fail_open=False)
+    except Exception as e:
+        return _review_result(precheck, None, e)
+    return _review_result(precheck, evaluation)
@@ -0,0 +1,159 @@
+from typing import Dict, Any, Optional, Tuple
+import json
+import math
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_llm import schema_payload
+from rate_limits import TokenBucket
+
+
+class FakeRateLimitedEndpoint:
+    """
+    Local OpenAI-compatible chat completions server (the protocol Groq speaks) that
+    enforces requests-per-minute and tokens-per-minute limits like the real provider:
+    x-ratelimit-* headers on every response, and 429 with Retry-After when a call would
+    exceed either limit. Answers come from fake_llm.schema_payload, streamed as
+    server-sent events when the request asks for it. Point the real client at it with
+    LLM_BASE_URL=endpoint.base_url (any GROQ_API_KEY works).
+    """
+
+    def __init__(self, requests_per_minute: int = 30, tokens_per_minute: int = 6000, latency: float = 0.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.latency = latency
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._stats = {"served": 0, "rate_limited": 0, "tokens": 0}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _rate_limit_headers(self, now: float) -> Dict[str, str]:
+        def reset(bucket: TokenBucket) -> str:
+            return f"{bucket.wait_time(bucket.capacity, now):.2f}s"
+
+        return {
+            "x-ratelimit-limit-requests": str(self.requests_per_minute),
+            "x-ratelimit-limit-tokens": str(self.tokens_per_minute),
+            "x-ratelimit-remaining-requests": str(max(0, math.floor(self._requests.level))),
+            "x-ratelimit-remaining-tokens": str(max(0, math.floor(self._tokens.level))),
+            "x-ratelimit-reset-requests": reset(self._requests),
+            "x-ratelimit-reset-tokens": reset(self._tokens),
+        }
+
+    def handle(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """
+        Serves one chat completion request: (status, headers, JSON body).
+        """
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = json.dumps(schema_payload(prompt))
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(text) // 4
+        total = prompt_tokens + completion_tokens
+
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(total, now))
+            if wait > 0:
+                self._stats["rate_limited"] += 1
+                headers = {**self._rate_limit_headers(now), "retry-after": str(math.ceil(wait))}
+                error = {"error": {
+                    "message": f"Rate limit reached for model {body.get('model')}. Please try again in {wait:.2f}s.",
+                    "type": "tokens", "code": "rate_limit_exceeded",
+                }}
+                return 429, headers, error
+            self._requests.take(1, now)
+            self._tokens.take(total, now)
+            self._stats["served"] += 1
+            self._stats["tokens"] += total
+            headers = self._rate_limit_headers(now)
+
+        if self.latency:
+            time.sleep(self.latency)
+        return 200, headers, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total},
+        }
+
+    @staticmethod
+    def stream_events(completion: Dict[str, Any], chunk_size: int = 16) -> bytes:
+        """
+        Re-encodes a completion as chat.completion.chunk events, usage on the last one (like Groq).
+        """
+        text = completion["choices"][0]["message"]["content"]
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        deltas = [{"role": "assistant", "content": ""}] + [
+            {"content": text[i:i + chunk_size]} for i in range(0, len(text), chunk_size)
+        ]
+        events = [
+            {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            for delta in deltas
+        ]
+        events.append({
+            **base, "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": completion["usage"]},
+        })
+        lines = [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+        return "".join(lines).encode()
+
+    def start(self) -> "FakeRateLimitedEndpoint":
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    status, headers, payload = 404, {}, {"error": {"message": "not found"}}
+                else:
+                    status, headers, payload = endpoint.handle(body)
+                if status == 200 and body.get("stream"):
+                    data, content_type = endpoint.stream_events(payload), "text/event-stream"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def __enter__(self) -> "FakeRateLimitedEndpoint":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,320 @@
+from typing import Dict, Any, Iterator, List, Optional, Callable, Tuple
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+# Latency models: each takes the model's RNG and returns seconds to wait
+
+LatencyModel = Callable[[random.Random], float]
+
+def constant_latency(seconds: float) -> LatencyModel:
+    return lambda rng: seconds
+
+def uniform_latency(low: float, high: float) -> LatencyModel:
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> LatencyModel:
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+def spiky_latency(base: float, spike: float, spike_rate: float) -> LatencyModel:
+    """
+    Mostly `base`, but `spike_rate` of calls take `spike` seconds (tail-latency tests).
+    """
+    return lambda rng: spike if rng.random() < spike_rate else base
+
+
+class APIConnectionError(Exception):
+    """Injected transport failure; named like the SDK error so the retry engine backs off."""
+
+
+CATEGORIES = ["Informational", "Usage", "Safety", "Purchase", "Comparison"]
+
+
+def _product_name(prompt: str) -> str:
+    match = re.search(r'"name":\s*"([^"]*)"', prompt)
+    return match.group(1) if match else "Product A"
+
+
+def _product_field(prompt: str, key: str, default: Any) -> Any:
+    # First occurrence in the compact product JSON; the product comes before its competitors
+    match = re.search(rf'"{key}":(\[[^\]]*\]|"[^"]*")', prompt)
+    if not match:
+        return default
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return default
+
+
+def _qa_answer(prompt: str, name: str, category: str, number: int) -> str:
+    # Purchase answers quote the price and informational ones an ingredient, like real answers do
+    if category == "Purchase":
+        return f"{name} costs {_product_field(prompt, 'price', '$0')} (answer {number})."
+    if category == "Informational":
+        ingredients = _product_field(prompt, "ingredients", []) or ["its actives"]
+        return f"{name} contains {ingredients[number % len(ingredients)]} (answer {number})."
+    return f"{name} answer {number}, based on the product data."
+
+
+def _qa_payload(prompt: str, name: str) -> Dict[str, Any]:
+    # Top-up requests ask for "exactly N NEW Q&A pairs"
+    top_up = re.search(r"exactly (\d+) NEW Q&A pairs", prompt)
+    count = int(top_up.group(1)) if top_up else 15
+    # New pairs are numbered after the existing ones, which may have gaps (see similarity_index)
+    existing = re.findall(r"^- \[.*?\(#(\d+)\)\?$", prompt, flags=re.M)
+    offset = max([int(number) for number in existing], default=len(re.findall(r"^- \[", prompt, flags=re.M)))
+    return {
+        "qa_pairs": [
+            {
+                "question": f"What should I know about {name} (#{offset + i + 1})?",
+                "answer": _qa_answer(prompt, name, CATEGORIES[(offset + i) % len(CATEGORIES)], offset + i + 1),
+                "category": CATEGORIES[(offset + i) % len(CATEGORIES)],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def _analysis_payload(name: str) -> Dict[str, Any]:
+    return {
+        "key_questions": [f"Is {name} suitable for sensitive skin?", f"How long does {name} last?", "How often should it be applied?"],
+        "observations": [f"{name} lists its ingredients and price.", "Competitor data is present.", "Usage instructions are clear."],
+    }
+
+
+def _content_payload(prompt: str, name: str) -> Dict[str, Any]:
+    return {
+        "headline": f"{name}: brighter skin, simply",
+        "value_proposition": [f"{name} brightens dull skin", "Lightweight daily formula"],
+        "feature_highlights": _product_field(prompt, "ingredients", [])[:2] or ["Vitamin C", "Hyaluronic Acid"],
+    }
+
+
+def schema_payload(prompt: str) -> Dict[str, Any]:
+    """
+    Returns a schema-valid payload for whichever agent produced the prompt.
+    """
+    name = _product_name(prompt)
+
+    if "product page generation assistant" in prompt:
+        return {
+            "analysis": _analysis_payload(name),
+            "content": _content_payload(prompt, name),
+            "questions": _qa_payload(prompt, name),
+        }
+    if "expert product analyst" in prompt:
+        return _analysis_payload(name)
+    if "content generation assistant" in prompt:
+        return _content_payload(prompt, name)
+    if "Q&A generation assistant" in prompt:
+        return _qa_payload(prompt, name)
+    if "competitive analysis expert" in prompt:
+        competitor = re.search(r'Product B:\s*\{"name":"([^"]*)"', prompt)
+        return {
+            "product_b_name": competitor.group(1) if competitor else "Product B",
+            "ingredient_comparison": f"{name} adds Hyaluronic Acid.",
+            "benefit_comparison": f"{name} focuses on brightening and hydration.",
+            "verdicts": [
+                {"skin_type": skin_type, "winner": name, "reasoning": "Lighter formula."}
+                for skin_type in ("Oily", "Dry", "Sensitive")
+            ],
+        }
+    if "Quality Assurance AI" in prompt:
+        return {"status": "PASS", "reason": "Content matches the source data."}
+
+    return {}
+
+
+def _malform(text: str, rng: random.Random) -> str:
+    # Near-valid (repairable) and hopeless outputs, like real models produce
+    choice = rng.randrange(4)
+    if choice == 0:
+        return f"Here is the JSON you asked for:\n```json\n{text}\n```\nLet me know if you need more."
+    if choice == 1:
+        return text[: max(1, int(len(text) * rng.uniform(0.3, 0.9)))]
+    if choice == 2:
+        return text[:-1] + ",}" if text.endswith("}") else text
+    return "I'm sorry, I can't produce that right now."
+
+
+def _derail(payload: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    # Well-formed JSON that goes wrong partway through: an unknown category on one of the
+    # Q&A pairs, or one field under a different name (in place, so later fields still follow)
+    pairs = payload.get("qa_pairs") or payload.get("questions", {}).get("qa_pairs")
+    if pairs:
+        pairs[rng.randrange(len(pairs))]["category"] = "General"
+        return payload
+    renamed = rng.choice(list(payload)) if payload else None
+    return {(f"{key}_text" if key == renamed else key): value for key, value in payload.items()}
+
+
+def _weaken(payload: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    # Schema-valid but short of what the prompt asked for, as small models tend to answer
+    pairs = payload.get("qa_pairs") or payload.get("questions", {}).get("qa_pairs")
+    if pairs:
+        del pairs[rng.randrange(10, len(pairs)):]
+    for key in ("key_questions", "observations", "verdicts"):
+        if key in payload:
+            payload[key] = payload[key][:2]
+    if "feature_highlights" in payload:
+        payload["feature_highlights"] = []
+    return payload
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model that answers every agent prompt with a
+    schema-valid JSON payload. Latency, transient failures, malformed outputs and
+    outputs that break the schema partway through can be injected to exercise retries
+    and measure orchestration overhead, and weak (valid but incomplete) answers to
+    exercise the model cascade. Streaming spreads the latency over the chunks.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    latency: Optional[LatencyModel] = None
+    failure_rate: float = 0.0
+    malformed_rate: float = 0.0
+    off_rails_rate: float = 0.0
+    weak_rate: float = 0.0
+    chunk_size: int = 16
+    seed: int = 0
+    model_name: str = "fake-llm"
+
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def _draw(self) -> Dict[str, float]:
+        # One RNG draw per call, under a lock, so runs are reproducible for a given seed
+        with self._lock:
+            return {
+                "delay": self.latency(self._rng) if self.latency else 0.0,
+                "fail": self._rng.random(),
+                "malformed": self._rng.random(),
+                "off_rails": self._rng.random(),
+                "weak": self._rng.random(),
+                "rng_seed": self._rng.random(),
+            }
+
+    def _completion(self, messages: List[BaseMessage], draw: Dict[str, float]) -> Tuple[str, Dict[str, int]]:
+        if draw["fail"] < self.failure_rate:
+            raise APIConnectionError("Injected transport failure")
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        payload = schema_payload(prompt)
+        if draw["weak"] < self.weak_rate:
+            payload = _weaken(payload, random.Random(draw["rng_seed"]))
+        if draw["off_rails"] < self.off_rails_rate:
+            payload = _derail(payload, random.Random(draw["rng_seed"]))
+        text = json.dumps(payload)
+        if draw["malformed"] < self.malformed_rate:
+            text = _malform(text, random.Random(draw["rng_seed"]))
+
+        # Rough token counts (~4 characters per token) so instrumentation has numbers
+        usage = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(text) // 4,
+            "total_tokens": len(prompt) // 4 + len(text) // 4,
+        }
+        return text, usage
+
+    def _respond(self, messages: List[BaseMessage], draw: Dict[str, float]) -> ChatResult:
+        text, usage = self._completion(messages, draw)
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages: List[BaseMessage], draw: Dict[str, float]) -> Iterator[Tuple[float, ChatGenerationChunk]]:
+        # (delay before the chunk, chunk); usage rides on the last chunk, as with real providers
+        text, usage = self._completion(messages, draw)
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        step = draw["delay"] / len(pieces)
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            yield step, ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage if last else None))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        draw = self._draw()
+        if draw["delay"]:
+            time.sleep(draw["delay"])
+        return self._respond(messages, draw)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        draw = self._draw()
+        if draw["delay"]:
+            await asyncio.sleep(draw["delay"])
+        return self._respond(messages, draw)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(messages, self._draw()):
+            if delay:
+                time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ):
+        for delay, chunk in self._chunks(messages, self._draw()):
+            if delay:
+                await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_llm_factory(models: Optional[Dict[str, Dict[str, Any]]] = None, **kwargs: Any):
+    """
+    Returns an llm_client factory that serves FakeChatModel instances, e.g.
+    set_llm_factory(fake_llm_factory(latency=lognormal_latency(0.8), failure_rate=0.05)).
+    `models` overrides the options per model name, e.g. a faster but weaker small model.
+    """
+    def factory(settings) -> BaseChatModel:
+        options = {**kwargs, **(models or {}).get(settings.model, {})}
+        return FakeChatModel(model_name=settings.model, **options)
+
+    return factory
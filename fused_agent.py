@@ -0,0 +1,95 @@
+from typing import Dict, Any, Optional
+import json
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import Runnable
+from pydantic import ValidationError
+from llm_client import get_llm
+from prompting import AgentPrompt
+from question_agent import merge_qa_pairs
+from retries import run_with_retries, arun_with_retries
+from schemas import AnalysisSchema, ContentSchema, QuestionOutputSchema, FusedGenerationSchema
+
+# Setup Parser (used for the envelope's format instructions; sections are validated one by one)
+PARSER = PydanticOutputParser(pydantic_object=FusedGenerationSchema)
+
+SECTIONS: Dict[str, type] = {
+    "analysis": AnalysisSchema,
+    "content": ContentSchema,
+    "questions": QuestionOutputSchema,
+}
+
+# Setup Prompt (compiled once). Analysis reports missing fields, so the full input is sent.
+PROMPT = AgentPrompt(
+    "fused",
+    template="""You are a product page generation assistant.
+From the provided product information, produce three sections in ONE JSON object.
+
+1. "analysis": identify missing fields (Price, Ingredients, etc.), 3-5 key questions a user
+   might have and 3-5 analytical observations. If competitors are missing, note this.
+2. "content": marketing content based STRICTLY on the product data. Do NOT invent facts;
+   leave a field empty if the information is missing.
+3. "questions": exactly 15 Q&A pairs with answers based on the product data. Each pair
+   must have a 'category': Informational, Usage, Safety, Purchase, Comparison. If no
+   competitor exists, invent a fictional Product B for comparison questions.
+
+Product Data:
+{product_data}
+
+{format_instructions}
+""",
+    fields={"product_data": None},
+    parser=PARSER,
+)
+
+def _build_chain(llm: Optional[BaseChatModel] = None) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    # Parsing happens in the retry engine so near-valid JSON can be repaired
+    return PROMPT.chain(llm or get_llm("fused"))
+
+def _validate_section(key: str, value: Any) -> Optional[Dict[str, Any]]:
+    schema = SECTIONS[key]
+    if not isinstance(value, dict):
+        return None
+    try:
+        section = schema(**value).model_dump()
+    except ValidationError:
+        return None
+    if key == "questions":
+        section = {"qa_pairs": merge_qa_pairs(section["qa_pairs"], [])}
+        return section if section["qa_pairs"] else None
+    return section
+
+def _parse_output(text: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    # Each section is validated on its own: an invalid one comes back as None so that
+    # only it is regenerated. A reply with no usable section is retried.
+    envelope = json.loads(text)
+    if not isinstance(envelope, dict):
+        raise ValueError("Fused output is not a JSON object.")
+    sections = {key: _validate_section(key, envelope.get(key)) for key in SECTIONS}
+    if all(section is None for section in sections.values()):
+        raise ValueError("Fused output has no valid section.")
+    return sections
+
+def generate_fused(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Generates analysis, content and questions in a single LLM call.
+    Returns {"analysis": ..., "content": ..., "questions": ...}; sections that failed
+    validation are None and must be produced by their own agent.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    return run_with_retries("fused", lambda: chain.invoke(inputs).content, _parse_output)
+
+async def agenerate_fused(parsed_input: Dict[str, Any], llm: Optional[BaseChatModel] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Async version of generate_fused.
+    """
+    chain = _build_chain(llm)
+    inputs = PROMPT.inputs(product_data=parsed_input)
+
+    async def call() -> str:
+        return (await chain.ainvoke(inputs)).content
+
+    return await arun_with_retries("fused", call, _parse_output)
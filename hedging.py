@@ -0,0 +1,268 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple, TypeVar
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pydantic import BaseModel
+from instrumentation import instrumentation_enabled, metrics
+from model_cascade import current_tier
+
+T = TypeVar("T")
+
+# Opt-in request hedging for agent LLM calls. When an attempt (call + parse) has not
+# finished by a percentile of that agent's recent attempt latencies, a duplicate is sent;
+# the first one that returns a parsed, schema-valid result wins. Each hedge spends from
+# a per-agent allowance that grows by `budget` per call, so extra load stays bounded.
+# With a model cascade, small- and large-model attempts keep separate latency windows.
+# Enable with LLM_HEDGE_AGENTS=questions,content (or "all"), or set_hedge_policy().
+
+
+class HedgePolicy(BaseModel):
+    enabled: bool = False
+    percentile: float = 95.0
+    # Hedges allowed per call in the long run, and how many may be saved up
+    budget: float = 0.1
+    max_burst: float = 3.0
+    # Latency samples needed before hedging starts, and how many are kept
+    min_samples: int = 10
+    window: int = 200
+    min_delay: float = 0.05
+
+
+HEDGE_POLICIES: Dict[str, HedgePolicy] = {}
+
+
+def _env_policy(agent: str) -> HedgePolicy:
+    agents = {name.strip() for name in os.getenv("LLM_HEDGE_AGENTS", "").split(",") if name.strip()}
+    if "all" not in agents and agent not in agents:
+        return HedgePolicy()
+    overrides: Dict[str, Any] = {"enabled": True}
+    if os.getenv("LLM_HEDGE_PERCENTILE"):
+        overrides["percentile"] = float(os.environ["LLM_HEDGE_PERCENTILE"])
+    if os.getenv("LLM_HEDGE_BUDGET"):
+        overrides["budget"] = float(os.environ["LLM_HEDGE_BUDGET"])
+    return HedgePolicy(**overrides)
+
+
+def get_hedge_policy(agent: str) -> HedgePolicy:
+    return HEDGE_POLICIES.get(agent) or _env_policy(agent)
+
+
+def set_hedge_policy(agent: str, policy: Optional[HedgePolicy]) -> None:
+    """
+    Sets an agent's hedge policy; None goes back to the environment's.
+    """
+    if policy is None:
+        HEDGE_POLICIES.pop(agent, None)
+    else:
+        HEDGE_POLICIES[agent] = policy
+    reset_hedging(agent)
+
+
+class HedgeState:
+    """
+    One agent's recent attempt latencies, hedge allowance and counters. Thread-safe.
+    """
+
+    def __init__(self, policy: HedgePolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=policy.window)
+        self._allowance = 0.0
+        self._stats: Dict[str, int] = {"calls": 0, "hedged": 0, "hedge_won": 0, "over_budget": 0}
+
+    def start_call(self) -> Optional[float]:
+        """
+        Counts a call, tops up the allowance and returns the hedge delay (None: not yet known).
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            self._allowance = min(self.policy.max_burst, self._allowance + self.policy.budget)
+            if len(self._latencies) < self.policy.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, max(0, math.ceil(self.policy.percentile / 100 * len(ordered)) - 1))
+            return max(self.policy.min_delay, ordered[index])
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def take_hedge(self) -> bool:
+        with self._lock:
+            if self._allowance < 1:
+                self._stats["over_budget"] += 1
+                return False
+            self._allowance -= 1
+            self._stats["hedged"] += 1
+            return True
+
+    def hedge_won(self) -> None:
+        with self._lock:
+            self._stats["hedge_won"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "samples": len(self._latencies)}
+
+
+_states_lock = threading.Lock()
+# Keyed by (agent, model tier): mixing small- and large-model latencies in one window
+# would skew the percentile for both
+_states: Dict[Tuple[str, str], HedgeState] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _state(agent: str, policy: HedgePolicy) -> HedgeState:
+    key = (agent, current_tier())
+    with _states_lock:
+        state = _states.get(key)
+        if state is None or state.policy != policy:
+            state = _states[key] = HedgeState(policy)
+        return state
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Sync attempts run here so the caller can stop waiting on a slow one
+    global _executor
+    with _states_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_THREADS", "256")), thread_name_prefix="llm-hedge")
+        return _executor
+
+
+def hedge_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Counters per agent, summed over its model tiers.
+    """
+    with _states_lock:
+        states = dict(_states)
+    totals: Dict[str, Dict[str, Any]] = {}
+    for (agent, _), state in states.items():
+        agent_totals = totals.setdefault(agent, {})
+        for name, value in state.stats().items():
+            agent_totals[name] = agent_totals.get(name, 0) + value
+    return totals
+
+
+def reset_hedging(agent: Optional[str] = None) -> None:
+    """
+    Forgets recorded latencies and counters (of one agent, or all).
+    """
+    with _states_lock:
+        if agent is None:
+            _states.clear()
+        else:
+            for key in [key for key in _states if key[0] == agent]:
+                del _states[key]
+
+
+def _report(agent: str, outcome: str) -> None:
+    if instrumentation_enabled():
+        metrics.inc("pipeline_llm_hedges_total", agent=agent, outcome=outcome)
+
+
+def _announce(agent: str, delay: float) -> None:
+    print(f"Hedging {agent}: no result after {delay:.2f}s, sending a duplicate request...")
+    _report(agent, "fired")
+
+
+def _timed(state: HedgeState, attempt: Callable[[], T]) -> T:
+    # Every finished attempt counts, including losers, so the percentile sees the real tail
+    start = time.monotonic()
+    result = attempt()
+    state.record_latency(time.monotonic() - start)
+    return result
+
+
+def hedged_call(agent: str, attempt: Callable[[], T]) -> T:
+    """
+    Runs one attempt (LLM call plus parsing) under the agent's hedge policy.
+    Without a policy it is just attempt(). A losing sync attempt cannot be interrupted
+    mid-request; it finishes in the background and its result is dropped.
+    """
+    policy = get_hedge_policy(agent)
+    if not policy.enabled:
+        return attempt()
+    state = _state(agent, policy)
+    delay = state.start_call()
+
+    if delay is None:
+        return _timed(state, attempt)
+
+    executor = _get_executor()
+    # Each attempt runs in a copy of the caller's context (cache bypass, priority, trace)
+    primary = executor.submit(contextvars.copy_context().run, _timed, state, attempt)
+    done, _ = wait([primary], timeout=delay)
+    if done or not state.take_hedge():
+        return primary.result()
+
+    _announce(agent, delay)
+    hedge = executor.submit(contextvars.copy_context().run, _timed, state, attempt)
+    pending: List[Future] = [primary, hedge]
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in [primary, hedge]:
+            if future not in done or future not in pending:
+                continue
+            pending.remove(future)
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                if future is hedge:
+                    state.hedge_won()
+                    _report(agent, "won")
+                return future.result()
+    # Both failed: the retry engine sees the primary's error
+    return primary.result()
+
+
+async def ahedged_call(agent: str, attempt: Callable[[], Awaitable[T]]) -> T:
+    """
+    Async version of hedged_call; the losing attempt is cancelled.
+    """
+    policy = get_hedge_policy(agent)
+    if not policy.enabled:
+        return await attempt()
+    state = _state(agent, policy)
+    delay = state.start_call()
+
+    async def timed() -> T:
+        start = time.monotonic()
+        result = await attempt()
+        state.record_latency(time.monotonic() - start)
+        return result
+
+    if delay is None:
+        return await timed()
+    # Tasks copy the caller's context, like the sync executor does
+    primary = asyncio.ensure_future(timed())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not state.take_hedge():
+            return await primary
+
+        _announce(agent, delay)
+        hedge = asyncio.ensure_future(timed())
+        tasks.append(hedge)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task in done and task.exception() is None:
+                    if task is hedge:
+                        state.hedge_won()
+                        _report(agent, "won")
+                    return task.result()
+        # Both failed: the retry engine sees the primary's error
+        return primary.result()
+    finally:
+        # The losing attempt, or every attempt when the caller is cancelled, stops here
+        for task in tasks:
+            if not task.done():
+                task.cancel()
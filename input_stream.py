@@ -0,0 +1,219 @@
+from typing import Dict, List, Iterator, Optional, Tuple, TextIO
+import json
+import re
+from pathlib import Path
+from pydantic import TypeAdapter, ValidationError
+
+from artifacts import JsonlSink
+from schemas import ParsedInputSchema
+
+# Rows validated per pydantic call, and characters read per chunk of a JSON array
+DEFAULT_BATCH_SIZE = 200
+CHUNK_SIZE = 1 << 20
+
+# Compiled once: validates a whole batch of JSON rows in a single call
+_BATCH_ADAPTER = TypeAdapter(List[ParsedInputSchema])
+
+# (record_id, position, JSON text). Position is the line or array index, None for a file.
+Record = Tuple[str, Optional[int], str]
+
+
+def slugify(value: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+    return slug or "product"
+
+
+def _iter_jsonl(f: TextIO) -> Iterator[Record]:
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if line:
+            yield f"line-{line_number}", line_number, line
+
+
+def _needs_more_data(error: json.JSONDecodeError, buffer: str) -> bool:
+    # Truncated input fails near the end of the buffer (e.g. inside a \\u escape),
+    # or reports the start of a string that never closes
+    return error.pos >= len(buffer) - 16 or error.msg.startswith("Unterminated string")
+
+
+def _iter_json_array(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Record]:
+    """
+    Yields the items of a top-level JSON array one at a time, reading the file in chunks
+    so memory stays bounded by the largest item rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof, index = "", 0, False, 0
+
+    def read_more() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+        return not eof
+
+    read_more()
+    pos = len(buffer) - len(buffer.lstrip()) + 1  # skip the opening bracket
+    while True:
+        # Skip whitespace and the separator before the next item
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                break
+        if pos >= len(buffer) or buffer[pos] == "]":
+            return
+
+        try:
+            _, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if not eof and _needs_more_data(e, buffer) and read_more():
+                continue
+            # The array cannot be resynchronised after a syntax error, so reading stops here
+            index += 1
+            print(f"Malformed JSON array at item {index}: {e.msg}. The rest of the array is skipped.")
+            yield f"item-{index}", index, buffer[pos:pos + 1000]
+            return
+        if end == len(buffer) and not eof and read_more():
+            continue  # a number may continue in the next chunk
+
+        index += 1
+        yield f"item-{index}", index, buffer[pos:end]
+        pos = end
+
+
+def iter_records(source: str) -> Iterator[Record]:
+    """
+    Yields the raw JSON text of every product payload in a catalog without holding
+    the catalog in memory. Accepts a directory of *.json files, a JSON file holding
+    one payload or an array of payloads, or a JSONL file (one payload per line).
+    """
+    path = Path(source)
+
+    if path.is_dir():
+        for file in sorted(path.glob("*.json")):
+            yield file.stem, None, file.read_text()
+        return
+
+    with open(path, "r") as f:
+        head = f.read(64).lstrip()
+        f.seek(0)
+        if head.startswith("["):
+            yield from _iter_json_array(f)
+        elif head.startswith("{") and path.suffix == ".json":
+            yield path.stem, None, f.read()
+        else:
+            yield from _iter_jsonl(f)
+
+
+def _error_details(error: ValidationError) -> List[Dict[str, str]]:
+    return [
+        {"loc": ".".join(str(part) for part in detail["loc"]), "msg": detail["msg"], "type": detail["type"]}
+        for detail in error.errors(include_url=False)
+    ]
+
+
+def _product_id(record_id: str, position: Optional[int], parsed: ParsedInputSchema) -> str:
+    # Numbered rows are labelled by product name; files keep their stem
+    return f"{slugify(parsed.product.name)}-{position}" if position is not None else record_id
+
+
+class CatalogValidator:
+    """
+    Streams a catalog through the ParsedInputSchema validator in batches. Valid rows
+    are yielded one at a time; invalid ones are counted, printed and appended to
+    `reject_path` (JSONL, with their error details and raw text) instead of aborting.
+    """
+
+    def __init__(self, reject_path: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.reject_path = reject_path
+        self.batch_size = max(1, batch_size)
+        self.valid = 0
+        self.rejected = 0
+        self._sink: Optional[JsonlSink] = None
+        # Rejects describe this run only
+        if reject_path is not None:
+            Path(reject_path).unlink(missing_ok=True)
+
+    def _reject(self, record: Record, errors: List[Dict[str, str]]) -> None:
+        record_id, _, text = record
+        self.rejected += 1
+        first = errors[0] if errors else {"loc": "", "msg": "invalid"}
+        print(f"[REJECTED] {record_id}: {first['loc'] or 'input'}: {first['msg']} ({len(errors)} error(s))")
+        if self.reject_path is None:
+            return
+        if self._sink is None:
+            self._sink = JsonlSink(self.reject_path)
+        self._sink.write({"record_id": record_id, "errors": errors, "raw": text})
+
+    def _validate_one(self, record: Record) -> Optional[ParsedInputSchema]:
+        try:
+            return ParsedInputSchema.model_validate_json(record[2])
+        except ValidationError as e:
+            self._reject(record, _error_details(e))
+            return None
+
+    def _validate_rows(self, batch: List[Record]) -> List[Optional[ParsedInputSchema]]:
+        # Fast path: the whole batch in one call
+        try:
+            parsed_rows = _BATCH_ADAPTER.validate_json("[" + ",".join(text for _, _, text in batch) + "]")
+            if len(parsed_rows) == len(batch):
+                return parsed_rows
+            errors = []
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+
+        # Schema errors carry the row index, so only those rows are rejected and the rest
+        # go through one more batch call. Rows that are not valid JSON leave no index,
+        # so that batch is validated row by row.
+        bad_rows = {detail["loc"][0] for detail in errors if detail["loc"] and isinstance(detail["loc"][0], int)}
+        if not bad_rows or max(bad_rows) >= len(batch):
+            return [self._validate_one(record) for record in batch]
+
+        for index in sorted(bad_rows):
+            self._validate_one(batch[index])
+        rest = [record for index, record in enumerate(batch) if index not in bad_rows]
+        rest_rows = iter(self._validate_rows(rest) if rest else [])
+        return [None if index in bad_rows else next(rest_rows) for index in range(len(batch))]
+
+    def _validate_batch(self, batch: List[Record]) -> Iterator[Tuple[str, ParsedInputSchema]]:
+        for (record_id, position, _), parsed in zip(batch, self._validate_rows(batch)):
+            if parsed is not None:
+                self.valid += 1
+                yield _product_id(record_id, position, parsed), parsed
+
+    def stream(self, source: str) -> Iterator[Tuple[str, ParsedInputSchema]]:
+        """
+        Yields (product_id, ParsedInputSchema) for every valid row of `source`.
+        Only one batch of rows is held in memory at a time.
+        """
+        batch: List[Record] = []
+        for record in iter_records(source):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield from self._validate_batch(batch)
+                batch = []
+        if batch:
+            yield from self._validate_batch(batch)
+
+    def close(self) -> None:
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def __enter__(self) -> "CatalogValidator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def stream_catalog(
+    source: str,
+    reject_path: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Tuple[str, ParsedInputSchema]]:
+    """
+    Generator over the valid rows of a catalog; see CatalogValidator.
+    """
+    with CatalogValidator(reject_path, batch_size) as validator:
+        yield from validator.stream(source)
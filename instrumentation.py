@@ -0,0 +1,333 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import deque
+from uuid import UUID
+import bisect
+import json
+import os
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Instrumentation is off unless PIPELINE_METRICS=1 or enable_instrumentation() is called.
+# When off, runs get no callback handler and no trace, so the only cost is one flag check.
+_enabled = os.getenv("PIPELINE_METRICS", "").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+MAX_KEPT_TRACES = 10000
+
+
+def enable_instrumentation(enabled: bool = True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def instrumentation_enabled() -> bool:
+    return _enabled
+
+
+class RunTrace:
+    """
+    Timing, token, retry and cache record of one product run.
+    """
+
+    def __init__(self, product_id: str):
+        self.product_id = product_id
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.nodes: List[Dict[str, Any]] = []
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.retries: Dict[str, Dict[str, int]] = {}
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_time(self) -> float:
+        return (self.started_at or self.submitted_at) - self.submitted_at
+
+    @property
+    def wall_time(self) -> float:
+        return (self.ended_at or time.time()) - self.submitted_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "product_id": self.product_id,
+                "status": self.status,
+                "error": self.error,
+                "wall_time": round(self.wall_time, 6),
+                "queue_time": round(self.queue_time, 6),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hits": self.cache_hits,
+                "retries": {agent: dict(reasons) for agent, reasons in self.retries.items()},
+                "nodes": [dict(node) for node in self.nodes],
+                "llm_calls": [dict(call) for call in self.llm_calls],
+            }
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    Fills a RunTrace from LangChain callbacks: graph nodes are the direct children of
+    the graph run, LLM calls come from chat model events, and retries arrive as custom
+    events dispatched by the retry engine.
+    """
+
+    def __init__(self, trace: RunTrace):
+        self.trace = trace
+        self._root_run: Optional[UUID] = None
+        self._open_nodes: Dict[UUID, Dict[str, Any]] = {}
+        self._open_calls: Dict[UUID, Dict[str, Any]] = {}
+        self._last_node_end: Optional[float] = None
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        now = time.time()
+        trace = self.trace
+        with trace._lock:
+            if parent_run_id is None and self._root_run is None:
+                self._root_run = run_id
+                trace.started_at = now
+                return
+            if parent_run_id != self._root_run or kwargs.get("name") != (metadata or {}).get("langgraph_node"):
+                return
+            # Queue time: how long the node waited after the latest upstream node finished
+            ready_at = self._last_node_end or trace.started_at or now
+            self._open_nodes[run_id] = {
+                "node": kwargs.get("name"),
+                "step": (metadata or {}).get("langgraph_step"),
+                "start": now,
+                "queue_time": max(0.0, now - ready_at),
+            }
+
+    def _close_node(self, run_id: UUID, status: str) -> None:
+        now = time.time()
+        trace = self.trace
+        with trace._lock:
+            node = self._open_nodes.pop(run_id, None)
+            if node is None:
+                return
+            node["wall_time"] = now - node.pop("start")
+            node["status"] = status
+            trace.nodes.append(node)
+            self._last_node_end = max(self._last_node_end or now, now)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._close_node(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close_node(run_id, "error")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self.trace._lock:
+            self._open_calls[run_id] = {
+                "node": (metadata or {}).get("langgraph_node"),
+                "start": time.time(),
+            }
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        now = time.time()
+        trace = self.trace
+        prompt_tokens, completion_tokens, cached = _usage(response)
+        with trace._lock:
+            call = self._open_calls.pop(run_id, None)
+            if call is None:
+                return
+            call["wall_time"] = now - call.pop("start")
+            call["cache_hit"] = cached
+            call["prompt_tokens"] = prompt_tokens
+            call["completion_tokens"] = completion_tokens
+            trace.llm_calls.append(call)
+            if cached:
+                trace.cache_hits += 1
+            else:
+                trace.prompt_tokens += prompt_tokens
+                trace.completion_tokens += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        now = time.time()
+        with self.trace._lock:
+            call = self._open_calls.pop(run_id, None)
+            if call is None:
+                return
+            call["wall_time"] = now - call.pop("start")
+            call["error"] = type(error).__name__
+            self.trace.llm_calls.append(call)
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name != "retry":
+            return
+        with self.trace._lock:
+            reasons = self.trace.retries.setdefault(data.get("agent", "unknown"), {})
+            reason = data.get("reason", "other")
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+
+def _usage(response) -> Tuple[int, int, bool]:
+    # Returns (prompt_tokens, completion_tokens, cache_hit) for one LLMResult.
+    # LangChain zeroes total_cost on messages replayed from the cache.
+    prompt_tokens = completion_tokens = 0
+    cached = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage.get("input_tokens", 0)
+            completion_tokens += usage.get("output_tokens", 0)
+            cached = cached or usage.get("total_cost") == 0
+    if not (prompt_tokens or completion_tokens):
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens, cached
+
+
+class PipelineMetrics:
+    """
+    Process-wide counters and histograms aggregated from finished traces,
+    exportable in Prometheus text format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.traces: deque = deque(maxlen=MAX_KEPT_TRACES)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Layout: one count per bucket, then +Inf, sum, count
+            series = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 3))
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def record_trace(self, trace: RunTrace) -> None:
+        data = trace.to_dict()
+        self.traces.append(data)
+        self.inc("pipeline_runs_total", status=data["status"])
+        self.observe("pipeline_run_duration_seconds", data["wall_time"])
+        self.observe("pipeline_run_queue_seconds", data["queue_time"])
+        self.inc("pipeline_llm_tokens_total", data["prompt_tokens"], kind="prompt")
+        self.inc("pipeline_llm_tokens_total", data["completion_tokens"], kind="completion")
+        self.inc("pipeline_llm_cache_hits_total", data["cache_hits"])
+        for node in data["nodes"]:
+            self.observe("pipeline_node_duration_seconds", node["wall_time"], node=node["node"])
+            self.observe("pipeline_node_queue_seconds", node["queue_time"], node=node["node"])
+        for call in data["llm_calls"]:
+            if "error" not in call:
+                self.observe("pipeline_llm_call_duration_seconds", call["wall_time"], node=str(call["node"]))
+        for agent, reasons in data["retries"].items():
+            for reason, count in reasons.items():
+                self.inc("pipeline_retries_total", count, agent=agent, reason=reason)
+
+    def to_prometheus(self) -> str:
+        def fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted({key[0] for key in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {value:g}")
+
+            for name in sorted({key[0] for key in self._gauges}):
+                lines.append(f"# TYPE {name} gauge")
+                for (metric, labels), value in sorted(self._gauges.items()):
+                    if metric == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {value:g}")
+
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), series in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip(self.buckets + (float("inf"),), series[:-2]):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{fmt_labels(labels, (('le', le),))} {cumulative:g}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {series[-2]:.6f}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {series[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+            self.traces.clear()
+
+
+metrics = PipelineMetrics()
+
+
+def start_trace(product_id: str = "product", config: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], Optional[RunTrace]]:
+    """
+    Returns (config, trace) for one product run. With instrumentation off the config
+    is passed through untouched and no trace is created.
+    """
+    if not _enabled:
+        return config, None
+    trace = RunTrace(product_id)
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [TraceCallbackHandler(trace)]
+    return config, trace
+
+
+def finish_trace(trace: Optional[RunTrace], error: Optional[BaseException] = None) -> None:
+    if trace is None:
+        return
+    with trace._lock:
+        trace.ended_at = time.time()
+        trace.status = "error" if error is not None else "ok"
+        trace.error = f"{type(error).__name__}: {error}" if error is not None else None
+    metrics.record_trace(trace)
+
+
+def record_retry(agent: str, reason: str) -> None:
+    """
+    Reports one retry to the trace of the run that is currently executing, if any.
+    """
+    if not _enabled:
+        return
+    from langchain_core.callbacks import dispatch_custom_event
+
+    try:
+        dispatch_custom_event("retry", {"agent": agent, "reason": reason})
+    except RuntimeError:
+        # Called outside a graph run (e.g. an agent used directly): nothing to attach to
+        pass
+
+
+def write_trace_file(path: str) -> None:
+    """
+    Writes every kept trace as a JSON document.
+    """
+    with open(path, "w") as f:
+        json.dump({"runs": list(metrics.traces)}, f, indent=2)
+
+
+def write_prometheus_file(path: str) -> None:
+    with open(path, "w") as f:
+        f.write(metrics.to_prometheus())
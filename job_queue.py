@@ -0,0 +1,248 @@
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_QUEUE_PATH = ".llm_cache/jobs.sqlite"
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5.0
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def worker_identity(index: int = 0) -> str:
+    """
+    Lease owner name: host, process and worker slot, so leases held by dead local
+    processes can be recognised on the next run.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Durable product queue in SQLite, shared by worker processes (or hosts) that open
+    the same file. Workers claim a job with a lease and keep renewing it while the
+    pipeline runs; a job whose lease expires (its worker crashed or was killed) becomes
+    claimable again. Finished jobs stay done, so rerunning a batch resumes where it stopped.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: write transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                not_before REAL NOT NULL DEFAULT 0,
+                stage TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, not_before)")
+        # Ids enqueued through this connection (this run's catalog), so a queue file reused
+        # across catalogs can still report per-run totals; temp tables are per connection
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS enqueued (id TEXT PRIMARY KEY)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue_many(self, jobs: Iterable[Tuple[str, Dict[str, Any]]], batch_size: int = 500) -> int:
+        """
+        Adds (job_id, raw_input) pairs. Ids that are already queued keep their status,
+        so enqueueing the same catalog again is a resume, not a restart. Returns how many were new.
+        """
+        added = 0
+        batch: List[Tuple[str, str, str, float]] = []
+
+        def flush() -> None:
+            nonlocal added
+            with self._transaction() as conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (id, payload, status, updated_at) VALUES (?, ?, ?, ?)", batch
+                )
+                added += conn.total_changes - before
+                conn.executemany("INSERT OR IGNORE INTO enqueued (id) VALUES (?)", [(row[0],) for row in batch])
+            batch.clear()
+
+        for job_id, raw_input in jobs:
+            batch.append((job_id, json.dumps(raw_input), PENDING, time.time()))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return added
+
+    def claim(
+        self,
+        worker_id: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        """
+        Leases the oldest claimable job: pending, or running with an expired lease.
+        Returns (job_id, raw_input, attempt) or None when nothing is claimable right now.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # A job whose worker died max_attempts times is not handed out again
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "Lease expired on every attempt (worker crashed or was killed).", now, RUNNING, now, max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE (status = ? AND not_before <= ?) OR (status = ? AND lease_expires < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING, now, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, attempts + 1, worker_id, now + lease_seconds, now, job_id),
+            )
+        return job_id, json.loads(payload), attempts + 1
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, stage: Optional[str] = None) -> bool:
+        """
+        Extends a lease (and records the last finished stage). False means the lease was lost.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, stage = COALESCE(?, stage), updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, stage, now, job_id, RUNNING, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, now, job_id, RUNNING, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> str:
+        """
+        Records a failed attempt. The job goes back to pending (after a delay) until it
+        has used max_attempts, then it is failed for good. Returns the new status.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, RUNNING, worker_id),
+            ).fetchone()
+            if row is None:
+                return "lost"
+            status = FAILED if row[0] >= max_attempts else PENDING
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, "
+                "not_before = ?, updated_at = ? WHERE id = ?",
+                (status, error, now + RETRY_DELAY_SECONDS * row[0], now, job_id),
+            )
+        return status
+
+    def release_dead_local_leases(self) -> int:
+        """
+        Expires leases held by processes on this host that no longer exist, so a rerun
+        right after a crash does not wait for their leases to time out.
+        """
+        host = socket.gethostname()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, lease_owner FROM jobs WHERE status = ? AND lease_owner LIKE ?", (RUNNING, f"{host}:%")
+            ).fetchall()
+        dead = [job_id for job_id, owner in rows if not _process_alive(int(owner.split(":")[1]))]
+        if dead:
+            with self._transaction() as conn:
+                conn.executemany("UPDATE jobs SET lease_expires = 0 WHERE id = ? AND status = ?", [(job_id, RUNNING) for job_id in dead])
+        return len(dead)
+
+    def retry_failed(self) -> int:
+        """
+        Puts every failed job back in the queue with a fresh attempt budget.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, not_before = 0, updated_at = ? WHERE status = ?",
+                (PENDING, time.time(), FAILED),
+            )
+        return cursor.rowcount
+
+    def counts(self, enqueued_only: bool = False) -> Dict[str, int]:
+        """
+        Jobs per status; with enqueued_only, only those enqueued through this JobQueue.
+        """
+        scope = " WHERE id IN (SELECT id FROM enqueued)" if enqueued_only else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, COUNT(*) FROM jobs{scope} GROUP BY status").fetchall()
+        return {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def has_open_jobs(self) -> bool:
+        counts = self.counts()
+        return counts[PENDING] + counts[RUNNING] > 0
+
+    def jobs(self, status: str, enqueued_only: bool = False) -> List[Dict[str, Any]]:
+        scope = " AND id IN (SELECT id FROM enqueued)" if enqueued_only else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, attempts, stage, error FROM jobs WHERE status = ?{scope} ORDER BY rowid", (status,)
+            ).fetchall()
+        return [{"product_id": job_id, "attempts": attempts, "stage": stage, "error": error} for job_id, attempts, stage, error in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,226 @@
+from typing import Dict, Any, Optional, Sequence, Iterator
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+DEFAULT_CACHE_PATH = ".llm_cache/responses.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Least recently used entries dropped per eviction step once over budget
+EVICT_BATCH = 32
+
+# Set while a retry is in flight: lookups miss so a bad cached answer is not replayed,
+# and the fresh response overwrites it.
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def cache_bypass(enabled: bool = True) -> Iterator[None]:
+    """
+    Skips cache lookups for LLM calls made inside the block (responses are still stored).
+    """
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Content address of one call. llm_string carries the model and its parameters,
+    prompt carries the fully rendered messages.
+    """
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def _dump_generations(generations: Sequence[Generation]) -> str:
+    payload = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            payload.append({"message": message_to_dict(generation.message)})
+        else:
+            payload.append({"text": generation.text})
+    return json.dumps(payload)
+
+
+def _load_generations(response: str) -> Sequence[Generation]:
+    generations: list = []
+    for item in json.loads(response):
+        if "message" in item:
+            generations.append(ChatGeneration(message=messages_from_dict([item["message"]])[0]))
+        else:
+            generations.append(Generation(text=item["text"]))
+    return generations
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Persistent LLM response cache backed by SQLite.
+    Entries are evicted least-recently-used once the stored responses exceed max_bytes,
+    and expire after ttl seconds when a TTL is set.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = None
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        self._conn.commit()
+        # Running total of stored response bytes: summed once here, then kept up to date
+        # on every insert, replace and delete so writes never scan the table
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if _bypass.get():
+            return None
+
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._delete(key)
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return _load_generations(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = cache_key(prompt, llm_string)
+        response = _dump_generations(return_val)
+        now = time.time()
+        with self._lock:
+            # A replaced entry gives its bytes back
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO responses (key, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response), now, now),
+            )
+            self._bytes += len(response)
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, key: str) -> None:
+        row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._bytes -= row[0]
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until back under budget, reading a bounded
+        # batch of the oldest ones at a time (through the last_access index)
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self._bytes
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache: Optional[SQLiteResponseCache] = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_llm_cache() -> Optional[SQLiteResponseCache]:
+    """
+    Installs the shared response cache as LangChain's global LLM cache, once per process.
+    LLM_CACHE_DISABLED=1 turns it off; LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES and
+    LLM_CACHE_TTL (seconds) tune it.
+    """
+    global _cache, _configured
+    from langchain_core.globals import get_llm_cache, set_llm_cache
+
+    with _configure_lock:
+        if _configured:
+            return _cache
+        _configured = True
+
+        # Respect a cache installed by the caller (e.g. an in-memory one in tests)
+        if get_llm_cache() is not None:
+            return None
+
+        if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+            return None
+
+        ttl = os.getenv("LLM_CACHE_TTL")
+        _cache = SQLiteResponseCache(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            ttl=float(ttl) if ttl else None,
+        )
+        set_llm_cache(_cache)
+        return _cache
+
+
+def get_response_cache() -> Optional[SQLiteResponseCache]:
+    return _cache
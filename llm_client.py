@@ -0,0 +1,417 @@
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import asyncio
+import json
+import os
+import threading
+import httpx
+from pydantic import BaseModel, ConfigDict
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from llm_cache import configure_llm_cache
+from model_cascade import SMALL, current_tier, get_cascade_policy
+from prompting import estimate_tokens
+from rate_limits import RateLimitScheduler, expected_completion_tokens, get_scheduler, scheduling_enabled
+from stream_parse import StreamAbortError, StreamRules, StreamValidator, current_rules, stream_parsing_enabled
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+class LLMSettings(BaseModel):
+    model: str = DEFAULT_MODEL
+    temperature: float = 0
+    timeout: Optional[float] = None
+    max_retries: int = 2
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    base_url: Optional[str] = None
+
+    def key(self) -> Tuple:
+        return tuple(self.model_dump().values())
+
+LLMFactory = Callable[[LLMSettings], BaseChatModel]
+
+_lock = threading.Lock()
+_clients: Dict[Tuple, BaseChatModel] = {}
+_http_pools: Dict[Tuple, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+_factory: Optional[LLMFactory] = None
+# Pool-closing tasks started by reset_llm_clients() inside a running loop, kept until done
+_closing: set = set()
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def load_settings(agent: Optional[str] = None, **overrides: Any) -> LLMSettings:
+    """
+    Resolves client settings from the environment.
+    LLM_MODEL, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_MAX_CONNECTIONS and LLM_BASE_URL apply to every agent;
+    LLM_MODEL_<AGENT> (e.g. LLM_MODEL_EVALUATOR) overrides the model for one agent.
+    Explicit keyword overrides win over the environment.
+    """
+    settings: Dict[str, Any] = {}
+
+    model = os.getenv(f"LLM_MODEL_{agent.upper()}") if agent else None
+    model = model or os.getenv("LLM_MODEL")
+    if model:
+        settings["model"] = model
+
+    timeout = _env_float("LLM_TIMEOUT")
+    if timeout is not None:
+        settings["timeout"] = timeout
+
+    if os.getenv("LLM_MAX_RETRIES"):
+        settings["max_retries"] = int(os.environ["LLM_MAX_RETRIES"])
+
+    if os.getenv("LLM_MAX_CONNECTIONS"):
+        settings["max_connections"] = int(os.environ["LLM_MAX_CONNECTIONS"])
+        settings["max_keepalive_connections"] = min(
+            settings["max_connections"], LLMSettings().max_keepalive_connections
+        )
+
+    if os.getenv("LLM_BASE_URL"):
+        settings["base_url"] = os.environ["LLM_BASE_URL"]
+
+    settings.update(overrides)
+    return LLMSettings(**settings)
+
+
+def _observe_response(response: httpx.Response) -> None:
+    # Feeds provider rate-limit headers (and 429s) to the scheduler of the requested model
+    if not scheduling_enabled():
+        return
+    if response.status_code != 429 and "x-ratelimit-remaining-tokens" not in response.headers:
+        return
+    try:
+        model = json.loads(response.request.content).get("model")
+    except Exception:
+        return
+    if model:
+        get_scheduler(model).observe_headers(response.headers, response.status_code)
+
+
+async def _aobserve_response(response: httpx.Response) -> None:
+    _observe_response(response)
+
+
+def _get_http_pool(settings: LLMSettings) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    # One sync and one async connection pool per pool configuration, shared by every model
+    pool_key = (settings.timeout, settings.max_connections, settings.max_keepalive_connections)
+    if pool_key not in _http_pools:
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+        )
+        timeout = httpx.Timeout(settings.timeout)
+        _http_pools[pool_key] = (
+            httpx.Client(limits=limits, timeout=timeout, event_hooks={"response": [_observe_response]}),
+            httpx.AsyncClient(limits=limits, timeout=timeout, event_hooks={"response": [_aobserve_response]}),
+        )
+    return _http_pools[pool_key]
+
+
+def _create_groq_client(settings: LLMSettings) -> BaseChatModel:
+    from langchain_groq import ChatGroq
+
+    http_client, http_async_client = _get_http_pool(settings)
+    # Only override the endpoint when configured, so GROQ_API_BASE keeps working
+    endpoint = {"base_url": settings.base_url} if settings.base_url else {}
+    return ChatGroq(
+        temperature=settings.temperature,
+        model=settings.model,
+        timeout=settings.timeout,
+        max_retries=settings.max_retries,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **endpoint,
+    )
+
+
+def _total_tokens(result: ChatResult) -> Optional[int]:
+    for generation in result.generations:
+        usage = getattr(generation.message, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            return usage["total_tokens"]
+    return ((result.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+
+
+def _streams(model: BaseChatModel) -> bool:
+    # BaseChatModel's own _stream only raises NotImplementedError
+    return type(model)._stream is not BaseChatModel._stream
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Sends every call of the wrapped model through its rate-limit scheduler. The wrapper
+    only runs on response-cache misses, so cached answers spend no quota; it reserves
+    the estimated prompt plus completion tokens and settles them against real usage.
+    Inside stream_parse.validate_stream() the completion is streamed and checked as it
+    arrives, and the request is dropped as soon as the output breaks the schema.
+    Cache keys, model name and callbacks are those of the wrapped model.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    scheduler: Optional[RateLimitScheduler] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self.inner, "model_name", None)
+
+    def _get_llm_string(self, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        return self.inner._get_llm_string(stop=stop, **kwargs)
+
+    def _prompt_tokens(self, messages: List[BaseMessage]) -> int:
+        return sum(estimate_tokens(str(message.content)) for message in messages)
+
+    def _settle(self, estimated: int, actual: Optional[int]) -> None:
+        if self.scheduler is not None:
+            self.scheduler.settle(estimated, actual)
+
+    def _stream_rules(self) -> Optional[StreamRules]:
+        rules = current_rules()
+        return rules if rules is not None and _streams(self.inner) else None
+
+    def _aborted(self, error: StreamAbortError, messages: List[BaseMessage], estimated: int) -> StreamAbortError:
+        # Only the prompt and the tokens received before the abort were spent
+        self._settle(estimated, self._prompt_tokens(messages) + estimate_tokens(error.text))
+        print(f"Stopped {self.model_name or self._llm_type} mid-stream: {error}")
+        return error
+
+    def _received(self, chunks: List[ChatGenerationChunk]) -> List[ChatGenerationChunk]:
+        # A stream that ends without output is invalid output, retried like any other
+        if not chunks:
+            raise StreamAbortError("Output aborted mid-stream: the stream ended without any output")
+        return chunks
+
+    def _failed(self, messages: List[BaseMessage], estimated: int, chunks: List[ChatGenerationChunk]) -> None:
+        # A 429, timeout or transport error before any output costs nothing; one that cuts a
+        # stream short costs the prompt and what was received. A cancelled call (a hedge that
+        # lost) keeps its reservation, since the provider may still finish it.
+        received = "".join(chunk.text for chunk in chunks)
+        self._settle(estimated, self._prompt_tokens(messages) + estimate_tokens(received) if chunks else 0)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        estimated = self._prompt_tokens(messages) + expected_completion_tokens()
+        if self.scheduler is not None:
+            self.scheduler.acquire(estimated)
+        rules = self._stream_rules()
+        chunks: List[ChatGenerationChunk] = []
+        try:
+            if rules is None:
+                result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            else:
+                validator = StreamValidator(rules)
+                stream = self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+                try:
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        validator.feed(chunk.text)
+                finally:
+                    # Closing the generator drops the HTTP response, which ends generation
+                    stream.close()
+                result = generate_from_stream(iter(self._received(chunks)))
+        except StreamAbortError as e:
+            raise self._aborted(e, messages, estimated)
+        except Exception:
+            self._failed(messages, estimated, chunks)
+            raise
+        self._settle(estimated, _total_tokens(result))
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        estimated = self._prompt_tokens(messages) + expected_completion_tokens()
+        if self.scheduler is not None:
+            await self.scheduler.aacquire(estimated)
+        rules = self._stream_rules()
+        chunks: List[ChatGenerationChunk] = []
+        try:
+            if rules is None:
+                result = await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            else:
+                validator = StreamValidator(rules)
+                stream = self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+                try:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        validator.feed(chunk.text)
+                finally:
+                    await stream.aclose()
+                result = generate_from_stream(iter(self._received(chunks)))
+        except StreamAbortError as e:
+            raise self._aborted(e, messages, estimated)
+        except Exception:
+            self._failed(messages, estimated, chunks)
+            raise
+        self._settle(estimated, _total_tokens(result))
+        return result
+
+
+class CascadeChatModel(BaseChatModel):
+    """
+    Routes each call to the small or the large client of an agent's model cascade,
+    following model_cascade.current_tier(). Cache keys, model name and usage are those
+    of the client that serves the call.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    small: BaseChatModel
+    large: BaseChatModel
+
+    def _active(self) -> BaseChatModel:
+        return self.small if current_tier() == SMALL else self.large
+
+    @property
+    def _llm_type(self) -> str:
+        return self._active()._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self._active()._identifying_params
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self._active(), "model_name", None)
+
+    def _get_llm_string(self, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        return self._active()._get_llm_string(stop=stop, **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return self._active()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return await self._active()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def _client(settings: LLMSettings) -> BaseChatModel:
+    # Callers hold _lock
+    key = settings.key()
+    if key not in _clients:
+        factory = _factory or _create_groq_client
+        llm = factory(settings)
+        if scheduling_enabled() or stream_parsing_enabled():
+            scheduler = get_scheduler(settings.model) if scheduling_enabled() else None
+            llm = ScheduledChatModel(inner=llm, scheduler=scheduler)
+        _clients[key] = llm
+    return _clients[key]
+
+
+def get_llm(agent: Optional[str] = None, **overrides: Any) -> BaseChatModel:
+    """
+    Returns a long-lived chat model for the given agent.
+    Clients are cached by their settings, so agents and products that resolve to the
+    same model share one client and one HTTP connection pool.
+    The first call also installs the shared on-disk response cache (see llm_cache).
+    Unless LLM_SCHEDULER_DISABLED is set, calls go through the model's process-wide
+    rate-limit scheduler (see rate_limits); unless LLM_STREAM_PARSE_DISABLED is set,
+    agent outputs are streamed and validated as they arrive (see stream_parse).
+    Agents with a model cascade (see model_cascade) get a client that serves the
+    small-model attempts from the small model; an explicit model override turns it off.
+    """
+    configure_llm_cache()
+    settings = load_settings(agent, **overrides)
+    cascade = get_cascade_policy(agent) if agent else None
+
+    with _lock:
+        large = _client(settings)
+        if cascade is None or not cascade.enabled or "model" in overrides or cascade.small_model == settings.model:
+            return large
+        key = ("cascade", cascade.small_model) + settings.key()
+        if key not in _clients:
+            small = _client(settings.model_copy(update={"model": cascade.small_model}))
+            _clients[key] = CascadeChatModel(small=small, large=large)
+        return _clients[key]
+
+
+def set_llm_factory(factory: Optional[LLMFactory]) -> None:
+    """
+    Replaces how clients are built, e.g. to inject a local fake model in tests.
+    Pass None to restore the Groq client. Cached clients are dropped either way.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
+
+
+def _drop_clients() -> List[httpx.AsyncClient]:
+    # Closes the sync pools and hands back the async ones, which need a loop to close
+    with _lock:
+        _clients.clear()
+        for http_client, _ in _http_pools.values():
+            http_client.close()
+        async_clients = [async_client for _, async_client in _http_pools.values()]
+        _http_pools.clear()
+    return async_clients
+
+
+async def _aclose_all(async_clients: List[httpx.AsyncClient]) -> None:
+    for async_client in async_clients:
+        try:
+            await async_client.aclose()
+        except RuntimeError:
+            # Its connections belonged to an event loop that has since closed
+            pass
+
+
+def reset_llm_clients() -> None:
+    """
+    Drops every cached client and closes the shared HTTP pools.
+    Inside a running event loop, use areset_llm_clients() so the async pools are
+    closed before it returns; here they are closed on a background task.
+    """
+    async_clients = _drop_clients()
+    if not async_clients:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(_aclose_all(async_clients))
+        return
+    task = loop.create_task(_aclose_all(async_clients))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+async def areset_llm_clients() -> None:
+    """
+    Async version of reset_llm_clients; awaits closing the async HTTP pools.
+    """
+    await _aclose_all(_drop_clients())
@@ -0,0 +1,146 @@
+from typing import Dict, Any, List, Optional
+import contextlib
+import contextvars
+import os
+import threading
+from pydantic import BaseModel
+from instrumentation import instrumentation_enabled, metrics
+
+# Per-agent model cascade. An agent with cascading on is tried first on a small, fast
+# model; the answer is kept if it parses, validates against the agent's schema and passes
+# the agent's deterministic checks. Otherwise the call escalates to the agent's regular
+# (large) model, under the normal retry budget. llm_client.get_llm() returns a client that
+# routes each call to the tier selected here; retries.run_with_retries() selects it.
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+
+SMALL = "small"
+LARGE = "large"
+
+_tier: contextvars.ContextVar[str] = contextvars.ContextVar("model_tier", default=LARGE)
+
+
+class CascadePolicy(BaseModel):
+    enabled: bool = False
+    small_model: str = SMALL_MODEL
+    # Attempts on the small model before escalating; they do not count against the retry budget
+    small_attempts: int = 1
+
+
+# Lightweight stages cascade by default: analysis returns a handful of questions and
+# observations, and the evaluator a PASS/FAIL verdict
+DEFAULT_CASCADE_AGENTS = ("analysis", "evaluator")
+
+CASCADE_POLICIES: Dict[str, CascadePolicy] = {}
+
+
+def _env_policy(agent: str) -> CascadePolicy:
+    value = os.getenv("LLM_CASCADE_AGENTS")
+    agents = set(DEFAULT_CASCADE_AGENTS) if value is None else {name.strip() for name in value.split(",") if name.strip()}
+    if "all" not in agents and agent not in agents:
+        return CascadePolicy()
+    overrides: Dict[str, Any] = {"enabled": True}
+    small_model = os.getenv(f"LLM_SMALL_MODEL_{agent.upper()}") or os.getenv("LLM_SMALL_MODEL")
+    if small_model:
+        overrides["small_model"] = small_model
+    return CascadePolicy(**overrides)
+
+
+def get_cascade_policy(agent: str) -> CascadePolicy:
+    return CASCADE_POLICIES.get(agent) or _env_policy(agent)
+
+
+def set_cascade_policy(agent: str, policy: Optional[CascadePolicy]) -> None:
+    """
+    Sets an agent's cascade policy; None goes back to the environment's.
+    Clients already handed out keep the routing they were built with (see llm_client).
+    """
+    if policy is None:
+        CASCADE_POLICIES.pop(agent, None)
+    else:
+        CASCADE_POLICIES[agent] = policy
+
+
+def attempt_tiers(agent: str, max_attempts: int) -> List[str]:
+    """
+    The model tier of each attempt: the small-model attempts first, then the retry budget.
+    """
+    policy = get_cascade_policy(agent)
+    small = [SMALL] * policy.small_attempts if policy.enabled else []
+    return small + [LARGE] * max_attempts
+
+
+@contextlib.contextmanager
+def model_tier(tier: str):
+    """
+    LLM calls made inside the block go to the small or large model of a cascading client.
+    """
+    token = _tier.set(tier)
+    try:
+        yield
+    finally:
+        _tier.reset(token)
+
+
+def current_tier() -> str:
+    return _tier.get()
+
+
+class CascadeStats:
+    """
+    Thread-safe per-agent counts of small-model answers kept and escalated, with reasons.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, Any]] = {}
+
+    def _agent(self, agent: str) -> Dict[str, Any]:
+        return self._counts.setdefault(agent, {"accepted": 0, "escalated": 0, "reasons": {}})
+
+    def accepted(self, agent: str) -> None:
+        with self._lock:
+            self._agent(agent)["accepted"] += 1
+
+    def escalated(self, agent: str, reason: str) -> None:
+        with self._lock:
+            counts = self._agent(agent)
+            counts["escalated"] += 1
+            counts["reasons"][reason] = counts["reasons"].get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for agent, counts in self._counts.items():
+                calls = counts["accepted"] + counts["escalated"]
+                result[agent] = {
+                    **counts,
+                    "reasons": dict(counts["reasons"]),
+                    "escalation_rate": round(counts["escalated"] / calls, 4) if calls else 0.0,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+cascade_stats = CascadeStats()
+
+
+def record_accepted(agent: str) -> None:
+    cascade_stats.accepted(agent)
+    if instrumentation_enabled():
+        metrics.inc("pipeline_llm_cascade_total", agent=agent, outcome="accepted")
+
+
+def record_escalation(agent: str, reason: str) -> None:
+    """
+    Counts one escalation to the large model. reason: "invalid" (the small model's
+    answer failed parsing or validation) or "low_confidence" (it failed the agent's checks).
+    """
+    cascade_stats.escalated(agent, reason)
+    print(f"Escalating {agent} to the large model ({reason}).")
+    if instrumentation_enabled():
+        metrics.inc("pipeline_llm_cascade_total", agent=agent, outcome="escalated")
+        metrics.inc("pipeline_llm_escalations_total", agent=agent, reason=reason)
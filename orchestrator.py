@@ -1,15 +1,12 @@
-from typing import Dict, Any, TypedDict, List, Literal
-import json
-from pathlib import Path
-from langgraph.graph import StateGraph, END
-
-from parser_agent import parse_input
-from analysis_agent import analyze_input
-from content_agent import generate_content
-from question_agent import generate_questions
-from comparison_agent import generate_comparison
-from page_builder_agent import build_pages
-from evaluator_agent import evaluate_content
+from typing import Dict, Any, TypedDict, List, Literal, Optional, Sequence, Tuple
+import asyncio
+import threading
+
+from artifacts import ARTIFACT_FILES, ArtifactWriter, JsonlSink, ProgressCallback, atomic_write_json
+
+# LangChain, LangGraph and the LLM agents are imported where they are first needed, and
+# the graphs are compiled on first use, so importing this module stays cheap for tools
+# that only parse inputs or build pages.
 
 # Define the Graph State
 class GraphState(TypedDict):
@@ -21,27 +18,68 @@ class GraphState(TypedDict):
     comparison: Dict[str, Any]
     pages: Dict[str, Any]
     qa_retries: int # Track Q&A retries
+    evaluation: Dict[str, Any] # Pre-check verdict, plus the LLM evaluator's when it had to run
     evaluation_status: str
 
 # Define Nodes
 def parser_node(state: GraphState) -> Dict[str, Any]:
+    from parser_agent import parse_input
     print("--- PARSER AGENT ---")
     parsed = parse_input(state["raw_input"])
     return {"parsed_input": parsed}
 
 def analysis_node(state: GraphState) -> Dict[str, Any]:
+    from analysis_agent import analyze_input
     print("--- ANALYSIS AGENT ---")
     analysis = analyze_input(state["parsed_input"])
     return {"analysis": analysis}
 
+async def aanalysis_node(state: GraphState) -> Dict[str, Any]:
+    from analysis_agent import aanalyze_input
+    print("--- ANALYSIS AGENT ---")
+    analysis = await aanalyze_input(state["parsed_input"])
+    return {"analysis": analysis}
+
 def content_node(state: GraphState) -> Dict[str, Any]:
+    from content_agent import generate_content
+    from similarity_index import reusable_content
+    print("--- CONTENT AGENT ---")
+    # A near-duplicate's blocks are reused when none of them mentions a changed field
+    content = reusable_content(state["parsed_input"])
+    if content is None:
+        content = generate_content(state["parsed_input"], state["analysis"])
+    return {"content": content}
+
+async def acontent_node(state: GraphState) -> Dict[str, Any]:
+    from content_agent import agenerate_content
+    from similarity_index import reusable_content
     print("--- CONTENT AGENT ---")
-    content = generate_content(state["parsed_input"], state["analysis"])
+    content = reusable_content(state["parsed_input"])
+    if content is None:
+        content = await agenerate_content(state["parsed_input"], state["analysis"])
     return {"content": content}
 
+def _starting_pairs(state: GraphState) -> List[Dict[str, Any]]:
+    from similarity_index import reusable_questions
+
+    # On a validation retry, keep the pairs we already have and only ask for the rest.
+    # A first attempt starts from the still-valid pairs of a near-duplicate product, if any.
+    if state.get("qa_retries", 0):
+        return state.get("questions", {}).get("qa_pairs", [])
+    return reusable_questions(state["parsed_input"])
+
 def questions_node(state: GraphState) -> Dict[str, Any]:
+    from question_agent import generate_questions
+    print(f"--- QUESTIONS AGENT (Attempt {state.get('qa_retries', 0) + 1}) ---")
+    existing_pairs = _starting_pairs(state)
+    questions = generate_questions(state["parsed_input"], existing_pairs=existing_pairs)
+    return {"questions": questions, "qa_retries": state.get("qa_retries", 0) + 1}
+
+async def aquestions_node(state: GraphState) -> Dict[str, Any]:
+    from question_agent import agenerate_questions
     print(f"--- QUESTIONS AGENT (Attempt {state.get('qa_retries', 0) + 1}) ---")
-    questions = generate_questions(state["parsed_input"])
+    existing_pairs = _starting_pairs(state)
+    questions = await agenerate_questions(state["parsed_input"], existing_pairs=existing_pairs)
     return {"questions": questions, "qa_retries": state.get("qa_retries", 0) + 1}
 
 def validation_node(state: GraphState) -> Dict[str, Any]:
@@ -53,13 +91,101 @@ def validation_node(state: GraphState) -> Dict[str, Any]:
     return {} # Just a pass-through node for logic, state update handled in conditional edge or here if needed
 
 def comparison_node(state: GraphState) -> Dict[str, Any]:
+    from comparison_agent import generate_comparison
     print("--- COMPARISON AGENT ---")
     comparison = generate_comparison(state["parsed_input"])
     return {"comparison": comparison}
 
+async def acomparison_node(state: GraphState) -> Dict[str, Any]:
+    from comparison_agent import agenerate_comparison
+    print("--- COMPARISON AGENT ---")
+    comparison = await agenerate_comparison(state["parsed_input"])
+    return {"comparison": comparison}
+
+def _fill_missing_sections(parsed_input: Dict[str, Any], sections: Dict[str, Any]) -> Dict[str, Any]:
+    from analysis_agent import analyze_input
+    from content_agent import generate_content
+    from question_agent import generate_questions
+
+    # Sections the fused call could not produce come from their own agent
+    if sections["analysis"] is None:
+        print(">>> Fused analysis missing or invalid. Running analysis agent...")
+        sections["analysis"] = analyze_input(parsed_input)
+    if sections["content"] is None:
+        print(">>> Fused content missing or invalid. Running content agent...")
+        sections["content"] = generate_content(parsed_input, sections["analysis"])
+    if sections["questions"] is None:
+        print(">>> Fused questions missing or invalid. Running questions agent...")
+        sections["questions"] = generate_questions(parsed_input)
+    return sections
+
+async def _afill_missing_sections(parsed_input: Dict[str, Any], sections: Dict[str, Any]) -> Dict[str, Any]:
+    from analysis_agent import aanalyze_input
+    from content_agent import agenerate_content
+    from question_agent import agenerate_questions
+
+    if sections["analysis"] is None:
+        print(">>> Fused analysis missing or invalid. Running analysis agent...")
+        sections["analysis"] = await aanalyze_input(parsed_input)
+
+    # Content and questions are independent, so their fallbacks run concurrently
+    pending = {}
+    if sections["content"] is None:
+        print(">>> Fused content missing or invalid. Running content agent...")
+        pending["content"] = agenerate_content(parsed_input, sections["analysis"])
+    if sections["questions"] is None:
+        print(">>> Fused questions missing or invalid. Running questions agent...")
+        pending["questions"] = agenerate_questions(parsed_input)
+    for key, result in zip(pending, await asyncio.gather(*pending.values())):
+        sections[key] = result
+    return sections
+
+def fused_node(state: GraphState) -> Dict[str, Any]:
+    from fused_agent import generate_fused, SECTIONS as FUSED_SECTIONS
+    print("--- FUSED GENERATION AGENT ---")
+    try:
+        sections = generate_fused(state["parsed_input"])
+    except Exception as e:
+        print(f">>> Fused generation failed ({e}). Falling back to separate agents...")
+        sections = {key: None for key in FUSED_SECTIONS}
+    sections = _fill_missing_sections(state["parsed_input"], sections)
+    # The fused call counts as the first Q&A attempt; a short set is topped up by the questions node
+    return {**sections, "qa_retries": 1}
+
+async def afused_node(state: GraphState) -> Dict[str, Any]:
+    from fused_agent import agenerate_fused, SECTIONS as FUSED_SECTIONS
+    print("--- FUSED GENERATION AGENT ---")
+    try:
+        sections = await agenerate_fused(state["parsed_input"])
+    except Exception as e:
+        print(f">>> Fused generation failed ({e}). Falling back to separate agents...")
+        sections = {key: None for key in FUSED_SECTIONS}
+    sections = await _afill_missing_sections(state["parsed_input"], sections)
+    return {**sections, "qa_retries": 1}
+
+def evaluator_node(state: GraphState) -> Dict[str, Any]:
+    from evaluator_agent import review_content
+    print("--- EVALUATOR AGENT ---")
+    # Deterministic pre-check first; the LLM evaluator only sees flagged or undecided content
+    evaluation = review_content(state["parsed_input"], state["content"])
+    print(f"Evaluation: {evaluation['status']} ({evaluation['method']})")
+    return {"evaluation": evaluation, "evaluation_status": evaluation["status"]}
+
+async def aevaluator_node(state: GraphState) -> Dict[str, Any]:
+    from evaluator_agent import areview_content
+    print("--- EVALUATOR AGENT ---")
+    evaluation = await areview_content(state["parsed_input"], state["content"])
+    print(f"Evaluation: {evaluation['status']} ({evaluation['method']})")
+    return {"evaluation": evaluation, "evaluation_status": evaluation["status"]}
+
 def page_builder_node(state: GraphState) -> Dict[str, Any]:
+    from page_builder_agent import build_pages
+    from similarity_index import remember
     print("--- PAGE BUILDER AGENT ---")
-    pages = build_pages(state["parsed_input"], state["content"], state["questions"])
+    pages = build_pages(state["parsed_input"], state["content"], state["questions"], state.get("comparison"))
+    # Finished sections become reusable for near-duplicates; content only once it passed review
+    passed = state.get("evaluation_status") == "PASS"
+    remember(state["parsed_input"], questions=state["questions"], content=state["content"] if passed else None)
     return {"pages": pages}
 
 # Conditional Logic
@@ -76,68 +202,448 @@ def check_qa_count(state: GraphState) -> Literal["retry", "next"]:
     
     return "next"
 
-# Build the Graph
-workflow = StateGraph(GraphState)
-
-# Add Nodes
-workflow.add_node("parser", parser_node)
-workflow.add_node("analysis", analysis_node)
-workflow.add_node("content", content_node)
-workflow.add_node("questions", questions_node)
-workflow.add_node("validation", validation_node)
-workflow.add_node("comparison", comparison_node)
-workflow.add_node("page_builder", page_builder_node)
-
-# Add Edges
-workflow.set_entry_point("parser")
-workflow.add_edge("parser", "analysis")
-workflow.add_edge("analysis", "content")
-workflow.add_edge("content", "questions")
-workflow.add_edge("questions", "validation")
-
-# Conditional Edge for Validation
-workflow.add_conditional_edges(
-    "validation",
-    check_qa_count,
-    {
-        "retry": "questions",
-        "next": "comparison"
+# LLM nodes carry both implementations: app.invoke runs the sync function,
+# app.ainvoke awaits the coroutine so no thread is held during network I/O.
+def _llm_runnables() -> Dict[str, Any]:
+    from langchain_core.runnables import RunnableLambda
+
+    return {
+        "analysis": RunnableLambda(analysis_node, afunc=aanalysis_node),
+        "content": RunnableLambda(content_node, afunc=acontent_node),
+        "questions": RunnableLambda(questions_node, afunc=aquestions_node),
+        "comparison": RunnableLambda(comparison_node, afunc=acomparison_node),
+        "fused": RunnableLambda(fused_node, afunc=afused_node),
+        "evaluator": RunnableLambda(evaluator_node, afunc=aevaluator_node),
     }
-)
 
-workflow.add_edge("comparison", "page_builder")
-workflow.add_edge("page_builder", END)
+# Declared Node Inputs
+# Exactly the parts of the state each LLM node reads, taken from the fields its agent's
+# prompt declares. In incremental mode a node's result is stored under a hash of these
+# values (plus the agent's model, prompt version and policies, see _stage_salt), so a rerun
+# skips every node whose inputs did not change.
+# On a validation retry the questions node also reads the pairs it already produced.
+_node_inputs: Optional[Dict[str, List[str]]] = None
+
+def node_inputs() -> Dict[str, List[str]]:
+    """
+    Returns the declared state paths of every LLM node (imports the agents on first call).
+    """
+    global _node_inputs
+    if _node_inputs is None:
+        import analysis_agent, content_agent, question_agent, comparison_agent, evaluator_agent, fused_agent
+
+        _node_inputs = {
+            "analysis": analysis_agent.PROMPT.source_paths(product_data="parsed_input"),
+            "content": content_agent.PROMPT.source_paths(product_data="parsed_input"),
+            "questions": question_agent.PROMPT.source_paths(product_data="parsed_input") + ["qa_retries", "questions"],
+            "comparison": comparison_agent.PROMPT.source_paths(
+                product_data="parsed_input.product", competitor_data="parsed_input.competitors"
+            ),
+            "fused": fused_agent.PROMPT.source_paths(product_data="parsed_input"),
+            "evaluator": evaluator_agent.PROMPT.source_paths(source_data="parsed_input", generated_content="content"),
+        }
+    return _node_inputs
+
+# Node Versions
+# A hash per LLM node of the prompts it renders and the schemas its output is checked
+# against, so editing an agent's prompt or schema invalidates its stored results. The
+# fused node includes the agents it falls back to.
+_node_versions: Optional[Dict[str, str]] = None
+
+def node_versions() -> Dict[str, str]:
+    """
+    Returns the prompt/schema version of every LLM node (imports the agents on first call).
+    """
+    global _node_versions
+    if _node_versions is None:
+        import hashlib
+        import json
+        import analysis_agent, content_agent, question_agent, comparison_agent, evaluator_agent, fused_agent
+        from schemas import (
+            AnalysisSchema, ContentSchema, QuestionOutputSchema, ComparisonSchema, EvaluationSchema, FusedGenerationSchema,
+        )
+
+        parts = {
+            "analysis": ([analysis_agent.PROMPT], [AnalysisSchema]),
+            "content": ([content_agent.PROMPT], [ContentSchema]),
+            "questions": ([question_agent.PROMPT, question_agent.TOP_UP_PROMPT], [QuestionOutputSchema]),
+            "comparison": ([comparison_agent.PROMPT], [ComparisonSchema]),
+            "evaluator": ([evaluator_agent.PROMPT], [EvaluationSchema]),
+        }
+        parts["fused"] = (
+            [fused_agent.PROMPT] + [prompt for node in ("analysis", "content", "questions") for prompt in parts[node][0]],
+            [FusedGenerationSchema],
+        )
+        _node_versions = {
+            node: hashlib.sha256(json.dumps(
+                [[prompt.version for prompt in prompts], [schema.model_json_schema() for schema in schemas]],
+                sort_keys=True,
+            ).encode("utf-8")).hexdigest()[:16]
+            for node, (prompts, schemas) in parts.items()
+        }
+    return _node_versions
+
+def _stage_salt(node: str, graph_name: str) -> str:
+    from llm_client import load_settings
+    from retries import get_retry_policy
+    from similarity_index import SECTIONS, get_reuse_policy
+
+    # Everything outside the state the node's result depends on: the model, the prompt and
+    # schema version, the retry policy and, for nodes that consult the similarity index,
+    # its reuse policy
+    parts = [graph_name, load_settings(node).model, node_versions()[node], get_retry_policy(node).model_dump_json()]
+    if node in SECTIONS:
+        parts.append(get_reuse_policy(node).model_dump_json())
+    return ":".join(parts)
+
+def _cache_policy(node: str, graph_name: str):
+    from stage_cache import stage_policy
+
+    # Cached node results also replay the node's edge writes, so keys are scoped per graph
+    return stage_policy(node_inputs()[node], salt=lambda: _stage_salt(node, graph_name))
+
+# Build the Graph
+#   parser -> analysis -> content -> evaluator -> questions <-> validation -> comparison -> page_builder
+def _build_workflow():
+    from langgraph.graph import StateGraph, END
+
+    runnables = _llm_runnables()
+    workflow = StateGraph(GraphState)
+
+    # Add Nodes
+    workflow.add_node("parser", parser_node)
+    workflow.add_node("analysis", runnables["analysis"], cache_policy=_cache_policy("analysis", "sequential"))
+    workflow.add_node("content", runnables["content"], cache_policy=_cache_policy("content", "sequential"))
+    workflow.add_node("evaluator", runnables["evaluator"], cache_policy=_cache_policy("evaluator", "sequential"))
+    workflow.add_node("questions", runnables["questions"], cache_policy=_cache_policy("questions", "sequential"))
+    workflow.add_node("validation", validation_node)
+    workflow.add_node("comparison", runnables["comparison"], cache_policy=_cache_policy("comparison", "sequential"))
+    workflow.add_node("page_builder", page_builder_node)
+
+    # Add Edges
+    workflow.set_entry_point("parser")
+    workflow.add_edge("parser", "analysis")
+    workflow.add_edge("analysis", "content")
+    workflow.add_edge("content", "evaluator")
+    workflow.add_edge("evaluator", "questions")
+    workflow.add_edge("questions", "validation")
+
+    # Conditional Edge for Validation
+    workflow.add_conditional_edges(
+        "validation",
+        check_qa_count,
+        {
+            "retry": "questions",
+            "next": "comparison"
+        }
+    )
+
+    workflow.add_edge("comparison", "page_builder")
+    workflow.add_edge("page_builder", END)
+    return workflow
+
+# Build the Parallel Graph
+# Questions and comparison only read parsed_input, and only content needs analysis,
+# so three branches fan out after the parser and join at the page builder:
+#   parser -> analysis -> content -> evaluator --------------\
+#   parser -> questions <-> (retry loop) -> validation -------> page_builder
+#   parser -> comparison ------------------------------------/
+def _build_parallel_workflow():
+    from langgraph.graph import StateGraph, END
 
-# Compile the Graph
-app = workflow.compile()
+    runnables = _llm_runnables()
+    parallel_workflow = StateGraph(GraphState)
 
-def run_pipeline(raw_input: Dict[str, Any]) -> Dict[str, Any]:
+    parallel_workflow.add_node("parser", parser_node)
+    parallel_workflow.add_node("analysis", runnables["analysis"], cache_policy=_cache_policy("analysis", "parallel"))
+    parallel_workflow.add_node("content", runnables["content"], cache_policy=_cache_policy("content", "parallel"))
+    parallel_workflow.add_node("evaluator", runnables["evaluator"], cache_policy=_cache_policy("evaluator", "parallel"))
+    parallel_workflow.add_node("questions", runnables["questions"], cache_policy=_cache_policy("questions", "parallel"))
+    parallel_workflow.add_node("validation", validation_node)
+    parallel_workflow.add_node("comparison", runnables["comparison"], cache_policy=_cache_policy("comparison", "parallel"))
+    parallel_workflow.add_node("page_builder", page_builder_node)
+
+    parallel_workflow.set_entry_point("parser")
+    parallel_workflow.add_edge("parser", "analysis")
+    parallel_workflow.add_edge("analysis", "content")
+    parallel_workflow.add_edge("content", "evaluator")
+    parallel_workflow.add_edge("parser", "questions")
+    parallel_workflow.add_edge("parser", "comparison")
+
+    # The retry loop is checked straight after the questions node so that validation
+    # only completes once, with 15 pairs. The join below waits on validation, so a
+    # retry cannot release the page builder early.
+    parallel_workflow.add_conditional_edges(
+        "questions",
+        check_qa_count,
+        {
+            "retry": "questions",
+            "next": "validation"
+        }
+    )
+
+    # Join: page_builder runs once all three branches have finished
+    parallel_workflow.add_edge(["evaluator", "validation", "comparison"], "page_builder")
+    parallel_workflow.add_edge("page_builder", END)
+    return parallel_workflow
+
+# Build the Fused Graphs
+# One LLM call produces analysis, content and questions together; only the sections that
+# fail validation are regenerated by their own agent, and a short Q&A set is topped up
+# by the regular questions loop:
+#   parser -> fused -> (questions retry loop) -> validation -> comparison -> page_builder
+#             fused -> evaluator --------------------------------------------/
+# The parallel variant runs comparison alongside the fused call and joins at the page builder.
+def _build_fused_workflow(parallel: bool):
+    from langgraph.graph import StateGraph, END
+
+    runnables = _llm_runnables()
+    graph_name = "fused-parallel" if parallel else "fused"
+    graph = StateGraph(GraphState)
+
+    graph.add_node("parser", parser_node)
+    graph.add_node("fused", runnables["fused"], cache_policy=_cache_policy("fused", graph_name))
+    graph.add_node("evaluator", runnables["evaluator"], cache_policy=_cache_policy("evaluator", graph_name))
+    graph.add_node("questions", runnables["questions"], cache_policy=_cache_policy("questions", graph_name))
+    graph.add_node("validation", validation_node)
+    graph.add_node("comparison", runnables["comparison"], cache_policy=_cache_policy("comparison", graph_name))
+    graph.add_node("page_builder", page_builder_node)
+
+    graph.set_entry_point("parser")
+    graph.add_edge("parser", "fused")
+    for node in ("fused", "questions"):
+        graph.add_conditional_edges(node, check_qa_count, {"retry": "questions", "next": "validation"})
+    # The evaluator checks the fused content while the Q&A loop finishes
+    graph.add_edge("fused", "evaluator")
+
+    if parallel:
+        graph.add_edge("parser", "comparison")
+        graph.add_edge(["evaluator", "validation", "comparison"], "page_builder")
+    else:
+        graph.add_edge("validation", "comparison")
+        graph.add_edge(["evaluator", "comparison"], "page_builder")
+    graph.add_edge("page_builder", END)
+    return graph
+
+# Graph builders by run mode: (parallel, fused) -> builder
+GRAPH_BUILDERS = {
+    (False, False): _build_workflow,
+    (True, False): _build_parallel_workflow,
+    (False, True): lambda: _build_fused_workflow(parallel=False),
+    (True, True): lambda: _build_fused_workflow(parallel=True),
+}
+
+# Compiled graphs are singletons, built on first use: (parallel, fused) -> (workflow, app).
+# Incremental variants share those workflows but keep node results in the stage store,
+# so plain runs never open it. The lock keeps concurrent first runs from compiling twice.
+_graphs: Dict[Tuple[bool, bool], Tuple[Any, Any]] = {}
+_incremental_apps: Dict[Tuple[bool, bool], Any] = {}
+_graphs_lock = threading.Lock()
+
+def get_workflow(parallel: bool = False, fused: bool = False):
+    """
+    Returns the (uncompiled workflow, compiled app) pair for a run mode, building it on first use.
+    """
+    key = (parallel, fused)
+    if key not in _graphs:
+        with _graphs_lock:
+            if key not in _graphs:
+                workflow = GRAPH_BUILDERS[key]()
+                _graphs[key] = (workflow, workflow.compile())
+    return _graphs[key]
+
+def get_graph(parallel: bool = False, incremental: bool = False, fused: bool = False):
+    """
+    Returns the compiled graph for the requested run mode.
+    """
+    graph, compiled = get_workflow(parallel, fused)
+    if not incremental:
+        return compiled
+    key = (parallel, fused)
+    if key not in _incremental_apps:
+        from stage_cache import get_stage_cache
+
+        with _graphs_lock:
+            if key not in _incremental_apps:
+                _incremental_apps[key] = graph.compile(cache=get_stage_cache())
+    return _incremental_apps[key]
+
+# Module-level names kept for callers that import the graphs directly; resolved lazily
+_LAZY_GRAPHS = {
+    "workflow": (False, False, 0),
+    "app": (False, False, 1),
+    "parallel_workflow": (True, False, 0),
+    "parallel_app": (True, False, 1),
+    "fused_workflow": (False, True, 0),
+    "fused_app": (False, True, 1),
+    "parallel_fused_workflow": (True, True, 0),
+    "parallel_fused_app": (True, True, 1),
+}
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_GRAPHS:
+        parallel, fused, index = _LAZY_GRAPHS[name]
+        return get_workflow(parallel, fused)[index]
+    if name == "NODE_INPUTS":
+        return node_inputs()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def build_initial_state(raw_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the starting GraphState for one product.
+    """
+    return {"raw_input": raw_input, "qa_retries": 0, "evaluation_status": "PASS"}
+
+def product_id(raw_input: Dict[str, Any]) -> str:
+    """
+    Label used for one product in traces and metrics.
+    """
+    product = raw_input.get("product") if isinstance(raw_input, dict) else None
+    return (product or {}).get("name") or "product"
+
+def run_pipeline(raw_input: Dict[str, Any], parallel: bool = False, incremental: bool = False, fused: bool = False) -> Dict[str, Any]:
     """
     Runs the full multi-agent pipeline using LangGraph.
+    With parallel=True, the independent branches run concurrently, so wall-clock
+    time is bounded by the longest branch instead of the sum of all LLM calls.
+    With incremental=True, nodes whose declared inputs are unchanged since a previous
+    run are served from the stage store instead of being executed.
+    With fused=True, analysis, content and questions come from one combined LLM call,
+    falling back to the separate agents only for sections that fail validation.
     """
     # Initialize state
-    initial_state = {"raw_input": raw_input, "qa_retries": 0, "evaluation_status": "PASS"}
+    initial_state = build_initial_state(raw_input)
     
     # Run the graph
-    # No global try-except here. If it fails, it crashes.
-    final_state = app.invoke(initial_state)
+    # No global try-except here. If it fails, it crashes (the trace just records the error).
+    from instrumentation import start_trace, finish_trace
+    from rate_limits import llm_priority
+
+    graph = get_graph(parallel, incremental, fused)
+    config, trace = start_trace(product_id(raw_input))
+    try:
+        # LLM calls of runs that started earlier are served first when rate limited
+        with llm_priority():
+            final_state = graph.invoke(initial_state, config=config)
+    except BaseException as e:
+        finish_trace(trace, e)
+        raise
+    finish_trace(trace)
     
     return final_state
 
-def save_outputs(outputs: Dict[str, Any], output_dir: str = "outputs") -> None:
+async def arun_pipeline(raw_input: Dict[str, Any], parallel: bool = False, incremental: bool = False, fused: bool = False) -> Dict[str, Any]:
+    """
+    Async version of run_pipeline using the compiled graph's ainvoke.
+    Many products can be awaited concurrently on one event loop.
+    """
+    initial_state = build_initial_state(raw_input)
+
+    # No global try-except here either.
+    from instrumentation import start_trace, finish_trace
+    from rate_limits import llm_priority
+
+    graph = get_graph(parallel, incremental, fused)
+    config, trace = start_trace(product_id(raw_input))
+    try:
+        with llm_priority():
+            final_state = await graph.ainvoke(initial_state, config=config)
+    except BaseException as e:
+        finish_trace(trace, e)
+        raise
+    finish_trace(trace)
+
+    return final_state
+
+def _merge_update(state: Dict[str, Any], chunk: Dict[str, Any], writer: ArtifactWriter) -> None:
+    # One "updates" chunk: {node: update}, plus __metadata__ when served from the stage store
+    cached = bool(chunk.get("__metadata__", {}).get("cached"))
+    for node, update in chunk.items():
+        if node.startswith("__"):
+            continue
+        state.update(update or {})
+        writer.node_finished(node, update, cached=cached)
+
+def stream_pipeline(
+    raw_input: Dict[str, Any],
+    output_dir: str = "outputs",
+    parallel: bool = False,
+    incremental: bool = False,
+    fused: bool = False,
+    sink: Optional[JsonlSink] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    run_id: Optional[str] = None,
+    render_formats: Sequence[str] = ()
+) -> Dict[str, Any]:
     """
-    Saves pipeline outputs as JSON files.
+    Runs the pipeline like run_pipeline, but saves each artifact as soon as its node
+    finishes (atomically, plus one line in `sink` if given) and reports a progress
+    event per node. If a later node crashes, the artifacts already produced stay on disk.
+    `render_formats` ("html", "md", "json") also renders the final pages to files.
     """
-    Path(output_dir).mkdir(exist_ok=True)
+    initial_state = build_initial_state(raw_input)
+    run_id = run_id or product_id(raw_input)
+    writer = ArtifactWriter(output_dir, product_id=run_id, sink=sink, on_progress=on_progress, render_formats=render_formats)
 
-    with open(f"{output_dir}/analysis.json", "w") as f:
-        json.dump(outputs.get("analysis", {}), f, indent=2)
+    from instrumentation import start_trace, finish_trace
+    from rate_limits import llm_priority
 
-    with open(f"{output_dir}/content.json", "w") as f:
-        json.dump(outputs.get("content", {}), f, indent=2)
-        
-    with open(f"{output_dir}/comparison.json", "w") as f:
-        json.dump(outputs.get("comparison", {}), f, indent=2)
+    graph = get_graph(parallel, incremental, fused)
+    config, trace = start_trace(run_id)
+    final_state = dict(initial_state)
+    try:
+        with llm_priority():
+            for chunk in graph.stream(initial_state, config=config, stream_mode="updates"):
+                _merge_update(final_state, chunk, writer)
+    except BaseException as e:
+        finish_trace(trace, e)
+        writer.run_failed(e)
+        raise
+    finish_trace(trace)
+    writer.run_finished()
 
-    with open(f"{output_dir}/pages.json", "w") as f:
-        json.dump(outputs.get("pages", {}), f, indent=2)
+    return final_state
+
+async def astream_pipeline(
+    raw_input: Dict[str, Any],
+    output_dir: str = "outputs",
+    parallel: bool = False,
+    incremental: bool = False,
+    fused: bool = False,
+    sink: Optional[JsonlSink] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    run_id: Optional[str] = None,
+    render_formats: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    Async version of stream_pipeline using the compiled graph's astream.
+    """
+    initial_state = build_initial_state(raw_input)
+    run_id = run_id or product_id(raw_input)
+    writer = ArtifactWriter(output_dir, product_id=run_id, sink=sink, on_progress=on_progress, render_formats=render_formats)
+
+    from instrumentation import start_trace, finish_trace
+    from rate_limits import llm_priority
+
+    graph = get_graph(parallel, incremental, fused)
+    config, trace = start_trace(run_id)
+    final_state = dict(initial_state)
+    try:
+        with llm_priority():
+            async for chunk in graph.astream(initial_state, config=config, stream_mode="updates"):
+                _merge_update(final_state, chunk, writer)
+    except BaseException as e:
+        finish_trace(trace, e)
+        writer.run_failed(e)
+        raise
+    finish_trace(trace)
+    writer.run_finished()
+
+    return final_state
+
+def save_outputs(outputs: Dict[str, Any], output_dir: str = "outputs") -> None:
+    """
+    Saves pipeline outputs as JSON files (each written atomically).
+    """
+    for key in ("analysis", "content", "comparison", "pages"):
+        atomic_write_json(f"{output_dir}/{ARTIFACT_FILES[key]}", outputs.get(key, {}))
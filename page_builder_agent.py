@@ -1,13 +1,15 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 
 def build_pages(
     parsed_input: Dict[str, Any],
     content: Dict[str, Any],
-    questions: Dict[str, Any]
+    questions: Dict[str, Any],
+    comparison: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Assembles final page-level templates from existing outputs.
+    `comparison` is the comparison agent's {"comparisons": [...]}, one per competitor.
     Returns a dictionary containing product_page, faq_page, and comparison_page.
     """
     product = parsed_input.get("product", {})
@@ -24,34 +26,30 @@ def build_pages(
     }
 
     # 2. FAQ Page
-    faqs: List[Dict[str, str]] = []
-    # Flatten all question categories
-    for category_questions in questions.values():
-        if isinstance(category_questions, list):
-            for item in category_questions:
-                if isinstance(item, dict):
-                    faqs.append({
-                        "question": item.get("question", ""),
-                        "answer": item.get("answer", "Not provided.")
-                    })
-                elif isinstance(item, str): # Fallback for old format if needed
-                     faqs.append({
-                        "question": item,
-                        "answer": "Not provided in input."
-                    })
-
+    # `questions` is a QuestionOutputSchema dict; pairs keep the order they were generated in
+    faqs: List[Dict[str, str]] = [
+        {"question": pair["question"], "answer": pair.get("answer", "Not provided.")}
+        for pair in questions.get("qa_pairs", [])
+    ]
 
     faq_page = {
         "faqs": faqs
     }
 
     # 3. Comparison Page
+    # Comparisons come in competitor order; with no competitors the agent invented a Product B
+    comparisons = (comparison or {}).get("comparisons", [])
+    page_competitors = competitors or ([{}] if comparisons else [])
     competitors_list: List[Dict[str, Any]] = []
-    for comp in competitors:
+    for index, comp in enumerate(page_competitors):
+        verdict = comparisons[index] if index < len(comparisons) else {}
         competitors_list.append({
-            "name": comp.get("name", ""),
+            "name": comp.get("name", verdict.get("product_b_name", "")),
             "price": comp.get("price", ""),
-            "ingredients": comp.get("ingredients", [])
+            "ingredients": comp.get("ingredients", []),
+            "ingredient_comparison": verdict.get("ingredient_comparison", ""),
+            "benefit_comparison": verdict.get("benefit_comparison", ""),
+            "verdicts": verdict.get("verdicts", [])
         })
 
     comparison_page = {
@@ -0,0 +1,352 @@
+from typing import Dict, Any, List, Iterator, Optional, Sequence, Tuple
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+
+from artifacts import ARTIFACT_FILES, atomic_write_json
+
+# Renders the page builder's output (pages.json) to publishable files. Templates are
+# compiled once per process; a file is rewritten only when the hash of the page it
+# comes from (plus the template version) differs from the one recorded in the manifest,
+# so republishing an unchanged catalog reads and hashes but renders and writes nothing.
+FORMATS = ("html", "md", "json")
+TEMPLATE_VERSION = "1"
+MANIFEST_FILE = ".render_manifest.json"
+
+# page key in pages.json -> template; files are named after the key (faq_page.html), so
+# they never collide with the stage artifacts saved in the same directory
+PAGE_TEMPLATES: Dict[str, str] = {
+    "product_page": "product",
+    "faq_page": "faq",
+    "comparison_page": "comparison",
+}
+
+_HTML_DOCUMENT = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+</head>
+<body>
+$body</body>
+</html>
+"""
+
+_TEMPLATE_SOURCES: Dict[str, Dict[str, str]] = {
+    "html": {
+        "product": """<article class="product">
+<h1>$headline</h1>
+<p class="price">$price</p>
+<p>$description</p>
+<h2>Benefits</h2>
+<ul>
+$benefits</ul>
+<h2>How to Use</h2>
+<p>$usage</p>
+<h2>Suitable For</h2>
+<p>$skin_type</p>
+</article>
+""",
+        "list_item": "<li>$item</li>\n",
+        "faq": """<section class="faq">
+<h1>Frequently Asked Questions</h1>
+$faqs</section>
+""",
+        "faq_item": """<details>
+<summary>$question</summary>
+<p>$answer</p>
+</details>
+""",
+        "comparison": """<section class="comparison">
+<h1>$product compared</h1>
+$competitors</section>
+""",
+        "competitor": """<article class="competitor">
+<h2>$product vs $name</h2>
+<p class="price">$price</p>
+<h3>Ingredients</h3>
+<p>$ingredient_comparison</p>
+<h3>Benefits</h3>
+<p>$benefit_comparison</p>
+<table>
+<tr><th>Skin type</th><th>Winner</th><th>Why</th></tr>
+$verdicts</table>
+</article>
+""",
+        "verdict": "<tr><td>$skin_type</td><td>$winner</td><td>$reasoning</td></tr>\n",
+    },
+    "md": {
+        "product": """# $headline
+
+**Price:** $price
+
+$description
+
+## Benefits
+
+$benefits
+## How to Use
+
+$usage
+
+## Suitable For
+
+$skin_type
+""",
+        "list_item": "- $item\n",
+        "faq": """# Frequently Asked Questions
+
+$faqs""",
+        "faq_item": """### $question
+
+$answer
+
+""",
+        "comparison": """# $product compared
+
+$competitors""",
+        "competitor": """## $product vs $name
+
+**Price:** $price
+
+### Ingredients
+
+$ingredient_comparison
+
+### Benefits
+
+$benefit_comparison
+
+| Skin type | Winner | Why |
+| --- | --- | --- |
+$verdicts
+""",
+        "verdict": "| $skin_type | $winner | $reasoning |\n",
+    },
+}
+
+_templates: Optional[Dict[str, Dict[str, Template]]] = None
+
+
+def compiled_templates() -> Dict[str, Dict[str, Template]]:
+    """
+    Returns the templates of every text format, compiled on first use and shared by all products.
+    """
+    global _templates
+    if _templates is None:
+        _templates = {fmt: {name: Template(source) for name, source in sources.items()} for fmt, sources in _TEMPLATE_SOURCES.items()}
+        _templates["html"]["document"] = Template(_HTML_DOCUMENT)
+    return _templates
+
+
+def _escape_markdown(value: Any) -> str:
+    # Table cells and headings must stay on one line
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+_ESCAPE = {"html": lambda value: html.escape(str(value)), "md": _escape_markdown}
+
+
+def check_formats(formats: Sequence[str]) -> Tuple[str, ...]:
+    """
+    Validates requested formats up front, before any product is run or rendered.
+    """
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown page format '{fmt}'. Expected one of: {', '.join(FORMATS)}.")
+    return tuple(formats)
+
+
+def _render_text(page_name: str, page: Dict[str, Any], fmt: str) -> str:
+    templates = compiled_templates()[fmt]
+    escape = _ESCAPE[fmt]
+
+    def items(values: List[Any]) -> str:
+        return "".join(templates["list_item"].substitute(item=escape(value)) for value in values)
+
+    if page_name == "product":
+        body = templates["product"].substitute(
+            headline=escape(page.get("headline", "")),
+            price=escape(page.get("price", "")),
+            description=escape(page.get("description", "")),
+            benefits=items(page.get("benefits", [])),
+            usage=escape(page.get("usage", "")),
+            skin_type=escape(", ".join(page.get("skin_type", []))),
+        )
+        title = page.get("headline", "")
+    elif page_name == "faq":
+        body = templates["faq"].substitute(faqs="".join(
+            templates["faq_item"].substitute(question=escape(faq["question"]), answer=escape(faq["answer"]))
+            for faq in page.get("faqs", [])
+        ))
+        title = "Frequently Asked Questions"
+    else:
+        product = escape(page.get("product", ""))
+        body = templates["comparison"].substitute(product=product, competitors="".join(
+            templates["competitor"].substitute(
+                product=product,
+                name=escape(competitor.get("name", "")),
+                price=escape(competitor.get("price", "")),
+                ingredient_comparison=escape(competitor.get("ingredient_comparison", "")),
+                benefit_comparison=escape(competitor.get("benefit_comparison", "")),
+                verdicts="".join(
+                    templates["verdict"].substitute(
+                        skin_type=escape(verdict.get("skin_type", "")),
+                        winner=escape(verdict.get("winner", "")),
+                        reasoning=escape(verdict.get("reasoning", "")),
+                    )
+                    for verdict in competitor.get("verdicts", [])
+                ),
+            )
+            for competitor in page.get("competitors", [])
+        ))
+        title = f"{page.get('product', '')} compared"
+
+    if fmt == "html":
+        return templates["document"].substitute(title=escape(title), body=body)
+    return body
+
+
+def render_page(page_name: str, page: Dict[str, Any], fmt: str) -> str:
+    """
+    Renders one page ("product", "faq" or "comparison") in one format.
+    """
+    if fmt == "json":
+        return json.dumps(page, indent=2, ensure_ascii=False) + "\n"
+    if fmt not in _TEMPLATE_SOURCES:
+        raise ValueError(f"Unknown page format '{fmt}'. Expected one of: {', '.join(FORMATS)}.")
+    return _render_text(page_name, page, fmt)
+
+
+def page_hash(page: Dict[str, Any]) -> str:
+    """
+    Hash of everything a page's rendered files depend on: its content and the templates.
+    """
+    payload = json.dumps(page, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{TEMPLATE_VERSION}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _write_text(path: str, text: str) -> None:
+    # Same write-then-rename as atomic_write_json, so a crash never leaves half a page
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(output_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"source": None, "files": {}}
+    return manifest if isinstance(manifest.get("files"), dict) else {"source": None, "files": {}}
+
+
+def _existing_files(output_dir: str) -> set:
+    try:
+        return set(os.listdir(output_dir))
+    except OSError:
+        return set()
+
+
+def write_pages(
+    pages: Dict[str, Any],
+    output_dir: str,
+    formats: Sequence[str] = FORMATS,
+    source_hash: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Renders the pages of one product into `output_dir` (product_page.html, faq_page.md, ...).
+    Files whose page hash matches the manifest and that still exist are left untouched.
+    `source_hash` identifies the pages.json they came from, for render_catalog's fast path.
+    Returns {"written": n, "skipped": n}.
+    """
+    manifest = _read_manifest(output_dir)
+    files: Dict[str, str] = manifest["files"]
+    existing = _existing_files(output_dir)
+
+    written = skipped = 0
+    for key, page_name in PAGE_TEMPLATES.items():
+        page = pages.get(key)
+        if page is None:
+            continue
+        digest = page_hash(page)
+        for fmt in formats:
+            filename = f"{key}.{fmt}"
+            if files.get(filename) == digest and filename in existing:
+                skipped += 1
+                continue
+            if not existing:
+                os.makedirs(output_dir, exist_ok=True)
+                existing.add(MANIFEST_FILE)
+            _write_text(os.path.join(output_dir, filename), render_page(page_name, page, fmt))
+            files[filename] = digest
+            written += 1
+
+    if written or manifest.get("source") != source_hash:
+        atomic_write_json(os.path.join(output_dir, MANIFEST_FILE), {"source": source_hash, "files": files})
+    return {"written": written, "skipped": skipped}
+
+
+def _render_product_dir(task: Tuple[str, str, Tuple[str, ...]]) -> Optional[Dict[str, int]]:
+    pages_path, output_dir, formats = task
+    try:
+        with open(pages_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None  # the product's run never reached the page builder
+
+    # Fast path: the exact pages.json the manifest was written from, and every file still there
+    source_hash = hashlib.sha256(f"{TEMPLATE_VERSION}:{','.join(formats)}:".encode("utf-8") + data).hexdigest()
+    manifest = _read_manifest(output_dir)
+    if manifest.get("source") == source_hash:
+        expected = [f"{key}.{fmt}" for key in PAGE_TEMPLATES for fmt in formats]
+        existing = _existing_files(output_dir)
+        if all(filename in existing and filename in manifest["files"] for filename in expected):
+            return {"written": 0, "skipped": len(expected)}
+
+    return write_pages(json.loads(data), output_dir, formats, source_hash=source_hash)
+
+
+def _iter_product_dirs(source_dir: str) -> Iterator[str]:
+    # One level deep, like the batch runner's layout: <source_dir>/<product_id>/pages.json
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield entry.name
+
+
+def render_catalog(
+    source_dir: str,
+    output_dir: Optional[str] = None,
+    formats: Sequence[str] = FORMATS,
+    workers: Optional[int] = None,
+    chunk_size: int = 256
+) -> Dict[str, Any]:
+    """
+    Republishes every product of a batch output directory from its saved pages.json,
+    without running the pipeline. Products are spread over a process pool; pages are
+    written to `<output_dir>/<product_id>/` (next to pages.json by default) and only
+    when their content changed. Returns totals.
+    """
+    formats = check_formats(formats)
+    output_dir = output_dir or source_dir
+
+    tasks = (
+        (os.path.join(source_dir, name, ARTIFACT_FILES["pages"]), os.path.join(output_dir, name), formats)
+        for name in _iter_product_dirs(source_dir)
+    )
+    totals = {"products": 0, "written": 0, "skipped": 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_render_product_dir, tasks, chunksize=chunk_size):
+            if result is None:
+                continue
+            totals["products"] += 1
+            totals["written"] += result["written"]
+            totals["skipped"] += result["skipped"]
+    return totals
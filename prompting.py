@@ -0,0 +1,156 @@
+from typing import Dict, Any, List, Optional, Mapping, Sequence
+import hashlib
+import json
+import os
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.runnables import Runnable
+
+# Default prompt budgets in estimated tokens; PROMPT_BUDGET_<AGENT> overrides one agent
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "analysis": 4000,
+    "content": 4000,
+    "questions": 6000,
+    "comparison": 4000,
+    "evaluator": 4000,
+    "fused": 8000,
+}
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English/JSON), good enough for budgeting.
+    """
+    return (len(text) + 3) // 4
+
+
+class PromptBudgetError(ValueError):
+    pass
+
+
+def compact_json(data: Any) -> str:
+    """
+    Serializes prompt data without pretty-printing whitespace.
+    """
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def resolve_path(data: Any, path: str) -> Any:
+    """
+    Looks up a dotted path. Digits index into lists; any other key on a list is
+    applied to every item ("competitors.name" -> list of names). Missing parts give None.
+    """
+    if not path:
+        return data
+    head, _, rest = path.partition(".")
+    if isinstance(data, Mapping):
+        return resolve_path(data.get(head), rest) if head in data else None
+    if isinstance(data, list):
+        if head.isdigit():
+            index = int(head)
+            return resolve_path(data[index], rest) if index < len(data) else None
+        return [resolve_path(item, path) for item in data]
+    return None
+
+
+def project_fields(data: Any, paths: Optional[Sequence[str]]) -> Any:
+    """
+    Keeps only the declared paths, preserving the nesting of the source data.
+    None keeps everything.
+    """
+    if paths is None:
+        return data
+    if isinstance(data, list):
+        return [project_fields(item, paths) for item in data]
+    if not isinstance(data, Mapping):
+        return data
+
+    grouped: Dict[str, Optional[List[str]]] = {}
+    for path in paths:
+        head, _, rest = path.partition(".")
+        if head in grouped and grouped[head] is None:
+            continue
+        if not rest:
+            grouped[head] = None
+        else:
+            grouped.setdefault(head, []).append(rest)
+
+    return {key: project_fields(data[key], sub_paths) for key, sub_paths in grouped.items() if key in data}
+
+
+class AgentPrompt:
+    """
+    A prompt compiled once per agent: the template, the parser's format instructions
+    and the token cost of the static text are all computed at import time.
+    `fields` maps each data variable to the paths the agent needs from its source;
+    those are serialized compactly, and the rendered size is checked against the
+    agent's token budget before any call is made. `version` hashes the static text,
+    so stored stage results can tell an edited prompt apart.
+    """
+
+    def __init__(
+        self,
+        agent: str,
+        template: str,
+        fields: Dict[str, Optional[List[str]]],
+        parser: Optional[BaseOutputParser] = None,
+        system: Optional[str] = None,
+        extra_variables: Sequence[str] = ()
+    ):
+        self.agent = agent
+        self.fields = fields
+        partials = {"format_instructions": parser.get_format_instructions()} if parser else {}
+        input_variables = list(fields) + list(extra_variables)
+
+        if system is not None:
+            self.prompt = ChatPromptTemplate.from_messages(
+                [("system", system), ("human", template)]
+            ).partial(**partials)
+            static_text = system + template
+        else:
+            self.prompt = PromptTemplate(
+                template=template,
+                input_variables=input_variables,
+                partial_variables=partials,
+            )
+            static_text = template
+        self.static_tokens = estimate_tokens(static_text) + sum(estimate_tokens(v) for v in partials.values())
+        self.version = hashlib.sha256(
+            json.dumps([static_text, partials], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @property
+    def budget(self) -> int:
+        override = os.getenv(f"PROMPT_BUDGET_{self.agent.upper()}")
+        return int(override) if override else DEFAULT_BUDGETS.get(self.agent, 4000)
+
+    def inputs(self, extra: Optional[Dict[str, Any]] = None, **sources: Any) -> Dict[str, Any]:
+        """
+        Projects and serializes each source into its template variable, then enforces
+        the token budget. `extra` values are passed through as already-rendered text.
+        """
+        inputs: Dict[str, Any] = {
+            variable: compact_json(project_fields(sources[variable], paths))
+            for variable, paths in self.fields.items()
+        }
+        inputs.update(extra or {})
+
+        estimated = self.static_tokens + sum(estimate_tokens(str(value)) for value in inputs.values())
+        if estimated > self.budget:
+            raise PromptBudgetError(
+                f"{self.agent} prompt needs ~{estimated} tokens, over its budget of {self.budget}."
+            )
+        return inputs
+
+    def source_paths(self, **prefixes: str) -> List[str]:
+        """
+        Maps each data variable's declared fields onto state paths, for keying stage caches.
+        """
+        paths: List[str] = []
+        for variable, fields in self.fields.items():
+            prefix = prefixes[variable]
+            paths.extend([prefix] if fields is None else [f"{prefix}.{field}" for field in fields])
+        return paths
+
+    def chain(self, llm: BaseChatModel) -> Runnable:
+        return self.prompt | llm
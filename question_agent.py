@@ -1,24 +1,48 @@
-from typing import Dict, Any, List
-import json
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+from typing import Dict, Any, List, Optional, Tuple
+import re
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import PydanticOutputParser
-from schemas import QuestionOutputSchema
+from langchain_core.runnables import Runnable
+from llm_client import get_llm
+from prompting import AgentPrompt
+from retries import run_with_retries, arun_with_retries
+from schemas import QAPair, QuestionOutputSchema
+from stream_parse import StreamRules, ainvoke_text, invoke_text
 
-def generate_questions(parsed_input: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generates categorized Q&A pairs using an LLM with strict validation and aggressive retries.
-    Fails loudly if generation fails after 5 attempts.
-    """
-    # Initialize LLM
-    llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-    
-    # Setup Parser
-    parser = PydanticOutputParser(pydantic_object=QuestionOutputSchema)
-    
-    # Setup Prompt
-    prompt = PromptTemplate(
-        template="""You are a Q&A generation assistant.
+TARGET_COUNT = 15
+
+# Setup Parser
+PARSER = PydanticOutputParser(pydantic_object=QuestionOutputSchema)
+
+TOP_UP_TEMPLATE = """You are a Q&A generation assistant.
+An existing set of Q&A pairs for this product is incomplete.
+Your task is to generate exactly {count} NEW Q&A pairs based on the provided product information.
+
+Existing Q&A pairs (do NOT repeat or rephrase these):
+{existing_questions}
+
+Constraints:
+1. Generate exactly {count} new Q&A pairs, each different from the existing ones.
+2. You MUST generate the ANSWER based on the product data.
+3. If no competitor exists in the data, invent a fictional Product B for comparison questions.
+4. Each Q&A pair must have a 'category'. Use these categories: Informational, Usage, Safety, Purchase, Comparison.
+5. Output must be a valid JSON object matching the requested schema.
+
+Product Data:
+{product_data}
+
+{format_instructions}
+"""
+
+# Q&A covers the whole product; competitors are only needed for comparison questions
+QUESTION_FIELDS: Dict[str, Optional[List[str]]] = {
+    "product_data": ["product", "competitors.name", "competitors.ingredients", "competitors.price"],
+}
+
+# Setup Prompts (compiled once)
+PROMPT = AgentPrompt(
+    "questions",
+    template="""You are a Q&A generation assistant.
 Your task is to generate exactly 15 Q&A pairs based on the provided product information.
 
 Constraints:
@@ -33,28 +57,147 @@ Product Data:
 
 {format_instructions}
 """,
-        input_variables=["product_data"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+    fields=QUESTION_FIELDS,
+    parser=PARSER,
+)
+
+TOP_UP_PROMPT = AgentPrompt(
+    "questions",
+    template=TOP_UP_TEMPLATE,
+    fields=QUESTION_FIELDS,
+    parser=PARSER,
+    extra_variables=("count", "existing_questions"),
+)
 
-    # Create Chain
-    chain = prompt | llm | parser
+# Checked while the output streams in (see stream_parse); the pair count is set per request
+STREAM_RULES = StreamRules(QuestionOutputSchema)
 
-    # Execute with 5 retries
-    max_retries = 5
-    last_exception = None
+def _build_chain(llm: Optional[BaseChatModel] = None, top_up: bool = False) -> Runnable:
+    # Shared, pooled client (see llm_client)
+    # Parsing happens in the retry engine so near-valid JSON can be repaired
+    return (TOP_UP_PROMPT if top_up else PROMPT).chain(llm or get_llm("questions"))
 
-    for attempt in range(max_retries):
+def _question_key(question: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", question.lower()).strip()
+
+def merge_qa_pairs(existing: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Appends new pairs to existing ones, dropping empty pairs and repeated questions.
+    """
+    merged: List[Dict[str, Any]] = []
+    seen = set()
+    for pair in list(existing) + list(new):
+        key = _question_key(pair.get("question", ""))
+        if not key or not pair.get("answer") or key in seen:
+            continue
+        seen.add(key)
+        merged.append(pair)
+    return merged
+
+def _valid_pairs(items: List[Any]) -> List[Dict[str, Any]]:
+    pairs: List[Dict[str, Any]] = []
+    for item in items:
         try:
-            print(f"Generating questions (Attempt {attempt + 1}/{max_retries})...")
-            result = chain.invoke({"product_data": json.dumps(parsed_input, indent=2)})
-            # Result is a QuestionOutputSchema object
-            return result.dict()
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            last_exception = e
+            pairs.append(QAPair(**item).model_dump())
+        except Exception:
             continue
+    return pairs
+
+class _QuestionRequest:
+    """
+    One generate_questions call. Each attempt asks only for the pairs still missing, so
+    the valid pairs of an output aborted mid-stream or rejected as too short are kept
+    instead of regenerated.
+    """
+
+    def __init__(
+        self,
+        parsed_input: Dict[str, Any],
+        llm: Optional[BaseChatModel],
+        existing_pairs: Optional[List[Dict[str, Any]]]
+    ):
+        self.parsed_input = parsed_input
+        self.llm = llm
+        self.existing = merge_qa_pairs(existing_pairs or [], [])
+
+    def missing(self) -> int:
+        return TARGET_COUNT - len(self.existing)
+
+    def _prepare(self) -> Tuple[Runnable, Dict[str, Any], StreamRules]:
+        # Keep the valid pairs we already have and only ask for the missing count
+        missing = self.missing()
+        rules = STREAM_RULES.with_min_items(qa_pairs=missing)
+        if not self.existing:
+            return _build_chain(self.llm), PROMPT.inputs(product_data=self.parsed_input), rules
+
+        print(f"Topping up questions: keeping {len(self.existing)}, requesting {missing}...")
+        existing_questions = "\n".join(
+            f"- [{pair.get('category', '')}] {pair['question']}" for pair in self.existing
+        )
+        inputs = TOP_UP_PROMPT.inputs(
+            extra={"count": missing, "existing_questions": existing_questions},
+            product_data=self.parsed_input,
+        )
+        return _build_chain(self.llm, top_up=True), inputs, rules
+
+    def call(self) -> str:
+        chain, inputs, rules = self._prepare()
+        return invoke_text(chain, inputs, rules)
+
+    async def acall(self) -> str:
+        chain, inputs, rules = self._prepare()
+        return await ainvoke_text(chain, inputs, rules)
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        # Valid pairs are kept even if the result is then rejected as too short, so the
+        # next attempt only tops up the rest
+        new_pairs = PARSER.parse(text).model_dump()["qa_pairs"]
+        self.existing = merge_qa_pairs(self.existing, new_pairs)
+        return {"qa_pairs": self.existing}
 
-    # Fail loudly if all retries fail
-    raise RuntimeError(f"Failed to generate questions after {max_retries} attempts. Last error: {last_exception}")
+    def low_confidence(self, result: Dict[str, Any]) -> Optional[str]:
+        # The orchestrator's 15-pair check, applied before a small-model answer is kept
+        count = len(result["qa_pairs"])
+        return f"{count} of {TARGET_COUNT} Q&A pairs" if count < TARGET_COUNT else None
 
+    def on_partial(self, partial: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Pairs completed before the stream was aborted count towards the target
+        self.existing = merge_qa_pairs(self.existing, _valid_pairs(partial.get("qa_pairs", [])))
+        if self.missing() <= 0:
+            return {"qa_pairs": self.existing}
+        return None
+
+def generate_questions(
+    parsed_input: Dict[str, Any],
+    llm: Optional[BaseChatModel] = None,
+    existing_pairs: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Generates categorized Q&A pairs using an LLM with strict validation and aggressive retries.
+    If existing_pairs is given, only the missing pairs are requested and merged in.
+    Fails loudly if generation fails after 5 attempts.
+    """
+    request = _QuestionRequest(parsed_input, llm, existing_pairs)
+    if request.missing() <= 0:
+        return {"qa_pairs": request.existing}
+
+    # Execute with the questions retry budget (5 attempts)
+    return run_with_retries(
+        "questions", request.call, request.parse, on_partial=request.on_partial, check=request.low_confidence
+    )
+
+async def agenerate_questions(
+    parsed_input: Dict[str, Any],
+    llm: Optional[BaseChatModel] = None,
+    existing_pairs: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Async version of generate_questions with the same retry and fail-loud behaviour.
+    """
+    request = _QuestionRequest(parsed_input, llm, existing_pairs)
+    if request.missing() <= 0:
+        return {"qa_pairs": request.existing}
+
+    return await arun_with_retries(
+        "questions", request.acall, request.parse, on_partial=request.on_partial, check=request.low_confidence
+    )
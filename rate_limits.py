@@ -0,0 +1,364 @@
+from typing import Dict, Any, List, Optional, Callable, Mapping, Tuple
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+from instrumentation import instrumentation_enabled, metrics
+
+# Every LLM call that misses the response cache waits here for a request slot and for
+# its estimated tokens (see llm_client.ScheduledChatModel). Limits come from
+# LLM_RPM / LLM_TPM and are tightened by the provider's x-ratelimit-* headers.
+DEFAULT_COMPLETION_TOKENS = 500
+
+_priority: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_priority", default=None)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+@contextlib.contextmanager
+def llm_priority(priority: Optional[float] = None):
+    """
+    Tags the LLM calls made inside the block (including graph nodes on worker threads,
+    which copy the context). Lower values are served first; by default it is the time
+    the block was entered, so products that started earlier finish before new ones start.
+    """
+    token = _priority.set(time.monotonic() if priority is None else priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> float:
+    priority = _priority.get()
+    return time.monotonic() if priority is None else priority
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses rate-limit durations such as "7.66s", "2m59.56s", "120ms" or a bare number of seconds.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """
+    Refills continuously up to `capacity` over `period` seconds. A capacity of None
+    means unlimited. The level may go negative when actual usage exceeds an estimate.
+    Not thread-safe on its own; the scheduler holds its lock around every call.
+    """
+
+    def __init__(self, capacity: Optional[float] = None, period: float = 60.0):
+        self.capacity = capacity
+        self.period = period
+        self.level = capacity or 0.0
+        self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity is not None
+
+    def _refill(self, now: float) -> None:
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / self.period)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole bucket goes through once the bucket is full
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * self.period / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity is not None:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float, now: float) -> None:
+        if self.capacity is not None:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+    def set_capacity(self, capacity: float, now: float) -> None:
+        self._refill(now)
+        if self.capacity is None:
+            self.level = capacity
+        self.capacity = capacity
+        self.level = min(self.level, capacity)
+
+    def cap_level(self, available: float, now: float) -> None:
+        if self.capacity is not None:
+            self._refill(now)
+            self.level = min(self.level, available)
+
+
+class _Ticket:
+    __slots__ = ("tokens", "grant", "enqueued_at", "cancelled", "granted")
+
+    def __init__(self, tokens: int, grant: Callable[[], None]):
+        self.tokens = tokens
+        self.grant = grant
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+        self.granted = False
+
+
+class RateLimitScheduler:
+    """
+    Process-wide gate for one model's LLM calls: a request bucket and a token bucket,
+    a priority queue of waiting calls (served strictly in priority order), and a global
+    pause after a 429. Works for threads and event loops alike: waiters are woken by
+    whoever frees capacity, or by a timer set for when the head of the queue fits.
+    """
+
+    def __init__(self, model: str = "", requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[float, int, _Ticket]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+        self._stats: Dict[str, float] = {
+            "granted": 0, "waited": 0, "wait_seconds": 0.0, "max_queued": 0, "rate_limited": 0,
+        }
+
+    # Scheduling (caller holds the lock)
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        return max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def _take(self, tokens: int, now: float) -> None:
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self._stats["granted"] += 1
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while self._queue:
+            ticket = self._queue[0][2]
+            if ticket.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(ticket.tokens, now)
+            if wait > 0:
+                self._schedule(wait, now)
+                break
+            heapq.heappop(self._queue)
+            self._take(ticket.tokens, now)
+            waited = now - ticket.enqueued_at
+            self._stats["waited"] += 1
+            self._stats["wait_seconds"] += waited
+            if instrumentation_enabled():
+                metrics.observe("pipeline_llm_queue_wait_seconds", waited, model=self.model)
+            ticket.granted = True
+            ticket.grant()
+        self._report_depth()
+
+    def _schedule(self, delay: float, now: float) -> None:
+        if self._timer is not None and self._timer_at <= now + delay:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = now + delay
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _report_depth(self) -> None:
+        depth = len(self._queue)
+        self._stats["max_queued"] = max(self._stats["max_queued"], depth)
+        if instrumentation_enabled():
+            metrics.set_gauge("pipeline_llm_queue_depth", depth, model=self.model)
+
+    def _try_fast_path(self, tokens: int) -> bool:
+        # Nothing queued ahead and capacity available: no ticket needed
+        now = time.monotonic()
+        if not self._queue and self._wait_time(tokens, now) <= 0:
+            self._take(tokens, now)
+            return True
+        return False
+
+    def _enqueue(self, tokens: int, priority: Optional[float], grant: Callable[[], None]) -> _Ticket:
+        ticket = _Ticket(tokens, grant)
+        priority = current_priority() if priority is None else priority
+        heapq.heappush(self._queue, (priority, next(self._sequence), ticket))
+        self._dispatch()
+        return ticket
+
+    # Public API
+
+    def acquire(self, tokens: int, priority: Optional[float] = None) -> None:
+        """
+        Blocks until one request and `tokens` estimated tokens may be spent.
+        """
+        granted = threading.Event()
+        with self._lock:
+            if self._try_fast_path(tokens):
+                return
+            self._enqueue(tokens, priority, granted.set)
+        granted.wait()
+
+    async def aacquire(self, tokens: int, priority: Optional[float] = None) -> None:
+        """
+        Async version of acquire; waits without holding a thread.
+        """
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant() -> None:
+            def resolve() -> None:
+                if not granted.done():
+                    granted.set_result(None)
+            try:
+                loop.call_soon_threadsafe(resolve)
+            except RuntimeError:
+                pass  # the loop is gone; nobody is waiting any more
+
+        with self._lock:
+            if self._try_fast_path(tokens):
+                return
+            ticket = self._enqueue(tokens, priority, grant)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket.granted:
+                    # Granted just before the cancellation: nothing was sent, so the
+                    # request and its tokens go back to the buckets
+                    now = time.monotonic()
+                    self.requests.give_back(1, now)
+                    self.tokens.give_back(ticket.tokens, now)
+                else:
+                    ticket.cancelled = True
+                self._dispatch()
+            raise
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """
+        Corrects the token bucket once a call's real usage is known.
+        """
+        if actual is None or actual == estimated:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if actual > estimated:
+                self.tokens.take(actual - estimated, now)
+            else:
+                self.tokens.give_back(estimated - actual, now)
+            self._dispatch()
+
+    def observe_headers(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """
+        Adapts to the provider's view: x-ratelimit-limit-tokens (per minute) caps the token
+        bucket, remaining-* values cap the current levels, an exhausted request quota pauses
+        until its reset, and a 429 pauses every call for Retry-After.
+        """
+        def number(name: str) -> Optional[float]:
+            try:
+                value = headers.get(name)
+                return float(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+
+        with self._lock:
+            now = time.monotonic()
+            limit_tokens = number("x-ratelimit-limit-tokens")
+            if limit_tokens and (not self.tokens.limited or limit_tokens < self.tokens.capacity):
+                self.tokens.set_capacity(limit_tokens, now)
+
+            remaining_tokens = number("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None:
+                self.tokens.cap_level(remaining_tokens, now)
+
+            remaining_requests = number("x-ratelimit-remaining-requests")
+            if remaining_requests is not None:
+                self.requests.cap_level(remaining_requests, now)
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if remaining_requests <= 0 and reset:
+                    self._paused_until = max(self._paused_until, now + reset)
+
+            if status_code == 429:
+                self._stats["rate_limited"] += 1
+                retry_after = parse_duration(headers.get("retry-after"))
+                retry_after = retry_after or parse_duration(headers.get("x-ratelimit-reset-tokens")) or 1.0
+                self._paused_until = max(self._paused_until, now + retry_after)
+                if instrumentation_enabled():
+                    metrics.inc("pipeline_llm_rate_limited_total", model=self.model)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self._stats,
+                "queued": len(self._queue),
+                "paused_for": round(max(0.0, self._paused_until - now), 3),
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+            }
+
+
+_schedulers_lock = threading.Lock()
+_schedulers: Dict[str, RateLimitScheduler] = {}
+
+
+def get_scheduler(model: str) -> RateLimitScheduler:
+    """
+    Returns the process-wide scheduler for a model (provider limits are per model).
+    """
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = RateLimitScheduler(model, _env_int("LLM_RPM"), _env_int("LLM_TPM"))
+        return _schedulers[model]
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {model: scheduler.stats() for model, scheduler in schedulers.items()}
+
+
+def reset_schedulers() -> None:
+    """
+    Drops every scheduler so new limits from the environment take effect.
+    """
+    with _schedulers_lock:
+        _schedulers.clear()
+
+
+def scheduling_enabled() -> bool:
+    return os.getenv("LLM_SCHEDULER_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def expected_completion_tokens() -> int:
+    return _env_int("LLM_EXPECTED_COMPLETION_TOKENS") or DEFAULT_COMPLETION_TOKENS
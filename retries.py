@@ -0,0 +1,376 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple, TypeVar
+import asyncio
+import json
+import random
+import threading
+import time
+from pydantic import BaseModel
+from hedging import ahedged_call, hedged_call
+from instrumentation import record_retry
+from llm_cache import cache_bypass
+from model_cascade import SMALL, attempt_tiers, model_tier, record_accepted, record_escalation
+
+T = TypeVar("T")
+
+# Error classes that are worth waiting out, by exception class name. Matching on names
+# keeps this module free of SDK imports (groq, httpx, openai all use these names).
+RATE_LIMIT_ERRORS = {"RateLimitError"}
+TRANSPORT_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout", "ReadTimeout",
+    "ReadError", "RemoteProtocolError", "TimeoutException", "PoolTimeout", "TimeoutError",
+    "ConnectionError",
+}
+SERVER_ERRORS = {"InternalServerError", "ServiceUnavailableError", "APIStatusError"}
+FATAL_ERRORS = {"AuthenticationError", "PermissionDeniedError", "NotFoundError", "BadRequestError"}
+PARSE_ERRORS = {"OutputParserException", "JSONDecodeError"}
+VALIDATION_ERRORS = {"ValidationError"}
+# Raised by stream_parse when an output breaks the schema mid-stream
+EARLY_ABORT_ERRORS = {"StreamAbortError"}
+
+BACKOFF_REASONS = {"rate_limit", "transport", "server"}
+
+
+class RetryPolicy(BaseModel):
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+
+# Per-agent retry budgets (LLM calls per agent invocation)
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "analysis": RetryPolicy(max_attempts=3),
+    "content": RetryPolicy(max_attempts=5),
+    "questions": RetryPolicy(max_attempts=5),
+    "comparison": RetryPolicy(max_attempts=3),
+    "evaluator": RetryPolicy(max_attempts=3),
+    # Fused mode falls back to the separate agents, so it gets few attempts of its own
+    "fused": RetryPolicy(max_attempts=2),
+}
+
+
+def get_retry_policy(agent: str) -> RetryPolicy:
+    return RETRY_POLICIES.get(agent, RetryPolicy())
+
+
+def set_retry_policy(agent: str, policy: RetryPolicy) -> None:
+    RETRY_POLICIES[agent] = policy
+
+
+class RetryStats:
+    """
+    Thread-safe counters of why each retry happened, per agent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, agent: str, reason: str) -> None:
+        with self._lock:
+            agent_counts = self._counts.setdefault(agent, {})
+            agent_counts[reason] = agent_counts.get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {agent: dict(counts) for agent, counts in self._counts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+retry_stats = RetryStats()
+
+
+def _record(agent: str, reason: str) -> None:
+    retry_stats.record(agent, reason)
+    # Also attach it to the current run's trace when instrumentation is on
+    record_retry(agent, reason)
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Maps an exception to a retry reason: rate_limit, transport, server, fatal,
+    early_abort, parse, validation or other.
+    """
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & RATE_LIMIT_ERRORS:
+        return "rate_limit"
+    if names & FATAL_ERRORS:
+        return "fatal"
+    if names & TRANSPORT_ERRORS:
+        return "transport"
+    if names & SERVER_ERRORS:
+        return "server"
+    if names & EARLY_ABORT_ERRORS:
+        return "early_abort"
+    if names & PARSE_ERRORS:
+        return "parse"
+    if names & VALIDATION_ERRORS:
+        return "validation"
+    return "other"
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(policy: RetryPolicy, attempt: int, error: Optional[BaseException] = None) -> float:
+    """
+    Exponential backoff with full jitter. A server-sent Retry-After wins when present.
+    """
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, policy.max_delay)
+    ceiling = min(policy.max_delay, policy.base_delay * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+# JSON Repair
+MAX_REPAIR_CANDIDATES = 50
+
+def _scan_json(text: str) -> Tuple[Optional[str], List[str]]:
+    # Walks one JSON value, dropping trailing commas. Returns the complete value (with any
+    # trailing text cut off), or, if the text is truncated, closed-off candidates from the
+    # latest element boundary backwards.
+    out: List[str] = []
+    stack: List[str] = []
+    safe_points: List[Tuple[int, List[str]]] = []
+    in_string = False
+    escaped = False
+
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            # Drop a trailing comma before the closing bracket
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1:]
+            if not stack:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), []
+            safe_points.append((len(out), list(stack)))
+            continue
+        elif ch == ",":
+            safe_points.append((len(out), list(stack)))
+        out.append(ch)
+
+    candidates = [
+        "".join(out[:length]) + "".join(reversed(open_brackets))
+        for length, open_brackets in reversed(safe_points)
+    ]
+    return None, candidates[:MAX_REPAIR_CANDIDATES]
+
+
+def repair_candidates(text: str) -> List[str]:
+    """
+    Cheap local fixes for near-valid JSON: code fences and trailing text are cut,
+    trailing commas removed, and truncated arrays/objects closed at element boundaries.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return []
+    complete, truncated = _scan_json(text[min(starts):])
+    if complete is not None:
+        return [complete]
+    # Several boundaries can close off to the same text
+    return list(dict.fromkeys(truncated))
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    Returns the first repaired candidate that is valid JSON, or None.
+    """
+    for candidate in repair_candidates(text):
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+    return None
+
+
+def parse_with_repair(agent: str, text: str, parse: Callable[[str], T]) -> T:
+    """
+    Parses raw LLM text; on failure tries local repairs before giving up.
+    """
+    try:
+        return parse(text)
+    except Exception as first_error:
+        for candidate in repair_candidates(text):
+            try:
+                result = parse(candidate)
+            except Exception:
+                continue
+            _record(agent, "local_repair")
+            return result
+        raise first_error
+
+
+# Retry Loops
+def _handle_failure(agent: str, policy: RetryPolicy, attempt: int, error: Exception) -> Optional[float]:
+    # Records why the attempt failed and returns how long to wait before the next one.
+    # Raises if the error is not worth retrying.
+    reason = classify_error(error)
+    _record(agent, reason)
+    print(f"Attempt {attempt + 1} failed ({reason}): {error}")
+    if reason == "fatal":
+        raise error
+    if reason in BACKOFF_REASONS:
+        return backoff_delay(policy, attempt, error)
+    return 0.0
+
+
+def _salvage(agent: str, error: Exception, on_partial: Optional[Callable[[Dict[str, Any]], Optional[T]]]) -> Optional[T]:
+    # Offers the items an aborted stream got right to the agent, which may finish with them
+    partial = getattr(error, "partial", None)
+    if on_partial is None or not partial:
+        return None
+    result = on_partial(partial)
+    if result is not None:
+        _record(agent, "partial_result")
+    return result
+
+
+def _announce(agent: str, attempt: int, tiers: List[str]) -> None:
+    model = ", small model" if tiers[attempt] == SMALL else ""
+    print(f"Generating {agent} (Attempt {attempt + 1}/{len(tiers)}{model})...")
+
+
+def _small_model_failed(agent: str, attempt: int, error: Exception) -> None:
+    # Any failure of the small model escalates at once, without backoff: the large model
+    # has its own rate limits, and a model-specific error (e.g. unknown model) is not final
+    reason = classify_error(error)
+    _record(agent, reason)
+    print(f"Attempt {attempt + 1} failed on the small model ({reason}): {error}")
+    record_escalation(agent, "invalid")
+
+
+def _trusted(agent: str, result: Any, check: Optional[Callable[[Any], Optional[str]]]) -> bool:
+    issue = check(result) if check is not None else None
+    if issue:
+        print(f"Small model answer not trusted: {issue}")
+        record_escalation(agent, "low_confidence")
+        return False
+    record_accepted(agent)
+    return True
+
+
+def run_with_retries(
+    agent: str,
+    call: Callable[[], str],
+    parse: Callable[[str], T],
+    policy: Optional[RetryPolicy] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], Optional[T]]] = None,
+    check: Optional[Callable[[T], Optional[str]]] = None
+) -> T:
+    """
+    Runs call() -> raw text -> parse() under the agent's retry budget.
+    Transport and rate-limit errors back off; parse failures are repaired locally first
+    and only then cost a new call. Outputs aborted mid-stream retry at once, and their
+    valid items go to on_partial(), which returns a finished result or None to retry.
+    With a model cascade (see model_cascade), the first attempts go to the small model;
+    its answer is kept only if it parses and check(result) finds no issue (returns None).
+    Fails loudly when the budget is spent.
+    """
+    policy = policy or get_retry_policy(agent)
+    tiers = attempt_tiers(agent, policy.max_attempts)
+    last_exception: Optional[Exception] = None
+
+    for attempt, tier in enumerate(tiers):
+        try:
+            _announce(agent, attempt, tiers)
+            # Retries skip the response cache so a bad cached answer is not replayed
+            with cache_bypass(attempt > 0 and tiers[attempt - 1] == tier), model_tier(tier):
+                # A hedged duplicate only wins with a result that parses
+                result = hedged_call(agent, lambda: parse_with_repair(agent, call(), parse))
+        except Exception as e:
+            last_exception = e
+            if tier == SMALL:
+                _small_model_failed(agent, attempt, e)
+                delay = 0.0
+            else:
+                delay = _handle_failure(agent, policy, attempt, e)
+            salvaged = _salvage(agent, e, on_partial)
+            if salvaged is not None:
+                return salvaged
+            if delay and attempt < len(tiers) - 1:
+                time.sleep(delay)
+            continue
+        if tier != SMALL or _trusted(agent, result, check):
+            return result
+
+    # Fail loudly if all retries fail
+    raise RuntimeError(
+        f"Failed to generate {agent} after {len(tiers)} attempts. Last error: {last_exception}"
+    )
+
+
+async def _aparse(agent: str, call: Callable[[], Awaitable[str]], parse: Callable[[str], T]) -> T:
+    return parse_with_repair(agent, await call(), parse)
+
+
+async def arun_with_retries(
+    agent: str,
+    call: Callable[[], Awaitable[str]],
+    parse: Callable[[str], T],
+    policy: Optional[RetryPolicy] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], Optional[T]]] = None,
+    check: Optional[Callable[[T], Optional[str]]] = None
+) -> T:
+    """
+    Async version of run_with_retries.
+    """
+    policy = policy or get_retry_policy(agent)
+    tiers = attempt_tiers(agent, policy.max_attempts)
+    last_exception: Optional[Exception] = None
+
+    for attempt, tier in enumerate(tiers):
+        try:
+            _announce(agent, attempt, tiers)
+            with cache_bypass(attempt > 0 and tiers[attempt - 1] == tier), model_tier(tier):
+                result = await ahedged_call(agent, lambda: _aparse(agent, call, parse))
+        except Exception as e:
+            last_exception = e
+            if tier == SMALL:
+                _small_model_failed(agent, attempt, e)
+                delay = 0.0
+            else:
+                delay = _handle_failure(agent, policy, attempt, e)
+            salvaged = _salvage(agent, e, on_partial)
+            if salvaged is not None:
+                return salvaged
+            if delay and attempt < len(tiers) - 1:
+                await asyncio.sleep(delay)
+            continue
+        if tier != SMALL or _trusted(agent, result, check):
+            return result
+
+    # Fail loudly if all retries fail
+    raise RuntimeError(
+        f"Failed to generate {agent} after {len(tiers)} attempts. Last error: {last_exception}"
+    )
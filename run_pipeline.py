@@ -1,31 +1,177 @@
+import argparse
 import json
 import os
+import sys
 from dotenv import load_dotenv
-from orchestrator import run_pipeline
+from artifacts import JsonlSink
+from orchestrator import stream_pipeline
 
 INPUT_FILE = "inputs/glowboost_input.json"
 OUTPUT_FILE = "output.json"
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the agentic content pipeline.")
+    parser.add_argument("--input", default=INPUT_FILE, help="Single product input file.")
+    parser.add_argument("--batch", help="Directory of *.json files or a JSONL file of product payloads.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max products in flight in batch mode.")
+    parser.add_argument("--output-dir", default=None, help="Where to write outputs.")
+    parser.add_argument("--parallel", action="store_true", help="Use the parallel fan-out graph.")
+    parser.add_argument("--incremental", action="store_true", help="Skip stages whose inputs are unchanged since the last run.")
+    parser.add_argument("--fused", action="store_true", help="Generate analysis, content and questions in one LLM call.")
+    parser.add_argument("--jsonl", help="Also append every artifact as one line to this JSONL file.")
+    parser.add_argument("--trace-file", help="Write a JSON trace of every run (enables instrumentation).")
+    parser.add_argument("--metrics-file", help="Write Prometheus text-format metrics (enables instrumentation).")
+    parser.add_argument("--validate-only", action="store_true", help="Only parse and validate the input(s); no LLM calls.")
+    parser.add_argument("--rejects", help="JSONL file for invalid rows (batch default: <output-dir>/rejects.jsonl).")
+    parser.add_argument("--workers", type=int, default=0, help="Run the batch on this many worker processes through a durable job queue (render processes with --render-catalog).")
+    parser.add_argument("--queue", default=".llm_cache/jobs.sqlite", help="Job queue file for --workers; rerun with the same file to resume.")
+    parser.add_argument("--lease", type=float, default=120.0, help="Seconds before a silent worker's product is reclaimed (--workers).")
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue products that failed in an earlier --workers run.")
+    parser.add_argument("--render", help="Also render pages in these formats, comma-separated: html,md,json.")
+    parser.add_argument("--render-catalog", metavar="DIR", help="Only re-render pages of a batch output directory from its pages.json files; no LLM calls.")
+    return parser.parse_args()
+
+def print_progress(event):
+    if event["event"] == "node_finished":
+        saved = f" -> saved {', '.join(event['artifacts'])}" if event["artifacts"] else ""
+        cached = " (cached)" if event["cached"] else ""
+        print(f"[{event['product_id']}] {event['node']} finished at {event['elapsed']:.2f}s{cached}{saved}")
+    elif event["event"] == "run_failed":
+        print(f"[{event['product_id']}] failed at {event['elapsed']:.2f}s: {event['error']}")
+
+def render_formats(args):
+    from page_renderer import check_formats
+
+    return check_formats([fmt.strip() for fmt in args.render.split(",") if fmt.strip()]) if args.render else ()
+
+def render_catalog_mode(args):
+    # Republishing reads saved pages.json files only, so the graphs are never imported
+    from page_renderer import FORMATS, render_catalog
+
+    formats = render_formats(args) or FORMATS
+    print(f"Rendering {', '.join(formats)} pages from {args.render_catalog}...")
+    totals = render_catalog(args.render_catalog, output_dir=args.output_dir, formats=formats, workers=args.workers or None)
+    print(f"Render finished: {totals['products']} products, {totals['written']} files written, "
+          f"{totals['skipped']} unchanged.")
+
+def run_batch_mode(args):
+    from batch_runner import run_batch
+
+    output_dir = args.output_dir or "outputs/batch"
+    if args.workers:
+        return run_workers_mode(args, output_dir)
+    summary = run_batch(
+        args.batch,
+        output_dir=output_dir,
+        max_concurrency=args.concurrency,
+        parallel=args.parallel,
+        incremental=args.incremental,
+        fused=args.fused,
+        jsonl_path=args.jsonl,
+        on_progress=print_progress,
+        reject_path=args.rejects,
+        render_formats=render_formats(args),
+    )
+    print(f"Batch finished: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['rejected']} rejected. "
+          f"Summary saved to '{output_dir}/batch_summary.json'.")
+
+def run_workers_mode(args, output_dir):
+    from worker_pool import run_workers
+
+    summary = run_workers(
+        args.batch,
+        output_dir=output_dir,
+        workers=args.workers,
+        queue_path=args.queue,
+        parallel=args.parallel,
+        fused=args.fused,
+        lease_seconds=args.lease,
+        reject_path=args.rejects,
+        retry_failed=args.retry_failed,
+        render_formats=render_formats(args),
+    )
+    unfinished = f", {summary['unfinished']} unfinished" if summary["unfinished"] else ""
+    print(f"Batch finished: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['rejected']} rejected{unfinished}. "
+          f"Summary saved to '{output_dir}/batch_summary.json'.")
+
+def validate_mode(args):
+    # Fast path: streamed schema validation only, so LangChain and the graphs are never imported
+    from input_stream import CatalogValidator
+
+    with CatalogValidator(args.rejects) as validator:
+        for _ in validator.stream(args.batch or args.input):
+            pass
+
+    saved = f" Rejects saved to '{args.rejects}'." if args.rejects and validator.rejected else ""
+    print(f"Validation finished: {validator.valid} valid, {validator.rejected} rejected.{saved}")
+    return validator.rejected == 0
+
+def write_instrumentation(args):
+    from instrumentation import write_trace_file, write_prometheus_file
+
+    if args.trace_file:
+        write_trace_file(args.trace_file)
+        print(f"Trace saved to '{args.trace_file}'.")
+    if args.metrics_file:
+        write_prometheus_file(args.metrics_file)
+        print(f"Metrics saved to '{args.metrics_file}'.")
+
 def main():
     load_dotenv()
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: Input file '{INPUT_FILE}' not found.")
+    args = parse_args()
+
+    if args.render_catalog:
+        render_catalog_mode(args)
+        return
+
+    if args.validate_only:
+        if not validate_mode(args):
+            sys.exit(1)
+        return
+
+    if args.trace_file or args.metrics_file:
+        from instrumentation import enable_instrumentation
+        enable_instrumentation()
+
+    if args.batch:
+        run_batch_mode(args)
+        write_instrumentation(args)
+        return
+
+    input_file = args.input
+    output_dir = args.output_dir or "outputs"
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' not found.")
         return
 
     try:
-        with open(INPUT_FILE, "r") as f:
+        with open(input_file, "r") as f:
             raw_input = json.load(f)
-        
-        print(f"Loaded input from {INPUT_FILE}")
-        
-        result = run_pipeline(raw_input)
-        
-        # Use the new save_outputs function
-        from orchestrator import save_outputs
-        save_outputs(result, output_dir="outputs")
-            
-        print(f"Pipeline executed successfully. Outputs saved to 'outputs/' directory.")
-        
+
+        print(f"Loaded input from {input_file}")
+
+        # Artifacts are saved as each stage finishes, so a crash keeps the completed ones
+        sink = JsonlSink(args.jsonl) if args.jsonl else None
+        try:
+            stream_pipeline(
+                raw_input,
+                output_dir=output_dir,
+                parallel=args.parallel,
+                incremental=args.incremental,
+                fused=args.fused,
+                sink=sink,
+                on_progress=print_progress,
+                render_formats=render_formats(args),
+            )
+        finally:
+            if sink is not None:
+                sink.close()
+
+        print(f"Pipeline executed successfully. Outputs saved to '{output_dir}/' directory.")
+        write_instrumentation(args)
+
     except Exception as e:
         print(f"An error occurred: {e}")
 
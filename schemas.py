@@ -1,5 +1,7 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator
+
+QA_CATEGORIES = ("Informational", "Usage", "Safety", "Purchase", "Comparison")
 
 class ProductSchema(BaseModel):
     name: str
@@ -19,7 +21,7 @@ class CompetitorSchema(BaseModel):
 
 class ParsedInputSchema(BaseModel):
     product: ProductSchema
-    competitors: List[CompetitorSchema]
+    competitors: List[CompetitorSchema] = Field(default_factory=list) # Optional in raw input
 
 class AnalysisSchema(BaseModel):
     key_questions: List[str]
@@ -34,7 +36,17 @@ class ContentSchema(BaseModel):
 class QAPair(BaseModel):
     question: str
     answer: str
-    category: str
+    category: Literal["Informational", "Usage", "Safety", "Purchase", "Comparison"]
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _normalize_category(cls, value):
+        # Models sometimes vary the case ("usage", "SAFETY")
+        if isinstance(value, str):
+            for category in QA_CATEGORIES:
+                if value.strip().lower() == category.lower():
+                    return category
+        return value
 
 class QuestionOutputSchema(BaseModel):
     qa_pairs: List[QAPair]
@@ -50,6 +62,19 @@ class ComparisonSchema(BaseModel):
     benefit_comparison: str
     verdicts: List[SkinTypeVerdict]
 
+class ComparisonListSchema(BaseModel):
+    # One comparison per competitor, in the order of ParsedInputSchema.competitors
+    comparisons: List[ComparisonSchema]
+
+class EvaluationSchema(BaseModel):
+    status: Literal["PASS", "FAIL"]
+    reason: str
+
+class FusedGenerationSchema(BaseModel):
+    analysis: AnalysisSchema
+    content: ContentSchema
+    questions: QuestionOutputSchema
+
 class FinalOutputSchema(BaseModel):
     product_overview: dict
     key_insights: List[str]
@@ -0,0 +1,450 @@
+from typing import Dict, Any, List, Optional, Sequence, Set, Tuple
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from pydantic import BaseModel
+from instrumentation import instrumentation_enabled, metrics
+
+# Near-duplicate reuse. Catalogs carry many shade and size variants that differ only in
+# name, price or one ingredient. Every finished product is added to a local MinHash index
+# over its ingredients, benefits, skin types and description shingles. A new product whose
+# nearest indexed neighbour is similar enough starts from that neighbour's Q&A pairs and
+# content blocks: the name is substituted, items that mention any other field that changed
+# are dropped, and only those are regenerated (see the orchestrator's questions and content nodes).
+
+DEFAULT_INDEX_PATH = ".llm_cache/similarity.sqlite"
+
+SECTIONS = ("questions", "content")
+
+# 64 permutations in 16 bands of 4 rows: a pair at 0.7 Jaccard shares a band 99% of the time
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 3
+_PRIME = (1 << 61) - 1
+_seeded = random.Random(1)
+_PERMUTATIONS = [(_seeded.randrange(1, _PRIME), _seeded.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# The product fields each section is written from (see the agents' declared prompt fields);
+# a change to any other field cannot make its items stale
+SECTION_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "questions": ("name", "description", "ingredients", "benefits", "usage", "skin_type", "price", "side_effects"),
+    "content": ("name", "description", "ingredients", "benefits", "usage", "skin_type", "price"),
+}
+# Free-text fields: the words a change removed are what stale items would still mention
+_PROSE_FIELDS = ("description", "usage")
+
+
+class ReusePolicy(BaseModel):
+    enabled: bool = False
+    # Minimum Jaccard similarity of the product features for a neighbour to be reused
+    threshold: float = 0.7
+
+
+REUSE_POLICIES: Dict[str, ReusePolicy] = {}
+
+
+def _env_policy(section: str) -> ReusePolicy:
+    sections = {name.strip() for name in os.getenv("SIMILARITY_REUSE", "").split(",") if name.strip()}
+    if "all" not in sections and section not in sections:
+        return ReusePolicy()
+    overrides: Dict[str, Any] = {"enabled": True}
+    if os.getenv("SIMILARITY_THRESHOLD"):
+        overrides["threshold"] = float(os.environ["SIMILARITY_THRESHOLD"])
+    return ReusePolicy(**overrides)
+
+
+def get_reuse_policy(section: str) -> ReusePolicy:
+    return REUSE_POLICIES.get(section) or _env_policy(section)
+
+
+def set_reuse_policy(section: str, policy: Optional[ReusePolicy]) -> None:
+    """
+    Sets a section's reuse policy; None goes back to the environment's.
+    """
+    if policy is None:
+        REUSE_POLICIES.pop(section, None)
+    else:
+        REUSE_POLICIES[section] = policy
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(text).lower()).strip()
+
+
+def _without_name(text: str, name: str) -> str:
+    # Descriptions usually repeat the product name, which differs between variants
+    return re.sub(re.escape(name), " ", text, flags=re.IGNORECASE) if name else text
+
+
+def product_features(parsed_input: Dict[str, Any]) -> Set[str]:
+    """
+    The feature set products are compared on: ingredients, benefits, skin types and
+    word shingles of the description (without the product name). Name and price are
+    left out, since they are what variants differ in.
+    """
+    product = parsed_input["product"]
+    features = set()
+    for field in ("ingredients", "benefits", "skin_type"):
+        features.update(f"{field}:{_normalize(value)}" for value in product.get(field) or [])
+    words = _normalize(_without_name(product.get("description", ""), product.get("name", ""))).split()
+    for start in range(max(1, len(words) - SHINGLE + 1) if words else 0):
+        features.add("description:" + " ".join(words[start:start + SHINGLE]))
+    return features
+
+
+def minhash(features: Set[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") for feature in features]
+    if not hashes:
+        return [_PRIME] * NUM_PERM
+    return [min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def _buckets(signature: List[int]) -> List[str]:
+    rows = NUM_PERM // BANDS
+    return [
+        hashlib.blake2b(json.dumps(signature[band * rows:(band + 1) * rows]).encode("utf-8"), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    union = a | b
+    return len(a & b) / len(union) if union else 0.0
+
+
+def product_key(parsed_input: Dict[str, Any]) -> str:
+    payload = json.dumps(parsed_input, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Neighbour:
+    """
+    An indexed product similar to the one being generated, with its stored sections.
+    """
+
+    def __init__(self, key: str, similarity: float, parsed_input: Dict[str, Any], sections: Dict[str, Any]):
+        self.key = key
+        self.similarity = similarity
+        self.parsed_input = parsed_input
+        self.sections = sections
+
+
+class SimilarityIndex:
+    """
+    Local MinHash/LSH index of finished products and their generated sections (SQLite).
+    Candidates share at least one band of their signature; the nearest one is picked on
+    the exact Jaccard similarity of the stored feature sets.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS products (
+                key TEXT PRIMARY KEY,
+                parsed_input TEXT NOT NULL,
+                features TEXT NOT NULL,
+                sections TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, key)
+            )"""
+        )
+        self._conn.commit()
+
+    def add(self, parsed_input: Dict[str, Any], sections: Dict[str, Any]) -> None:
+        """
+        Indexes a product with its generated sections, merged into any stored for it before.
+        """
+        key = product_key(parsed_input)
+        features = product_features(parsed_input)
+        buckets = _buckets(minhash(features))
+        with self._lock:
+            row = self._conn.execute("SELECT sections FROM products WHERE key = ?", (key,)).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **sections}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO products (key, parsed_input, features, sections, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(parsed_input), json.dumps(sorted(features)), json.dumps(merged), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO bands (band, bucket, key) VALUES (?, ?, ?)",
+                [(band, bucket, key) for band, bucket in enumerate(buckets)],
+            )
+            self._conn.commit()
+
+    def nearest(self, parsed_input: Dict[str, Any], section: str, threshold: float) -> Optional[Neighbour]:
+        """
+        Returns the most similar indexed product that has `section`, if it reaches `threshold`.
+        """
+        features = product_features(parsed_input)
+        buckets = _buckets(minhash(features))
+        best: Optional[Neighbour] = None
+        with self._lock:
+            candidates = set()
+            for band, bucket in enumerate(buckets):
+                rows = self._conn.execute("SELECT key FROM bands WHERE band = ? AND bucket = ?", (band, bucket)).fetchall()
+                candidates.update(row[0] for row in rows)
+            for key in candidates:
+                row = self._conn.execute(
+                    "SELECT parsed_input, features, sections FROM products WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                sections = json.loads(row[2])
+                if section not in sections:
+                    continue
+                similarity = jaccard(features, set(json.loads(row[1])))
+                if similarity >= threshold and (best is None or similarity > best.similarity):
+                    best = Neighbour(key, similarity, json.loads(row[0]), sections)
+        return best
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+            self._conn.execute("DELETE FROM bands")
+            self._conn.commit()
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """
+    Returns the process-wide similarity index (path from SIMILARITY_INDEX_PATH).
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex(os.getenv("SIMILARITY_INDEX_PATH", DEFAULT_INDEX_PATH))
+        return _index
+
+
+class _Change:
+    """
+    One changed field: an item is stale if it mentions one of `terms`, at least two of
+    `listed` (it enumerates a list that has since grown), or has one of `categories`.
+    """
+
+    def __init__(self, field: str, terms: Sequence[str] = (), listed: Sequence[str] = (), categories: Sequence[str] = ()):
+        self.field = field
+        self.terms = [f" {_normalize(term)} " for term in terms if _normalize(term)]
+        self.listed = [f" {_normalize(term)} " for term in listed if _normalize(term)]
+        self.categories = set(categories)
+
+    def makes_stale(self, text: str, category: Optional[str] = None) -> bool:
+        padded = f" {_normalize(text)} "
+        if category in self.categories or any(term in padded for term in self.terms):
+            return True
+        return sum(term in padded for term in self.listed) >= 2
+
+
+def _element_terms(value: str) -> List[str]:
+    # "Vitamin C (Ascorbic Acid)" may be mentioned by either name
+    match = re.match(r"\s*(.*?)\s*\((.*)\)\s*$", value)
+    return [value, match.group(1), match.group(2)] if match else [value]
+
+
+def _removed_words(old: str, new: str) -> List[str]:
+    # Short words are only kept if they carry a digit ("02", "5ml"), so "a" or "of" never count
+    kept = set(_normalize(new).split())
+    return [word for word in _normalize(old).split() if word not in kept and (len(word) >= 3 or any(ch.isdigit() for ch in word))]
+
+
+def _competitor_view(parsed_input: Dict[str, Any]) -> List[Tuple[str, List[str], str]]:
+    return [(c.get("name"), c.get("ingredients"), c.get("price")) for c in parsed_input.get("competitors") or []]
+
+
+def changed_fields(old_input: Dict[str, Any], new_input: Dict[str, Any], section: str) -> List[_Change]:
+    """
+    What changed between a neighbour and the new product, for the fields `section` reads.
+    The name is not included: it is substituted in place.
+    """
+    old, new = old_input["product"], new_input["product"]
+    old_name, new_name = old.get("name", ""), new.get("name", "")
+    changes: List[_Change] = []
+    for field in SECTION_FIELDS[section]:
+        before, after = old.get(field), new.get(field)
+        if field == "name" or before == after:
+            continue
+        if isinstance(before, list):
+            after = after or []
+            removed = [term for value in before if value not in after for term in _element_terms(value)]
+            grew = any(value not in before for value in after)
+            changes.append(_Change(field, terms=removed, listed=before if grew else ()))
+        elif field in _PROSE_FIELDS:
+            changes.append(_Change(field, terms=_removed_words(_without_name(before or "", old_name), _without_name(after or "", new_name))))
+        else:
+            changes.append(_Change(field, terms=[before or ""]))
+    # Only Q&A reads competitor data (for comparison questions)
+    if section == "questions" and _competitor_view(old_input) != _competitor_view(new_input):
+        old_competitors = old_input.get("competitors") or []
+        changes.append(_Change(
+            "competitors",
+            terms=[c.get("name", "") for c in old_competitors],
+            categories=("Comparison",),
+        ))
+    return changes
+
+
+def _rename(text: str, old_name: str, new_name: str) -> str:
+    if not old_name or old_name == new_name:
+        return text
+    return re.sub(re.escape(old_name), lambda match: new_name, text)
+
+
+def _is_stale(text: str, name: str, changes: List[_Change], category: Optional[str] = None) -> bool:
+    # Mentions of the product's own name never count ("Vitamin C Serum" vs a removed "Vitamin C")
+    text = _without_name(text, name)
+    return any(change.makes_stale(text, category) for change in changes)
+
+
+def adapt_qa_pairs(neighbour: Neighbour, parsed_input: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    The neighbour's Q&A pairs that still hold for the new product (renamed), and how many were dropped.
+    """
+    old_name = neighbour.parsed_input["product"].get("name", "")
+    new_name = parsed_input["product"].get("name", "")
+    changes = changed_fields(neighbour.parsed_input, parsed_input, "questions")
+    kept = []
+    pairs = neighbour.sections["questions"].get("qa_pairs", [])
+    for pair in pairs:
+        pair = {**pair, "question": _rename(pair["question"], old_name, new_name), "answer": _rename(pair["answer"], old_name, new_name)}
+        if not _is_stale(f"{pair['question']} {pair['answer']}", new_name, changes, pair.get("category")):
+            kept.append(pair)
+    return kept, len(pairs) - len(kept)
+
+
+def adapt_content(neighbour: Neighbour, parsed_input: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    The neighbour's content blocks (renamed) if none of them mentions a changed field,
+    else None; plus the number of stale blocks. Content is generated in one call, so a
+    single stale block regenerates all of them.
+    """
+    old_name = neighbour.parsed_input["product"].get("name", "")
+    new_name = parsed_input["product"].get("name", "")
+    changes = changed_fields(neighbour.parsed_input, parsed_input, "content")
+    content = neighbour.sections["content"]
+    adapted = {
+        "headline": _rename(content["headline"], old_name, new_name),
+        "value_proposition": [_rename(item, old_name, new_name) for item in content["value_proposition"]],
+        "feature_highlights": [_rename(item, old_name, new_name) for item in content["feature_highlights"]],
+    }
+    blocks = [adapted["headline"]] + adapted["value_proposition"] + adapted["feature_highlights"]
+    stale = sum(_is_stale(block, new_name, changes) for block in blocks)
+    return (None if stale else adapted), stale
+
+
+class ReuseStats:
+    """
+    Thread-safe per-section counts of index lookups, neighbours found, and items reused or regenerated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, section: str, hit: bool, reused: int = 0, regenerated: int = 0) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(section, {"lookups": 0, "hits": 0, "reused": 0, "regenerated": 0})
+            counts["lookups"] += 1
+            counts["hits"] += int(hit)
+            counts["reused"] += reused
+            counts["regenerated"] += regenerated
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                section: {**counts, "hit_rate": round(counts["hits"] / counts["lookups"], 4) if counts["lookups"] else 0.0}
+                for section, counts in self._counts.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+reuse_stats = ReuseStats()
+
+
+def _record(section: str, neighbour: Optional[Neighbour], reused: int = 0, regenerated: int = 0) -> None:
+    reuse_stats.record(section, neighbour is not None, reused, regenerated)
+    if neighbour is not None:
+        print(f"Reusing {section} of a similar product ({neighbour.similarity:.2f}): "
+              f"{reused} items kept, {regenerated} to regenerate.")
+    if instrumentation_enabled():
+        metrics.inc("pipeline_similarity_lookups_total", section=section, outcome="hit" if neighbour else "miss")
+        if reused:
+            metrics.inc("pipeline_similarity_items_total", reused, section=section, outcome="reused")
+        if regenerated:
+            metrics.inc("pipeline_similarity_items_total", regenerated, section=section, outcome="regenerated")
+
+
+def _neighbour(parsed_input: Dict[str, Any], section: str) -> Optional[Neighbour]:
+    return get_similarity_index().nearest(parsed_input, section, get_reuse_policy(section).threshold)
+
+
+def reusable_questions(parsed_input: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Q&A pairs carried over from the nearest similar product ([] when reuse is off or
+    nothing is similar enough). The questions agent tops them up to the full set.
+    """
+    if not get_reuse_policy("questions").enabled:
+        return []
+    neighbour = _neighbour(parsed_input, "questions")
+    if neighbour is None:
+        _record("questions", None)
+        return []
+    pairs, dropped = adapt_qa_pairs(neighbour, parsed_input)
+    _record("questions", neighbour, reused=len(pairs), regenerated=dropped)
+    return pairs
+
+
+def reusable_content(parsed_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Content blocks carried over from the nearest similar product, or None to generate them.
+    """
+    if not get_reuse_policy("content").enabled:
+        return None
+    neighbour = _neighbour(parsed_input, "content")
+    if neighbour is None:
+        _record("content", None)
+        return None
+    content, _ = adapt_content(neighbour, parsed_input)
+    stored = neighbour.sections["content"]
+    blocks = 1 + len(stored["value_proposition"]) + len(stored["feature_highlights"])
+    if content is None:
+        _record("content", neighbour, regenerated=blocks)
+    else:
+        _record("content", neighbour, reused=blocks)
+    return content
+
+
+def remember(parsed_input: Dict[str, Any], **sections: Optional[Dict[str, Any]]) -> None:
+    """
+    Adds a finished product's sections to the index, if reuse is on for any of them.
+    """
+    kept = {name: value for name, value in sections.items() if value is not None and get_reuse_policy(name).enabled}
+    if kept:
+        get_similarity_index().add(parsed_input, kept)
@@ -0,0 +1,133 @@
+from typing import Dict, Any, Optional, List, Mapping, Sequence, Callable, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from langgraph.cache.base import BaseCache, FullKey, Namespace
+from langgraph.types import CachePolicy
+from prompting import resolve_path
+
+DEFAULT_STAGE_CACHE_PATH = ".llm_cache/stages.sqlite"
+
+
+def project_state(state: Mapping[str, Any], paths: List[str]) -> Dict[str, Any]:
+    """
+    Picks the declared parts of the graph state. Paths are dotted, list items are
+    addressed by index ("parsed_input.competitors.0") and other keys map over lists
+    ("parsed_input.competitors.name"). Missing parts project to None so that adding
+    them later changes the key.
+    """
+    return {path: resolve_path(state, path) for path in paths}
+
+
+def stage_policy(paths: List[str], salt: Callable[[], str] = lambda: "") -> CachePolicy:
+    """
+    Builds a LangGraph node cache policy keyed on a hash of exactly the declared inputs.
+    `salt` adds anything outside the state the result depends on (e.g. the model name).
+    """
+    def key_func(state: Mapping[str, Any]) -> str:
+        payload = json.dumps(
+            {"inputs": project_state(state, paths), "salt": salt()},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    return CachePolicy(key_func=key_func)
+
+
+class SQLiteStageCache(BaseCache):
+    """
+    Local store for LangGraph node results, so stage outputs survive across runs.
+    """
+
+    def __init__(self, path: str = DEFAULT_STAGE_CACHE_PATH):
+        super().__init__()
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS stages (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                encoding TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, keys: Sequence[FullKey]) -> Dict[FullKey, Any]:
+        values: Dict[FullKey, Any] = {}
+        now = time.time()
+        with self._lock:
+            for namespace, key in keys:
+                row = self._conn.execute(
+                    "SELECT encoding, value, expires_at FROM stages WHERE namespace = ? AND key = ?",
+                    ("/".join(namespace), key),
+                ).fetchone()
+                if row is None or (row[2] is not None and row[2] <= now):
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                values[(namespace, key)] = self.serde.loads_typed((row[0], row[1]))
+        return values
+
+    async def aget(self, keys: Sequence[FullKey]) -> Dict[FullKey, Any]:
+        return self.get(keys)
+
+    def set(self, pairs: Mapping[FullKey, Tuple[Any, Optional[int]]]) -> None:
+        now = time.time()
+        with self._lock:
+            for (namespace, key), (value, ttl) in pairs.items():
+                encoding, data = self.serde.dumps_typed(value)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO stages (namespace, key, encoding, value, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    ("/".join(namespace), key, encoding, data, now + ttl if ttl is not None else None),
+                )
+            self._conn.commit()
+
+    async def aset(self, pairs: Mapping[FullKey, Tuple[Any, Optional[int]]]) -> None:
+        self.set(pairs)
+
+    def clear(self, namespaces: Optional[Sequence[Namespace]] = None) -> None:
+        with self._lock:
+            if namespaces is None:
+                self._conn.execute("DELETE FROM stages")
+            else:
+                for namespace in namespaces:
+                    self._conn.execute("DELETE FROM stages WHERE namespace = ?", ("/".join(namespace),))
+            self._conn.commit()
+
+    async def aclear(self, namespaces: Optional[Sequence[Namespace]] = None) -> None:
+        self.clear(namespaces)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_stage_cache: Optional[SQLiteStageCache] = None
+_stage_cache_lock = threading.Lock()
+
+
+def get_stage_cache() -> SQLiteStageCache:
+    """
+    Returns the process-wide stage store (path from STAGE_CACHE_PATH).
+    """
+    global _stage_cache
+    with _stage_cache_lock:
+        if _stage_cache is None:
+            _stage_cache = SQLiteStageCache(os.getenv("STAGE_CACHE_PATH", DEFAULT_STAGE_CACHE_PATH))
+        return _stage_cache
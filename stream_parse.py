@@ -0,0 +1,310 @@
+from typing import Dict, Any, List, Optional, Set, Union, Literal, get_args, get_origin
+import contextlib
+import contextvars
+import json
+import os
+import types
+from pydantic import BaseModel
+
+# Agents stream their completions through a StreamValidator (see llm_client.ScheduledChatModel):
+# the JSON is checked against the target schema as tokens arrive, and the call is aborted
+# as soon as the output is clearly invalid, instead of after the full generation. The
+# checks are deliberately lenient about syntax (code fences, trailing commas and
+# truncation are left to the repair step in retries) and strict about the schema.
+
+_rules: contextvars.ContextVar[Optional["StreamRules"]] = contextvars.ContextVar("stream_rules", default=None)
+
+
+class StreamAbortError(ValueError):
+    """
+    Raised mid-stream when the output breaks the schema. `partial` holds the complete,
+    well-formed items of the top-level arrays received so far (e.g. the Q&A pairs before
+    the bad one), so the retry logic can keep them.
+    """
+
+    def __init__(self, message: str, partial: Optional[Dict[str, List[Any]]] = None, text: str = ""):
+        super().__init__(message)
+        self.partial = partial or {}
+        self.text = text
+
+
+class FieldRule:
+    """
+    What one JSON value must look like: its kind, and for objects their keys.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        fields: Optional[Dict[str, "FieldRule"]] = None,
+        required: Optional[Set[str]] = None,
+        item: Optional["FieldRule"] = None,
+        choices: Optional[Set[str]] = None,
+        nullable: bool = False
+    ):
+        self.kind = kind
+        self.fields = fields
+        self.required = required or set()
+        self.item = item
+        self.choices = choices
+        self.nullable = nullable
+
+
+ANY = FieldRule("any")
+_VALUE_STARTS = frozenset('{["-0123456789tfn')
+
+
+def _rule_for(annotation: Any) -> FieldRule:
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union or origin is getattr(types, "UnionType", None):
+        options = [arg for arg in args if arg is not type(None)]
+        if len(options) != 1:
+            return ANY
+        rule = _rule_for(options[0])
+        rule.nullable = True
+        return rule
+    if origin is Literal:
+        # Compared like the schemas' normalizers do, ignoring case and surrounding spaces
+        return FieldRule("string", choices={str(arg).lower() for arg in args})
+    if origin in (list, List):
+        return FieldRule("array", item=_rule_for(args[0]) if args else ANY)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        fields = {(info.alias or name): _rule_for(info.annotation) for name, info in annotation.model_fields.items()}
+        required = {(info.alias or name) for name, info in annotation.model_fields.items() if info.is_required()}
+        return FieldRule("object", fields=fields, required=required)
+    if annotation is str:
+        return FieldRule("string")
+    if annotation in (int, float):
+        return FieldRule("number")
+    if annotation is bool:
+        return FieldRule("boolean")
+    return ANY
+
+
+class StreamRules:
+    """
+    Schema checks for one agent's output, derived from its pydantic model.
+    `min_items` adds deterministic count checks by dotted path (e.g. {"qa_pairs": 15}):
+    an array that closes with fewer items aborts the call.
+    """
+
+    def __init__(self, model: type, min_items: Optional[Dict[str, int]] = None):
+        self.model = model
+        self.root = _rule_for(model)
+        self.min_items = dict(min_items or {})
+
+    def with_min_items(self, **min_items: int) -> "StreamRules":
+        return StreamRules(self.model, {**self.min_items, **min_items})
+
+
+class _Frame:
+    __slots__ = ("rule", "path", "is_object", "key", "keys_seen", "count", "item_start", "collect", "expect_key", "awaiting")
+
+    def __init__(self, rule: FieldRule, path: str, is_object: bool, collect: bool = False):
+        self.rule = rule
+        self.path = path
+        self.is_object = is_object
+        self.key: Optional[str] = None
+        self.keys_seen: Set[str] = set()
+        self.count = 0
+        self.item_start = -1
+        # Items of arrays directly under the root are kept for the partial result
+        self.collect = collect
+        # Objects alternate key -> value; arrays await a value after "[" and each ","
+        self.expect_key = is_object
+        self.awaiting = not is_object
+
+
+class StreamValidator:
+    """
+    Incremental checker for one streamed completion. feed() takes text chunks and
+    raises StreamAbortError at the first schema violation: an unexpected key, a value
+    of the wrong kind, a string outside its allowed values, an object closed without
+    its required keys, or an array closed with too few items.
+    """
+
+    def __init__(self, rules: StreamRules):
+        self.rules = rules
+        self.text = ""
+        self.done = False
+        self._started = False
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._string_rule: Optional[FieldRule] = None
+        self._items: Dict[str, List[str]] = {}
+
+    def _abort(self, reason: str) -> None:
+        partial: Dict[str, List[Any]] = {}
+        for key, spans in self._items.items():
+            values = []
+            for span in spans:
+                try:
+                    values.append(json.loads(span))
+                except ValueError:
+                    break
+            partial[key] = values
+        raise StreamAbortError(f"Output aborted mid-stream: {reason}", partial=partial, text=self.text)
+
+    def _value_rule(self) -> FieldRule:
+        frame = self._stack[-1]
+        if frame.is_object:
+            fields = frame.rule.fields
+            return fields.get(frame.key, ANY) if fields is not None else ANY
+        return frame.rule.item or ANY
+
+    def _child_path(self) -> str:
+        frame = self._stack[-1]
+        if not frame.is_object:
+            return frame.path
+        return f"{frame.path}.{frame.key}" if frame.path else frame.key or ""
+
+    def _start_value(self, ch: str, position: int) -> None:
+        rule = self._value_rule() if self._stack else self.rules.root
+        path = self._child_path() if self._stack else ""
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None:
+            parent.awaiting = False
+            if not parent.is_object:
+                parent.count += 1
+                parent.item_start = position
+
+        kinds = {"{": "object", "[": "array", '"': "string", "t": "boolean", "f": "boolean"}
+        kind = kinds.get(ch, "null" if ch == "n" else "number")
+        if rule.kind != "any" and kind != rule.kind and not (kind == "null" and rule.nullable):
+            self._abort(f"'{path or 'output'}' should be {rule.kind}, got {kind}")
+
+        if ch == "{":
+            self._stack.append(_Frame(rule, path, True))
+        elif ch == "[":
+            collect = len(self._stack) == 1
+            frame = _Frame(rule, path, False, collect=collect)
+            self._stack.append(frame)
+            if collect:
+                self._items[path] = []
+        elif ch == '"':
+            self._begin_string(position, is_key=False, rule=rule)
+
+    def _begin_string(self, position: int, is_key: bool, rule: Optional[FieldRule] = None) -> None:
+        self._in_string = True
+        self._escaped = False
+        self._string_start = position
+        self._string_is_key = is_key
+        self._string_rule = rule
+
+    def _end_string(self, position: int) -> None:
+        self._in_string = False
+        raw = self.text[self._string_start + 1:position]
+        frame = self._stack[-1]
+        if self._string_is_key:
+            key = json.loads(f'"{raw}"') if "\\" in raw else raw
+            if frame.rule.fields is not None and key not in frame.rule.fields:
+                self._abort(f"unexpected key '{key}' in '{frame.path or 'output'}'")
+            frame.key = key
+            frame.keys_seen.add(key)
+            frame.expect_key = False
+            frame.awaiting = True
+            return
+        rule = self._string_rule
+        if rule is not None and rule.choices is not None and raw.strip().lower() not in rule.choices:
+            self._abort(f"'{self._child_path()}' has invalid value '{raw}'")
+        self._item_finished(position)
+
+    def _item_finished(self, position: int) -> None:
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and not frame.is_object and frame.collect:
+            self._items[frame.path].append(self.text[frame.item_start:position + 1])
+
+    def _close(self, ch: str, position: int) -> None:
+        if not self._stack:
+            return
+        frame = self._stack.pop()
+        if frame.is_object and ch == "}":
+            missing = frame.rule.required - frame.keys_seen
+            if missing:
+                self._abort(f"'{frame.path or 'output'}' is missing {', '.join(sorted(missing))}")
+        elif not frame.is_object and ch == "]":
+            expected = self.rules.min_items.get(frame.path)
+            if expected is not None and frame.count < expected:
+                self._abort(f"'{frame.path}' closed with {frame.count} items, expected {expected}")
+        if not self._stack:
+            self.done = True
+            return
+        self._item_finished(position)
+
+    def feed(self, chunk: str) -> None:
+        if self.done or not chunk:
+            return
+        offset = len(self.text)
+        self.text += chunk
+        for index, ch in enumerate(chunk):
+            position = offset + index
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._end_string(position)
+                continue
+            if not self._started:
+                # Anything before the JSON (prose, a code fence) is left to the repair step
+                if ch != ("{" if self.rules.root.kind == "object" else "["):
+                    continue
+                self._started = True
+                self._start_value(ch, position)
+                continue
+            if ch in "}]":
+                self._close(ch, position)
+                if self.done:
+                    return
+                continue
+            frame = self._stack[-1]
+            if ch == ",":
+                if frame.is_object:
+                    frame.expect_key = True
+                else:
+                    frame.awaiting = True
+                continue
+            if frame.expect_key:
+                if ch == '"':
+                    self._begin_string(position, is_key=True)
+                continue
+            if frame.awaiting and ch in _VALUE_STARTS:
+                self._start_value(ch, position)
+            # Anything else is whitespace, a colon, or the rest of a number or literal
+
+
+@contextlib.contextmanager
+def validate_stream(rules: Optional[StreamRules]):
+    """
+    LLM calls made inside the block stream their output through a StreamValidator.
+    """
+    token = _rules.set(rules)
+    try:
+        yield
+    finally:
+        _rules.reset(token)
+
+
+def current_rules() -> Optional[StreamRules]:
+    return _rules.get() if stream_parsing_enabled() else None
+
+
+def stream_parsing_enabled() -> bool:
+    return os.getenv("LLM_STREAM_PARSE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def invoke_text(chain: Any, inputs: Dict[str, Any], rules: StreamRules) -> str:
+    """
+    chain.invoke(inputs).content, with the completion checked as it streams.
+    """
+    with validate_stream(rules):
+        return chain.invoke(inputs).content
+
+
+async def ainvoke_text(chain: Any, inputs: Dict[str, Any], rules: StreamRules) -> str:
+    with validate_stream(rules):
+        return (await chain.ainvoke(inputs)).content
@@ -0,0 +1,50 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    """
+    Keeps every test off the on-disk caches and the real provider, and drops the
+    process-wide clients, schedulers and hedge state it created.
+    """
+    from hedging import reset_hedging
+    from llm_client import reset_llm_clients, set_llm_factory
+    from rate_limits import reset_schedulers
+    from retries import retry_stats
+
+    monkeypatch.setenv("LLM_CACHE_DISABLED", "1")
+    monkeypatch.setenv("STAGE_CACHE_PATH", str(tmp_path / "stages.sqlite"))
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(tmp_path / "similarity.sqlite"))
+    monkeypatch.setenv("LLM_CASCADE_AGENTS", "")
+    for name in ("LLM_SCHEDULER_DISABLED", "LLM_STREAM_PARSE_DISABLED", "LLM_HEDGE_AGENTS", "LLM_RPM", "LLM_TPM", "LLM_BASE_URL"):
+        monkeypatch.delenv(name, raising=False)
+    yield
+    set_llm_factory(None)
+    reset_llm_clients()
+    reset_schedulers()
+    reset_hedging()
+    retry_stats.reset()
+
+
+@pytest.fixture
+def raw_input():
+    with open(ROOT / "inputs" / "glowboost_input.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    """
+    Retries without backoff sleeps.
+    """
+    import retries
+
+    for agent, policy in list(retries.RETRY_POLICIES.items()):
+        monkeypatch.setitem(retries.RETRY_POLICIES, agent, policy.model_copy(update={"base_delay": 0.0}))
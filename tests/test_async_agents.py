@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from fake_llm import fake_llm_factory
+from llm_client import set_llm_factory
+from retries import retry_stats
+
+
+@pytest.fixture
+def parsed_input(raw_input):
+    from parser_agent import parse_input
+
+    return parse_input(raw_input)
+
+
+def test_async_agents_match_sync_agents(parsed_input):
+    from analysis_agent import aanalyze_input, analyze_input
+    from question_agent import agenerate_questions, generate_questions
+
+    set_llm_factory(fake_llm_factory())
+
+    async def run_async():
+        return await asyncio.gather(aanalyze_input(parsed_input), agenerate_questions(parsed_input))
+
+    analysis, questions = asyncio.run(run_async())
+    assert analysis == analyze_input(parsed_input)
+    assert questions == generate_questions(parsed_input)
+    assert len(questions["qa_pairs"]) == 15
+
+
+def test_async_pipeline_matches_sync_pipeline(raw_input):
+    from orchestrator import arun_pipeline, run_pipeline
+
+    set_llm_factory(fake_llm_factory())
+
+    sync_state = run_pipeline(raw_input, parallel=True)
+    async_state = asyncio.run(arun_pipeline(raw_input, parallel=True))
+    for key in ("analysis", "content", "questions", "comparison", "pages"):
+        assert async_state[key] == sync_state[key]
+
+
+def test_async_agent_retries_transient_failures(parsed_input, fast_retries):
+    from analysis_agent import aanalyze_input
+
+    set_llm_factory(fake_llm_factory(failure_rate=0.5, seed=1))
+
+    analysis = asyncio.run(aanalyze_input(parsed_input))
+    assert analysis["key_questions"]
+    assert retry_stats.snapshot()["analysis"]["transport"] >= 1
+
+
+def test_async_agent_gives_up_after_its_budget(parsed_input, fast_retries):
+    from analysis_agent import aanalyze_input
+
+    set_llm_factory(fake_llm_factory(failure_rate=1.0))
+
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        asyncio.run(aanalyze_input(parsed_input))
+    assert retry_stats.snapshot()["analysis"] == {"transport": 3}
+
+
+def test_async_questions_top_up_after_an_aborted_stream(parsed_input, fast_retries):
+    from question_agent import agenerate_questions
+
+    # Every other call breaks the schema partway through; the valid pairs before the
+    # break are kept and only the missing ones are requested again
+    set_llm_factory(fake_llm_factory(off_rails_rate=0.5, seed=2))
+
+    questions = asyncio.run(agenerate_questions(parsed_input))
+    assert len(questions["qa_pairs"]) == 15
+    assert len({pair["question"] for pair in questions["qa_pairs"]}) == 15
+    assert retry_stats.snapshot()["questions"]["early_abort"] >= 1
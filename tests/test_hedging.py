@@ -0,0 +1,164 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from hedging import HedgePolicy, ahedged_call, hedge_stats, hedged_call, set_hedge_policy
+from model_cascade import model_tier
+
+# Hedge after 3 samples, at the slowest recorded latency but no sooner than 50ms
+POLICY = HedgePolicy(enabled=True, min_samples=3, min_delay=0.05, budget=1.0, max_burst=3.0)
+
+
+@pytest.fixture
+def hedge_policy():
+    def use(policy: HedgePolicy) -> None:
+        set_hedge_policy("analysis", policy)
+
+    yield use
+    set_hedge_policy("analysis", None)
+
+
+@pytest.fixture
+def hedged(hedge_policy):
+    hedge_policy(POLICY)
+
+
+def _warm_up():
+    for _ in range(POLICY.min_samples):
+        hedged_call("analysis", lambda: "fast")
+
+
+def _slow_then_fast(slow: float = 1.0):
+    calls = itertools.count()
+
+    def attempt() -> str:
+        if next(calls) == 0:
+            time.sleep(slow)
+            return "primary"
+        return "hedge"
+
+    return attempt
+
+
+def test_disabled_policy_just_calls_the_attempt():
+    assert hedged_call("analysis", lambda: "result") == "result"
+    assert hedge_stats() == {}
+
+
+def test_no_hedge_before_enough_samples(hedged):
+    assert hedged_call("analysis", _slow_then_fast(0.1)) == "primary"
+    assert hedge_stats()["analysis"]["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins(hedged):
+    _warm_up()
+    start = time.monotonic()
+
+    assert hedged_call("analysis", _slow_then_fast()) == "hedge"
+    assert time.monotonic() - start < 0.5
+    stats = hedge_stats()["analysis"]
+    assert stats["hedged"] == 1
+    assert stats["hedge_won"] == 1
+
+
+def test_hedges_stop_when_the_budget_is_spent(hedge_policy):
+    hedge_policy(POLICY.model_copy(update={"budget": 0.25, "max_burst": 1.0}))
+    _warm_up()
+
+    # The warm-up and the next call save up one hedge, which that call spends; the one after cannot hedge
+    assert hedged_call("analysis", _slow_then_fast(0.2)) == "hedge"
+    assert hedged_call("analysis", _slow_then_fast(0.2)) == "primary"
+    assert hedge_stats()["analysis"]["over_budget"] == 1
+
+
+def test_latencies_are_kept_per_model_tier(hedged):
+    with model_tier("small"):
+        _warm_up()
+    # The large tier has no samples yet, so a slow large-model call is not hedged
+    assert hedged_call("analysis", _slow_then_fast(0.2)) == "primary"
+
+    stats = hedge_stats()["analysis"]
+    assert stats["calls"] == POLICY.min_samples + 1
+    assert stats["hedged"] == 0
+
+
+def _async_attempt(delays, events):
+    calls = itertools.count()
+
+    async def attempt() -> str:
+        index = next(calls)
+        try:
+            await asyncio.sleep(delays[index])
+        except asyncio.CancelledError:
+            events.append(f"cancelled {index}")
+            raise
+        return "primary" if index == 0 else "hedge"
+
+    return attempt
+
+
+def test_async_hedge_wins_and_the_primary_is_cancelled(hedged):
+    _warm_up()
+    events = []
+
+    async def run():
+        result = await ahedged_call("analysis", _async_attempt([1.0, 0.0], events))
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "hedge"
+    assert events == ["cancelled 0"]
+
+
+def test_cancelling_the_caller_before_the_hedge_cancels_the_primary(hedged):
+    _warm_up()
+    events = []
+
+    async def run():
+        call = asyncio.ensure_future(ahedged_call("analysis", _async_attempt([1.0, 1.0], events)))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert events == ["cancelled 0"]
+    assert hedge_stats()["analysis"]["hedged"] == 0
+
+
+def test_cancelling_the_caller_after_the_hedge_cancels_both_attempts(hedged):
+    _warm_up()
+    events = []
+
+    async def run():
+        call = asyncio.ensure_future(ahedged_call("analysis", _async_attempt([1.0, 1.0], events)))
+        await asyncio.sleep(0.2)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert sorted(events) == ["cancelled 0", "cancelled 1"]
+    assert hedge_stats()["analysis"]["hedged"] == 1
+
+
+def test_primary_error_is_reported_when_both_attempts_fail(hedged):
+    _warm_up()
+    calls = itertools.count()
+    lock = threading.Lock()
+
+    def attempt() -> str:
+        with lock:
+            index = next(calls)
+        time.sleep(0.2 if index == 0 else 0.0)
+        raise ValueError(f"attempt {index} failed")
+
+    with pytest.raises(ValueError, match="attempt 0 failed"):
+        hedged_call("analysis", attempt)
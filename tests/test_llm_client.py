@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import llm_client
+from fake_endpoint import FakeRateLimitedEndpoint
+from fake_llm import fake_llm_factory
+from llm_client import areset_llm_clients, get_llm, reset_llm_clients, set_llm_factory
+
+
+@pytest.fixture
+def groq_key(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+
+
+def _pools():
+    return list(llm_client._http_pools.values())
+
+
+def test_agents_on_the_same_model_share_one_client():
+    set_llm_factory(fake_llm_factory())
+
+    assert get_llm("analysis") is get_llm("content")
+    assert get_llm("analysis") is not get_llm("analysis", model="other-model")
+
+
+def test_set_llm_factory_drops_cached_clients():
+    set_llm_factory(fake_llm_factory())
+    first = get_llm("analysis")
+    set_llm_factory(fake_llm_factory())
+
+    assert get_llm("analysis") is not first
+
+
+def test_reset_closes_sync_and_async_pools(groq_key):
+    get_llm("analysis")
+    pools = _pools()
+    assert pools
+
+    reset_llm_clients()
+
+    assert llm_client._http_pools == {}
+    for http_client, http_async_client in pools:
+        assert http_client.is_closed
+        assert http_async_client.is_closed
+
+
+def test_areset_closes_async_pools_inside_a_running_loop(groq_key):
+    async def run():
+        get_llm("analysis")
+        pools = _pools()
+        await areset_llm_clients()
+        return pools
+
+    for http_client, http_async_client in asyncio.run(run()):
+        assert http_client.is_closed
+        assert http_async_client.is_closed
+
+
+def test_reset_inside_a_running_loop_closes_async_pools_in_the_background(groq_key):
+    async def run():
+        get_llm("analysis")
+        pools = _pools()
+        reset_llm_clients()
+        await asyncio.gather(*llm_client._closing)
+        return pools
+
+    for _, http_async_client in asyncio.run(run()):
+        assert http_async_client.is_closed
+    assert not llm_client._closing
+
+
+def test_clients_work_again_after_a_reset(groq_key, monkeypatch, raw_input):
+    from analysis_agent import aanalyze_input, analyze_input
+    from parser_agent import parse_input
+
+    parsed_input = parse_input(raw_input)
+    with FakeRateLimitedEndpoint(requests_per_minute=600, tokens_per_minute=10 ** 7) as endpoint:
+        monkeypatch.setenv("LLM_BASE_URL", endpoint.base_url)
+
+        assert analyze_input(parsed_input)["observations"]
+        reset_llm_clients()
+
+        async def run():
+            analysis = await aanalyze_input(parsed_input)
+            await areset_llm_clients()
+            return analysis
+
+        assert asyncio.run(run())["observations"]
+        assert analyze_input(parsed_input)["observations"]
+        assert endpoint.stats()["served"] == 3
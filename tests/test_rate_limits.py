@@ -0,0 +1,132 @@
+import asyncio
+
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage
+
+import llm_client
+from fake_llm import fake_llm_factory
+from llm_client import get_llm, set_llm_factory
+from rate_limits import RateLimitScheduler, TokenBucket, get_scheduler, scheduler_stats
+from schemas import AnalysisSchema
+from stream_parse import StreamAbortError, StreamRules, validate_stream
+
+TPM = 600000
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    # Large enough that nothing waits, so bucket levels only move by what calls reserve
+    monkeypatch.setenv("LLM_RPM", "6000")
+    monkeypatch.setenv("LLM_TPM", str(TPM))
+
+
+def test_token_bucket_refills_and_caps_refunds():
+    bucket = TokenBucket(60, period=60.0)
+    now = bucket.updated
+    bucket.take(60, now)
+    assert bucket.wait_time(30, now) == pytest.approx(30.0)
+    assert bucket.wait_time(30, now + 30) == 0.0
+
+    bucket.give_back(1000, now + 30)
+    assert bucket.level == 60
+
+
+def test_settle_refunds_and_charges_the_difference():
+    scheduler = RateLimitScheduler("m", tokens_per_minute=TPM)
+    scheduler.acquire(1000)
+    scheduler.settle(1000, 400)
+    assert scheduler.tokens.level == pytest.approx(TPM - 400, abs=50)
+
+    scheduler.settle(400, 900)
+    assert scheduler.tokens.level == pytest.approx(TPM - 900, abs=50)
+
+
+def test_failed_call_gives_its_reservation_back(limited):
+    set_llm_factory(fake_llm_factory(failure_rate=1.0))
+    llm = get_llm("analysis")
+    scheduler = get_scheduler(llm.model_name)
+
+    with pytest.raises(Exception, match="Injected transport failure"):
+        llm.invoke([HumanMessage(content="Analyze this product.")])
+    assert scheduler.tokens.level == pytest.approx(TPM, abs=50)
+
+
+def test_aborted_stream_is_charged_for_what_was_received(limited):
+    set_llm_factory(fake_llm_factory(off_rails_rate=1.0, chunk_size=4))
+    llm = get_llm("analysis")
+    scheduler = get_scheduler(llm.model_name)
+    prompt = "You are an expert product analyst. Output valid JSON matching AnalysisSchema."
+
+    with validate_stream(StreamRules(AnalysisSchema)):
+        with pytest.raises(StreamAbortError) as aborted:
+            llm.invoke([HumanMessage(content=prompt)])
+    spent = TPM - scheduler.tokens.level
+    assert 0 < spent <= llm._prompt_tokens([HumanMessage(content=prompt)]) + len(aborted.value.text) + 50
+
+
+def test_cancelled_waiter_gives_back_a_grant_it_never_used():
+    scheduler = RateLimitScheduler("m", requests_per_minute=600, tokens_per_minute=6000)
+
+    async def run():
+        scheduler.acquire(6000)
+        waiter = asyncio.ensure_future(scheduler.aacquire(500))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 1
+
+        # Freeing the bucket grants the waiter right away; it is cancelled before it resumes
+        scheduler.settle(6000, 0)
+        granted = (scheduler.tokens.level, scheduler.requests.level)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return granted
+
+    tokens, requests = asyncio.run(run())
+    assert scheduler.tokens.level == pytest.approx(tokens + 500, abs=5)
+    assert scheduler.requests.level == pytest.approx(requests + 1, abs=1)
+
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    scheduler = RateLimitScheduler("m", tokens_per_minute=6000)
+
+    async def run():
+        scheduler.acquire(6000)
+        first = asyncio.ensure_future(scheduler.aacquire(3000))
+        second = asyncio.ensure_future(scheduler.aacquire(100))
+        await asyncio.sleep(0)
+        first.cancel()
+        # The 100 tokens the second waiter needs refill within about a second
+        await asyncio.wait_for(second, timeout=5)
+        return first.cancelled()
+
+    assert asyncio.run(run())
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_rate_limited_response_pauses_the_scheduler():
+    scheduler = RateLimitScheduler("m")
+    scheduler.observe_headers({"retry-after": "2"}, status_code=429)
+
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 1
+    assert 1.5 < stats["paused_for"] <= 2
+
+
+def _response(status_code: int, headers: dict) -> httpx.Response:
+    request = httpx.Request("POST", "http://llm.test/chat/completions", json={"model": "m1"})
+    return httpx.Response(status_code, request=request, headers=headers)
+
+
+def test_response_hook_feeds_headers_to_the_model_scheduler():
+    llm_client._observe_response(_response(200, {"x-ratelimit-limit-tokens": "5000", "x-ratelimit-remaining-tokens": "1200"}))
+
+    assert get_scheduler("m1").stats()["tokens_per_minute"] == 5000
+    assert get_scheduler("m1").tokens.level == pytest.approx(1200, abs=5)
+
+
+def test_response_hook_is_skipped_when_scheduling_is_disabled(monkeypatch):
+    monkeypatch.setenv("LLM_SCHEDULER_DISABLED", "1")
+    llm_client._observe_response(_response(429, {"retry-after": "1"}))
+
+    assert scheduler_stats() == {}
@@ -0,0 +1,198 @@
+from typing import Dict, Any, List, Optional, Sequence
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+
+from artifacts import atomic_write_json
+from job_queue import (
+    DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, DONE, FAILED, JobQueue, worker_identity,
+)
+
+POLL_INTERVAL = 1.0
+
+
+class _Lease:
+    """
+    Keeps one job's lease alive while its pipeline runs: renewed by a heartbeat thread
+    and whenever a stage finishes (which is also recorded on the job).
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, worker_id: str, lease_seconds: float):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.lease_seconds / 3):
+            if not self.queue.renew(self.job_id, self.worker_id, self.lease_seconds):
+                print(f"[LEASE LOST] {self.job_id}: another worker reclaimed it.")
+                return
+
+    def on_progress(self, event: Dict[str, Any]) -> None:
+        if event["event"] == "node_finished":
+            self.queue.renew(self.job_id, self.worker_id, self.lease_seconds, stage=event["node"])
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def worker_main(
+    queue_path: str,
+    output_dir: str,
+    index: int = 0,
+    parallel: bool = False,
+    fused: bool = False,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    render_formats: Sequence[str] = ()
+) -> None:
+    """
+    One worker process: claims jobs until the queue has nothing open, runs each through
+    the pipeline and writes the outcome back. Runs are incremental, so a product that was
+    reclaimed after a crash skips the stages it had already finished.
+    """
+    from orchestrator import stream_pipeline
+
+    worker_id = worker_identity(index)
+    with JobQueue(queue_path) as queue:
+        while True:
+            job = queue.claim(worker_id, lease_seconds, max_attempts)
+            if job is None:
+                if not queue.has_open_jobs():
+                    return
+                # Other workers still hold jobs; one may expire and need reclaiming
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            job_id, raw_input, attempt = job
+            print(f"[CLAIMED] {job_id} by {worker_id} (attempt {attempt}/{max_attempts})")
+            lease = _Lease(queue, job_id, worker_id, lease_seconds)
+            try:
+                stream_pipeline(
+                    raw_input,
+                    output_dir=f"{output_dir}/{job_id}",
+                    parallel=parallel,
+                    incremental=True,
+                    fused=fused,
+                    on_progress=lease.on_progress,
+                    run_id=job_id,
+                    render_formats=render_formats,
+                )
+            except Exception as e:
+                # Still crash-only inside the run; the queue decides whether to try again
+                status = queue.fail(job_id, worker_id, f"{type(e).__name__}: {e}", max_attempts)
+                print(f"[FAILED] {job_id}: {e} -> {status}")
+            else:
+                if queue.complete(job_id, worker_id):
+                    print(f"[DONE] {job_id}")
+            finally:
+                lease.stop()
+
+
+def run_workers(
+    source: str,
+    output_dir: str = "outputs/batch",
+    workers: int = 4,
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    parallel: bool = False,
+    fused: bool = False,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    reject_path: Optional[str] = None,
+    retry_failed: bool = False,
+    render_formats: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """
+    Runs a catalog on `workers` processes through a durable job queue at `queue_path`.
+    The catalog is validated as a stream and enqueued (products already in the queue keep
+    their status), then workers claim products with leases. A worker that dies is replaced,
+    and its product is reclaimed when the lease expires. Rerunning the same catalog resumes:
+    finished products are skipped and interrupted ones continue from their last stage.
+    Other hosts can run workers against the same queue file. Writes
+    `<output_dir>/batch_summary.json` like run_batch.
+    """
+    from input_stream import CatalogValidator
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    reject_path = reject_path or f"{output_dir}/rejects.jsonl"
+
+    with JobQueue(queue_path) as queue:
+        with CatalogValidator(reject_path) as validator:
+            seen: Dict[str, int] = {}
+
+            def unique_jobs():
+                # Same deduplication as run_batch, so ids are stable across reruns
+                for product_id, parsed in validator.stream(source):
+                    if product_id in seen:
+                        seen[product_id] += 1
+                        product_id = f"{product_id}-{seen[product_id]}"
+                    else:
+                        seen[product_id] = 0
+                    yield product_id, parsed.model_dump()
+
+            added = queue.enqueue_many(unique_jobs())
+            rejected = validator.rejected
+        released = queue.release_dead_local_leases()
+        reset = queue.retry_failed() if retry_failed else 0
+        # Totals cover this catalog only, even when the queue file also holds earlier ones
+        counts = queue.counts(enqueued_only=True)
+        print(
+            f"Queue {queue_path}: {added} new, {counts[DONE]} already done, {released} interrupted, "
+            f"{reset} failed reset. Starting {workers} worker(s)..."
+        )
+
+        context = multiprocessing.get_context("spawn")
+        worker_args = (queue_path, output_dir)
+        worker_kwargs = {
+            "parallel": parallel, "fused": fused, "lease_seconds": lease_seconds,
+            "max_attempts": max_attempts, "render_formats": tuple(render_formats),
+        }
+        processes: List[Any] = []
+        for index in range(max(1, workers)):
+            process = context.Process(target=worker_main, args=worker_args + (index,), kwargs=worker_kwargs)
+            process.start()
+            processes.append(process)
+
+        # Supervise: a worker that died (killed, out of memory, ...) is replaced while work
+        # remains, even when it was the last one alive; the run ends once every worker has
+        # exited and nothing is open, or the restart budget is spent
+        restarts = 0
+        max_restarts = max_attempts * len(processes)
+        while True:
+            alive = [process.is_alive() for process in processes]
+            open_jobs = queue.has_open_jobs()
+            if not any(alive) and (not open_jobs or restarts >= max_restarts):
+                break
+            for slot, process in enumerate(processes):
+                if alive[slot] or not open_jobs or restarts >= max_restarts:
+                    continue
+                restarts += 1
+                print(f"Worker {slot} exited with code {process.exitcode}; starting a replacement.")
+                processes[slot] = context.Process(target=worker_main, args=worker_args + (slot,), kwargs=worker_kwargs)
+                processes[slot].start()
+            time.sleep(POLL_INTERVAL)
+
+        done = queue.jobs(DONE, enqueued_only=True)
+        failed = queue.jobs(FAILED, enqueued_only=True)
+        counts = queue.counts(enqueued_only=True)
+
+    summary = {
+        "total": len(done) + len(failed) + rejected,
+        "succeeded": len(done),
+        "failed": len(failed),
+        "rejected": rejected,
+        "reject_file": reject_path if rejected else None,
+        "unfinished": counts["pending"] + counts["running"],
+        "restarts": restarts,
+        "successes": [job["product_id"] for job in done],
+        "failures": [{"product_id": job["product_id"], "error": job["error"], "stage": job["stage"]} for job in failed],
+    }
+    atomic_write_json(f"{output_dir}/batch_summary.json", summary)
+
+    return summary